@@ -0,0 +1,24 @@
+"""
+Proposal agents.
+
+Agent classes are re-exported lazily (PEP 562) so that importing the package
+does not load every agent module and its dependencies up front.
+"""
+import importlib
+
+_EXPORTS = {
+    "OutlineDesigner": "agents.outline_designer",
+    "BudgetEstimator": "agents.budget_estimator",
+    "ReviewerSimulation": "agents.reviewer",
+    "RubricScorer": "agents.rubric",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
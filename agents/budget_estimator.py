@@ -1,23 +1,189 @@
-import random
 import json
-import pandas as pd
+import random
+import threading
+
+from utils.classifier import classify_topic
+from utils.instrumentation import instrumented
+from utils.response_cache import cached_generation, uncached
+from utils.template_store import TemplatePackMixin
+
+# NumPy and pandas are only needed by the batch and simulation APIs, so they
+# are imported inside those code paths to keep importing this module cheap.
+
+# Budget amounts are rounded to the nearest 100, so simulated values fall on a
+# grid of this step and can be counted exactly in fixed-size histograms
+AMOUNT_STEP = 100
+
+# Largest project duration (months) and team size of the what-if grid, the
+# ranges of the app's sliders
+GRID_MAX_DURATION = 60
+GRID_MAX_TEAM_SIZE = 20
+
+
+def _simulate_chunk(nominal, percentages, lows, bins, size, seed_sequence):
+    """
+    Simulate one chunk of budgets and count the outcomes.
+    
+    Kept at module level so it can be sent to a process pool.
+    
+    Returns:
+        tuple: (per-category histograms concatenated into one array,
+            total histogram, sum of totals)
+    """
+    import numpy as np
+    
+    rng = np.random.default_rng(seed_sequence)
+    amounts = np.round(nominal * rng.uniform(0.9, 1.1, size=(size, len(nominal))), -2)
+    indirect = np.round(amounts.sum(axis=1)[:, None] * percentages, -2)
+    values = np.hstack([amounts, indirect])
+    totals = values.sum(axis=1)
+    
+    # One bincount over every category, each shifted into its own bin range
+    category_bins = bins[:-1]
+    offsets = np.concatenate([[0], np.cumsum(category_bins[:-1])])
+    indexes = np.rint((values - lows[:-1]) / AMOUNT_STEP).astype(np.int64)
+    indexes = np.clip(indexes, 0, category_bins - 1) + offsets
+    category_counts = np.bincount(indexes.ravel(), minlength=int(category_bins.sum()))
+    
+    total_indexes = np.clip(np.rint((totals - lows[-1]) / AMOUNT_STEP).astype(np.int64), 0, bins[-1] - 1)
+    total_counts = np.bincount(total_indexes, minlength=int(bins[-1]))
+    
+    return category_counts, total_counts, float(totals.sum())
+
 
-class BudgetEstimator:
+def _histogram_percentiles(counts, low, percentiles):
+    """Read percentiles (nearest rank) off a histogram of AMOUNT_STEP-wide bins"""
+    import numpy as np
+    
+    cumulative = np.cumsum(counts)
+    ranks = np.maximum(np.ceil(np.asarray(percentiles) / 100 * cumulative[-1]), 1)
+    indexes = np.searchsorted(cumulative, ranks)
+    return {f"P{p:g}": float(low + index * AMOUNT_STEP) for p, index in zip(percentiles, indexes)}
+
+
+class BudgetGrid:
+    """
+    Precomputed budgets for every combination of project duration and team size.
+    
+    Built by BudgetEstimator.budget_grid. Looking up a combination is an array
+    index, so a UI can sweep the grid without estimating again.
+    """
+    
+    def __init__(self, template, template_version, names, values, seed):
+        """
+        Args:
+            template (str): Budget template category the grid was built from
+            template_version (int): Template pack version the grid was built from
+            names (list): Budget category names
+            values (ndarray): Amounts in USD, shaped (durations, team sizes,
+                categories); index 0 is a duration or team size of 1
+            seed (int): Seed of the random variation
+        """
+        self.template = template
+        self.template_version = template_version
+        self.names = names
+        self.values = values
+        self.totals = values.sum(axis=2)
+        self.seed = seed
+        self._csv = None
+    
+    @property
+    def max_duration(self):
+        return self.values.shape[0]
+    
+    @property
+    def max_team_size(self):
+        return self.values.shape[1]
+    
+    def budget(self, duration, team_size):
+        """The budget for one combination, in the form estimate_budget returns"""
+        return dict(zip(self.names, self.values[duration - 1, team_size - 1].tolist()))
+    
+    def total(self, duration, team_size):
+        """The total budget for one combination"""
+        return float(self.totals[duration - 1, team_size - 1])
+    
+    def totals_frame(self):
+        """
+        Total budgets as a DataFrame.
+        
+        Returns:
+            DataFrame: One row per duration and one column per team size
+        """
+        import pandas as pd
+        
+        return pd.DataFrame(
+            self.totals,
+            index=pd.RangeIndex(1, self.max_duration + 1, name="duration"),
+            columns=pd.RangeIndex(1, self.max_team_size + 1, name="team_size")
+        )
+    
+    def to_frame(self):
+        """
+        Every combination as a row, for export.
+        
+        Returns:
+            DataFrame: 'duration' and 'team_size' columns, one column per
+                budget category in USD and a 'Total' column
+        """
+        import numpy as np
+        import pandas as pd
+        
+        durations, team_sizes = np.meshgrid(
+            np.arange(1, self.max_duration + 1), np.arange(1, self.max_team_size + 1), indexing="ij"
+        )
+        frame = pd.DataFrame(self.values.reshape(-1, len(self.names)), columns=self.names)
+        frame.insert(0, "team_size", team_sizes.ravel())
+        frame.insert(0, "duration", durations.ravel())
+        frame["Total"] = self.totals.ravel()
+        return frame
+    
+    def to_csv(self):
+        """The grid as CSV text (see to_frame), built once since the grid never changes"""
+        if self._csv is None:
+            self._csv = self.to_frame().to_csv(index=False)
+        return self._csv
+
+
+class BudgetEstimator(TemplatePackMixin):
     """
     Agent responsible for estimating project budgets based on topic, goals, and parameters.
     """
     
-    def __init__(self):
+    template_section = "budget"
+    
+    def __init__(self, template_store=None, template_pack="default", backend=None, response_cache=None,
+                 rate_table=None):
+        """
+        Args:
+            template_store (TemplateStore, optional): Store to load template packs from
+            template_pack (str): Name of the pack to use from the store
+            backend (ModelBackend, optional): Model backend used by the async methods
+            response_cache (ResponseCache, optional): Cache for generated results
+            rate_table (RateTable, optional): Exchange rates; the built-in rates
+                are used if not provided
+        """
         # In a real application, you would initialize your AI model here
         # For this example, we'll use a template-based approach
-        self.budget_templates = self._load_budget_templates()
-        self.usd_to_inr_rate = 75  # Conversion rate: 1 USD = 75 INR
+        self._init_template_pack(template_store, template_pack)
+        self._builtin_templates = self._load_budget_templates()
+        self._rate_table = rate_table
+        self.backend = backend
+        self.response_cache = response_cache
+        self._compiled_templates = {}
+        self._compiled_version = None
+        self._grids = {}
+        # Guards the compiled templates and grids, shared by the app's sessions
+        self._cache_lock = threading.Lock()
+    
+    @property
+    def budget_templates(self):
+        """Budget templates, with the template pack's overrides applied"""
+        return self._pack_templates(self._builtin_templates)
     
     def _load_budget_templates(self):
-        """Load budget templates or use default ones if file doesn't exist"""
+        """Load the built-in budget templates used when no template pack overrides them"""
         try:
-            # In a real application, you would load templates from a file
-            # For this example, we'll use hardcoded templates
             templates = {
                 "research": {
                     "Personnel": {"base": 50000, "per_person": 75000},
@@ -63,6 +229,8 @@ class BudgetEstimator:
                 }
             }
     
+    @instrumented()
+    @cached_generation
     def estimate_budget(self, topic, goals, funding_agency=None, duration=12, team_size=3):
         """
         Estimate a project budget based on the provided information.
@@ -81,11 +249,7 @@ class BudgetEstimator:
         # For this example, we'll use a template-based approach
         
         # Determine the template category based on the topic and funding agency
-        category = "general"
-        if any(keyword in topic.lower() for keyword in ["research", "study", "investigation", "analysis"]):
-            category = "research"
-        elif any(keyword in topic.lower() for keyword in ["nonprofit", "community", "social", "service"]):
-            category = "nonprofit"
+        category = self._select_category(topic)
             
         # Get the appropriate budget template
         template = self.budget_templates.get(category, self.budget_templates["general"])
@@ -125,6 +289,331 @@ class BudgetEstimator:
         
         return budget
     
+    @instrumented()
+    @cached_generation
+    async def estimate_budget_async(self, topic, goals, funding_agency=None, duration=12, team_size=3):
+        """
+        Async variant of estimate_budget that lets the model backend adjust the estimate.
+        
+        The template estimate is sent to the model, which may return revised
+        amounts for its categories as a JSON object. Unknown categories and
+        non-numeric amounts are ignored, and the template estimate is returned
+        when no backend is configured or the request fails. Percentage-based
+        categories (like indirect costs) are recomputed from the revised
+        direct costs rather than taken from the model.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            duration (int): Project duration in months
+            team_size (int): Number of team members
+            
+        Returns:
+            dict: A dictionary containing budget categories and amounts in USD
+        """
+        budget = self.estimate_budget(topic, goals, funding_agency, duration, team_size)
+        if self.backend is None:
+            return budget
+        
+        from utils.llm import ModelBackendError, parse_json_object
+        
+        prompt = (
+            "Review this grant budget estimate and return a JSON object mapping each budget "
+            "category to a revised amount in USD. Only include categories that should change.\n\n"
+            f"Topic: {topic}\n"
+            f"Goals: {goals}\n"
+            f"Funding agency: {funding_agency or 'Not specified'}\n"
+            f"Duration: {duration} months\n"
+            f"Team size: {team_size}\n\n"
+            f"Estimate:\n{json.dumps(budget, indent=2)}"
+        )
+        try:
+            response = await self.backend.complete(prompt, temperature=0.2, json_mode=True)
+        except ModelBackendError as e:
+            print(f"Error estimating budget with model backend: {e}")
+            return uncached(budget)
+        
+        template = self.budget_templates.get(self._select_category(topic), self.budget_templates["general"])
+        percentages = {category: params["percentage"] for category, params in template.items() if "percentage" in params}
+        
+        for category, amount in parse_json_object(response).items():
+            if (category in budget and category not in percentages
+                    and isinstance(amount, (int, float)) and amount >= 0):
+                budget[category] = round(float(amount), -2)
+        
+        direct_costs = sum(amount for category, amount in budget.items() if category not in percentages)
+        for category, percentage in percentages.items():
+            budget[category] = round(direct_costs * percentage, -2)  # Round to nearest 100
+        return budget
+    
+    def _select_category(self, topic):
+        """Pick the budget template category for a topic"""
+        return classify_topic(topic)
+    
+    def _compile_template(self, category):
+        """
+        Compile a budget template into NumPy arrays for vectorized estimation.
+        
+        Returns:
+            dict: Direct cost category names with their base, per-month and
+                per-person rates, and percentage-based category names with
+                their percentages
+        """
+        version = self.template_version()
+        with self._cache_lock:
+            # Recompile everything when the template pack has been reloaded
+            if version != self._compiled_version:
+                self._compiled_templates = {}
+                self._grids = {}
+                self._compiled_version = version
+            compiled = self._compiled_templates.get(category)
+        if compiled is not None:
+            return compiled
+        
+        import numpy as np
+        
+        template = self.budget_templates.get(category, self.budget_templates["general"])
+        direct = [(name, params) for name, params in template.items() if "percentage" not in params]
+        percentage = [(name, params) for name, params in template.items() if "percentage" in params]
+        
+        compiled = {
+            "names": [name for name, _ in direct],
+            "base": np.array([params["base"] for _, params in direct], dtype=float),
+            "per_month": np.array([params.get("per_month", 0) for _, params in direct], dtype=float),
+            # Personnel is priced per person instead of base + per month
+            "per_person": np.array([params.get("per_person", 0) for _, params in direct], dtype=float),
+            "is_personnel": np.array([name == "Personnel" and "per_person" in params for name, params in direct]),
+            "percentage_names": [name for name, _ in percentage],
+            "percentages": np.array([params["percentage"] for _, params in percentage], dtype=float)
+        }
+        with self._cache_lock:
+            # Another thread may have compiled it meanwhile, or the pack been reloaded
+            if self._compiled_version == version:
+                compiled = self._compiled_templates.setdefault(category, compiled)
+        return compiled
+    
+    @instrumented()
+    def estimate_budgets_batch(self, requests, seed=None):
+        """
+        Estimate budgets for many (topic, duration, team_size) combinations at once.
+        
+        Produces the same line items as estimate_budget, but computes every
+        line item, the random variation and the percentage-based categories
+        as vectorized NumPy operations per template.
+        
+        Args:
+            requests (DataFrame or list): Rows with a 'topic' column and optional
+                'duration' (months, default 12) and 'team_size' (default 3)
+                columns, as a DataFrame or a list of dicts
+            seed (int, optional): Seed for the random variation
+            
+        Returns:
+            DataFrame: One row per request with the input columns, the template
+                category used, one column per budget category in USD (NaN where
+                the template has no such category) and a 'Total' column
+        """
+        import numpy as np
+        import pandas as pd
+        
+        frame = requests if isinstance(requests, pd.DataFrame) else pd.DataFrame(list(requests))
+        frame = frame.reset_index(drop=True)
+        for column, default in (("topic", ""), ("duration", 12), ("team_size", 3)):
+            frame[column] = frame[column].fillna(default) if column in frame else default
+        
+        rng = np.random.default_rng(seed)
+        # Classify each distinct topic once
+        topics = frame["topic"].astype(str)
+        categories = topics.map({topic: self._select_category(topic) for topic in topics.unique()})
+        
+        blocks = []
+        for category, rows in categories.groupby(categories).groups.items():
+            compiled = self._compile_template(category)
+            duration = frame.loc[rows, "duration"].to_numpy(dtype=float)[:, None]
+            team_size = frame.loc[rows, "team_size"].to_numpy(dtype=float)[:, None]
+            
+            amounts = np.where(
+                compiled["is_personnel"],
+                compiled["per_person"] * team_size,
+                compiled["base"] + compiled["per_month"] * duration
+            )
+            amounts = np.round(amounts * rng.uniform(0.9, 1.1, size=amounts.shape), -2)
+            indirect = np.round(amounts.sum(axis=1)[:, None] * compiled["percentages"], -2)
+            
+            block = pd.DataFrame(
+                np.hstack([amounts, indirect]),
+                index=rows,
+                columns=compiled["names"] + compiled["percentage_names"]
+            )
+            block.insert(0, "template", category)
+            blocks.append(block)
+        
+        if not blocks:
+            return frame.assign(template=pd.Series(dtype=object), Total=pd.Series(dtype=float))
+        
+        budgets = pd.concat(blocks).reindex(frame.index)
+        budgets["Total"] = budgets.drop(columns="template").sum(axis=1)
+        return pd.concat([frame, budgets], axis=1)
+    
+    @instrumented()
+    def budget_grid(self, topic, max_duration=GRID_MAX_DURATION, max_team_size=GRID_MAX_TEAM_SIZE, seed=0):
+        """
+        Precompute the budget for every project duration and team size.
+        
+        Each category gets one random variation, drawn from the seed and
+        shared by every combination, so moving across the grid only shows the
+        effect of the duration and team size. The grid is computed in one
+        vectorized pass and cached per template category and seed until the
+        template pack changes.
+        
+        Args:
+            topic (str): The research or project topic, used to pick the template
+            max_duration (int): Largest project duration in months
+            max_team_size (int): Largest team size
+            seed (int): Seed for the random variation
+            
+        Returns:
+            BudgetGrid: Budgets for durations 1..max_duration and team sizes
+                1..max_team_size
+        """
+        category = self._select_category(topic)
+        # Compiling first also drops grids built from an older template pack
+        compiled = self._compile_template(category)
+        key = (category, max_duration, max_team_size, seed)
+        with self._cache_lock:
+            version = self._compiled_version
+            grid = self._grids.get(key)
+        if grid is not None:
+            return grid
+        
+        import numpy as np
+        
+        duration = np.arange(1, max_duration + 1, dtype=float)[:, None, None]
+        team_size = np.arange(1, max_team_size + 1, dtype=float)[None, :, None]
+        amounts = np.where(
+            compiled["is_personnel"],
+            compiled["per_person"] * team_size,
+            compiled["base"] + compiled["per_month"] * duration
+        )
+        variation = np.random.default_rng(seed).uniform(0.9, 1.1, size=len(compiled["names"]))
+        amounts = np.round(amounts * variation, -2)
+        indirect = np.round(amounts.sum(axis=2, keepdims=True) * compiled["percentages"], -2)
+        
+        grid = BudgetGrid(
+            category, version, compiled["names"] + compiled["percentage_names"],
+            np.concatenate([amounts, indirect], axis=2), seed
+        )
+        with self._cache_lock:
+            if self._compiled_version == version:
+                grid = self._grids.setdefault(key, grid)
+        return grid
+    
+    @instrumented()
+    def simulate_budget(self, topic, goals, funding_agency=None, duration=12, team_size=3,
+                        n_samples=100000, percentiles=(10, 50, 90), seed=None,
+                        chunk_size=100000, processes=None):
+        """
+        Simulate the spread of possible budgets with Monte Carlo sampling.
+        
+        Draws the same 0.9-1.1 variation per category as estimate_budget, in
+        vectorized chunks. Since amounts are rounded to the nearest 100, every
+        outcome is counted exactly in a histogram whose size depends on the
+        budget range rather than on n_samples, so memory stays bounded for any
+        number of samples.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            duration (int): Project duration in months
+            team_size (int): Number of team members
+            n_samples (int): Number of simulated budgets
+            percentiles (tuple): Percentiles to report
+            seed (int, optional): Seed for reproducible results; results do not
+                depend on chunk_size or processes for a given seed
+            chunk_size (int): Number of samples drawn per chunk
+            processes (int, optional): Run chunks across this many processes
+            
+        Returns:
+            dict: 'samples', 'total' (percentiles and mean of the total budget)
+                and 'categories' (percentiles and mean per budget category)
+        
+        Raises:
+            ValueError: If n_samples or chunk_size is less than 1
+        """
+        if n_samples < 1:
+            raise ValueError(f"n_samples must be at least 1, got {n_samples}")
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+        
+        import numpy as np
+        from concurrent.futures import ProcessPoolExecutor
+        
+        compiled = self._compile_template(self._select_category(topic))
+        nominal = np.where(
+            compiled["is_personnel"],
+            compiled["per_person"] * team_size,
+            compiled["base"] + compiled["per_month"] * duration
+        )
+        percentages = compiled["percentages"]
+        names = compiled["names"] + compiled["percentage_names"]
+        
+        # Exact bounds of every category and of the total (rounding is monotonic)
+        def bounds(factor):
+            direct = np.round(nominal * factor, -2)
+            indirect = np.round(direct.sum() * percentages, -2)
+            values = np.concatenate([direct, indirect])
+            return np.append(values, values.sum())
+        lows = bounds(0.9)
+        highs = bounds(1.1)
+        bins = np.rint((highs - lows) / AMOUNT_STEP).astype(np.int64) + 1
+        
+        # Per-chunk seeds are fixed up front so results are reproducible
+        chunk_sizes = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+        seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+        args = [(nominal, percentages, lows, bins, size, seq) for size, seq in zip(chunk_sizes, seed_sequences)]
+        
+        if processes and processes > 1 and len(args) > 1:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = list(executor.map(_simulate_chunk, *zip(*args)))
+        else:
+            results = [_simulate_chunk(*chunk_args) for chunk_args in args]
+        
+        category_counts = sum(result[0] for result in results)
+        total_counts = sum(result[1] for result in results)
+        total_sum = sum(result[2] for result in results)
+        
+        categories = {}
+        start = 0
+        for index, name in enumerate(names):
+            counts = category_counts[start:start + bins[index]]
+            start += bins[index]
+            summary = _histogram_percentiles(counts, lows[index], percentiles)
+            summary["mean"] = float(lows[index] + np.dot(counts, np.arange(len(counts))) * AMOUNT_STEP / n_samples)
+            categories[name] = summary
+        
+        total = _histogram_percentiles(total_counts, lows[-1], percentiles)
+        total["mean"] = total_sum / n_samples
+        
+        return {
+            "samples": n_samples,
+            "total": total,
+            "categories": categories
+        }
+    
+    @property
+    def rate_table(self):
+        """Exchange rates used for currency conversion"""
+        if self._rate_table is None:
+            from utils.currency import RateTable
+            self._rate_table = RateTable()
+        return self._rate_table
+    
+    @property
+    def usd_to_inr_rate(self):
+        """Current INR per USD rate from the rate table"""
+        return float(self.rate_table.factors(["INR"])[0])
+    
     def convert_usd_to_inr(self, amount_usd):
         """
         Convert USD amount to INR.
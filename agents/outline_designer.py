@@ -1,24 +1,52 @@
-import openai
-import os
-import json
-import yaml
 import random
 
-class OutlineDesigner:
+from utils.classifier import classify_topic
+from utils.instrumentation import instrumented, untimed
+from utils.priorities import CITED_PRIORITIES, MIN_CITED_SCORE, format_citation
+from utils.response_cache import cached_stream, uncached
+from utils.template_store import TemplatePackMixin
+
+class OutlineDesigner(TemplatePackMixin):
     """
     Agent responsible for generating proposal outlines based on topic, goals, and funding agency.
     """
     
-    def __init__(self):
+    template_section = "outline"
+    
+    def __init__(self, template_store=None, template_pack="default", backend=None, response_cache=None,
+                 priority_index=None):
+        """
+        Args:
+            template_store (TemplateStore, optional): Store to load template packs from
+            template_pack (str): Name of the pack to use from the store
+            backend (ModelBackend, optional): Model backend used by the async methods
+            response_cache (ResponseCache, optional): Cache for generated results
+            priority_index (PriorityIndex, optional): Agency priorities cited
+                in the alignment section
+        """
         # In a real application, you would initialize your AI model here
         # For this example, we'll use a template-based approach
-        self.templates = self._load_templates()
+        self._init_template_pack(template_store, template_pack)
+        self._builtin_templates = self._load_templates()
+        self.backend = backend
+        self.response_cache = response_cache
+        self.priority_index = priority_index
+    
+    def template_version(self):
+        """Template tag, extended with the priority index version when one is used"""
+        version = super().template_version()
+        if self.priority_index is not None:
+            version += f"+priorities-{self.priority_index.version}"
+        return version
+    
+    @property
+    def templates(self):
+        """Outline templates, with the template pack's overrides applied"""
+        return self._pack_templates(self._builtin_templates)
     
     def _load_templates(self):
-        """Load outline templates or use default ones if file doesn't exist"""
+        """Load the built-in outline templates used when no template pack overrides them"""
         try:
-            # In a real application, you would load templates from a file
-            # For this example, we'll use hardcoded templates
             templates = {
                 "general": [
                     "# {title}\n\n## Executive Summary\n\n## Problem Statement\n\n## Project Goals and Objectives\n\n## Methodology\n\n## Timeline\n\n## Budget Summary\n\n## Expected Outcomes\n\n## Evaluation Plan\n\n## Conclusion",
@@ -41,6 +69,7 @@ class OutlineDesigner:
                 "general": ["# {title}\n\n## Executive Summary\n\n## Problem Statement\n\n## Project Goals\n\n## Methodology\n\n## Budget\n\n## Timeline\n\n## Conclusion"]
             }
     
+    @instrumented()
     def generate_outline(self, topic, goals, funding_agency=None):
         """
         Generate a proposal outline based on the provided information.
@@ -53,15 +82,29 @@ class OutlineDesigner:
         Returns:
             str: A formatted outline for the proposal
         """
+        # Timed once here rather than chunk by chunk by stream_outline
+        return "".join(untimed(self.stream_outline)(topic, goals, funding_agency))
+    
+    @instrumented()
+    @cached_stream
+    def stream_outline(self, topic, goals, funding_agency=None):
+        """
+        Generate a proposal outline section by section.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            
+        Yields:
+            str: Consecutive pieces of the outline; joined they form the
+                same text as generate_outline
+        """
         # In a real application, you would use an AI model to generate the outline
         # For this example, we'll use a template-based approach
         
         # Determine the template category based on the topic and funding agency
-        category = "general"
-        if any(keyword in topic.lower() for keyword in ["research", "study", "investigation", "analysis"]):
-            category = "research"
-        elif any(keyword in topic.lower() for keyword in ["nonprofit", "community", "social", "service"]):
-            category = "nonprofit"
+        category = classify_topic(topic)
             
         # Select a random template from the appropriate category
         templates = self.templates.get(category, self.templates["general"])
@@ -74,15 +117,85 @@ class OutlineDesigner:
         # Add custom sections based on goals and funding agency
         sections = outline.split("\n\n")
         
-        # Add funding agency specific section if provided
+        # Add funding agency specific section if provided, citing the
+        # agency's priorities that best match the project
         if funding_agency:
-            sections.insert(-1, f"## Alignment with {funding_agency} Priorities")
+            section = f"## Alignment with {funding_agency} Priorities"
+            if self.priority_index is not None:
+                matches = self.priority_index.search(
+                    f"{topic}\n{goals}", funding_agency, k=CITED_PRIORITIES, min_score=MIN_CITED_SCORE
+                )
+                if matches:
+                    section += "\n\nThe project addresses these stated priorities:\n" + "".join(
+                        format_citation(match) for match in matches
+                    ).rstrip("\n")
+            sections.insert(-1, section)
         
         # Add goals section if not already included
         if not any("Goals" in section for section in sections):
             sections.insert(3, "## Project Goals and Objectives")
         
-        # Reconstruct the outline
-        outline = "\n\n".join(sections)
+        # Emit the sections with the separators between them
+        for i, section in enumerate(sections):
+            yield section if i == 0 else "\n\n" + section
+    
+    @instrumented()
+    async def generate_outline_async(self, topic, goals, funding_agency=None):
+        """
+        Async variant of generate_outline that drafts the outline with the model backend.
+        
+        The template outline is given to the model as a starting structure, and
+        is returned as-is when no backend is configured or the request fails.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            
+        Returns:
+            str: A formatted outline for the proposal
+        """
+        chunks = untimed(self.stream_outline_async)(topic, goals, funding_agency)
+        return "".join([chunk async for chunk in chunks])
+    
+    @instrumented()
+    @cached_stream
+    async def stream_outline_async(self, topic, goals, funding_agency=None):
+        """
+        Async variant of stream_outline that streams the model backend's draft.
         
-        return outline
\ No newline at end of file
+        Falls back to the template outline when no backend is configured or
+        the request fails before any text was received.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            
+        Yields:
+            str: Consecutive pieces of the outline
+        """
+        outline = self.generate_outline(topic, goals, funding_agency)
+        if self.backend is None:
+            # Already cached by stream_outline
+            yield uncached(outline)
+            return
+        
+        from utils.llm import ModelBackendError
+        
+        prompt = (
+            "Draft a grant proposal outline in Markdown with a short description under each section.\n\n"
+            f"Topic: {topic}\n"
+            f"Goals: {goals}\n"
+            f"Funding agency: {funding_agency or 'Not specified'}\n\n"
+            f"Use this structure as a starting point:\n\n{outline}"
+        )
+        started = False
+        try:
+            async for chunk in self.backend.stream(prompt, system="You are an experienced grant writer."):
+                started = True
+                yield chunk
+        except ModelBackendError as e:
+            print(f"Error generating outline with model backend: {e}")
+            # Do not cache a fallback or a partial draft
+            yield uncached("" if started else outline)
\ No newline at end of file
@@ -1,20 +1,63 @@
+import json
 import random
+import threading
+from collections import OrderedDict
 
-class ReviewerSimulation:
+from utils.instrumentation import instrumented, untimed
+from utils.priorities import CITED_PRIORITIES, MIN_CITED_SCORE, format_citation
+from utils.response_cache import cached_generation, cached_stream, uncached
+from utils.sections import parse_sections, sections_by_title, tokenize
+from utils.template_store import TemplatePackMixin
+
+class ReviewerSimulation(TemplatePackMixin):
     """
     Agent responsible for simulating reviewer feedback on grant proposals.
     """
     
-    def __init__(self):
+    template_section = "feedback"
+    
+    def __init__(self, template_store=None, template_pack="default", backend=None, response_cache=None,
+                 rubric_scorer=None, priority_index=None):
+        """
+        Args:
+            template_store (TemplateStore, optional): Store to load template packs from
+            template_pack (str): Name of the pack to use from the store
+            backend (ModelBackend, optional): Model backend used by the async methods
+            response_cache (ResponseCache, optional): Cache for generated results
+            rubric_scorer (RubricScorer, optional): Scores the proposal
+                deterministically instead of drawing a random score
+            priority_index (PriorityIndex, optional): Agency priorities the
+                review cites instead of judging alignment at random
+        """
         # In a real application, you would initialize your AI model here
         # For this example, we'll use a template-based approach
-        self.feedback_templates = self._load_feedback_templates()
+        self._init_template_pack(template_store, template_pack)
+        self._builtin_templates = self._load_feedback_templates()
+        self.backend = backend
+        self.response_cache = response_cache
+        self.rubric_scorer = rubric_scorer
+        self.priority_index = priority_index
+        # Section tree hash (or budget) -> comments, for incremental reviews
+        self._comment_cache = OrderedDict()
+        self._comment_lock = threading.Lock()
+    
+    def template_version(self):
+        """Template tag, extended with the rubric and priority index versions when they are used"""
+        version = super().template_version()
+        if self.rubric_scorer is not None:
+            version += f"+rubric-{self.rubric_scorer.version}"
+        if self.priority_index is not None:
+            version += f"+priorities-{self.priority_index.version}"
+        return version
+    
+    @property
+    def feedback_templates(self):
+        """Feedback templates, with the template pack's overrides applied"""
+        return self._pack_templates(self._builtin_templates)
     
     def _load_feedback_templates(self):
-        """Load feedback templates or use default ones if file doesn't exist"""
+        """Load the built-in feedback templates used when no template pack overrides them"""
         try:
-            # In a real application, you would load templates from a file
-            # For this example, we'll use hardcoded templates
             templates = {
                 "strengths": [
                     "The proposal clearly articulates the problem and its significance.",
@@ -63,6 +106,7 @@ class ReviewerSimulation:
                 "suggestions": ["Consider adding more specific details to strengthen the proposal."]
             }
     
+    @instrumented()
     def generate_feedback(self, topic, goals, funding_agency=None, outline=None, budget=None):
         """
         Generate simulated reviewer feedback based on the provided information.
@@ -77,60 +121,713 @@ class ReviewerSimulation:
         Returns:
             str: Formatted reviewer feedback
         """
+        # Timed once here rather than chunk by chunk by stream_feedback
+        return "".join(untimed(self.stream_feedback)(topic, goals, funding_agency, outline, budget))
+    
+    @instrumented()
+    @cached_stream
+    def stream_feedback(self, topic, goals, funding_agency=None, outline=None, budget=None):
+        """
+        Generate simulated reviewer feedback one block at a time.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            outline (str, optional): The proposal outline
+            budget (dict, optional): The proposed budget
+            
+        Yields:
+            str: Consecutive feedback blocks (score, strengths, weaknesses,
+                suggestions, priority alignment, outline and budget comments);
+                joined they form the same text as generate_feedback
+        """
+        priorities = self._priority_matches(topic, goals, funding_agency, outline)
+        review = self._draft_review(random, cited=priorities is not None)
+        rubric = None
+        if self.rubric_scorer is not None:
+            rubric = self.rubric_scorer.score(outline, budget)
+            review['score'] = rubric['score']
+        
+        # Format the feedback
+        yield f"## Reviewer Feedback\n\n### Overall Score: {review['score']}/5\n\n"
+        
+        if rubric is not None:
+            yield format_rubric(rubric)
+        
+        yield "### Strengths:\n" + "".join(f"{i}. {strength}\n" for i, strength in enumerate(review['strengths'], 1))
+        
+        yield "\n### Weaknesses:\n" + "".join(f"{i}. {weakness}\n" for i, weakness in enumerate(review['weaknesses'], 1))
+        
+        yield "\n### Suggestions for Improvement:\n" + "".join(
+            f"{i}. {suggestion}\n" for i, suggestion in enumerate(review['suggestions'], 1)
+        )
+        
+        yield from self._comment_blocks(outline, budget, funding_agency, priorities)
+    
+    def _draft_review(self, rng, persona=None, cited=False):
+        """
+        Draft one template-based review.
+        
+        Args:
+            rng: Source of randomness (the random module or a random.Random)
+            persona (dict, optional): Reviewer persona, recorded in the review
+            cited (bool): Whether the review cites the agency's priorities, in
+                which case no generic remarks on priorities are drawn
+            
+        Returns:
+            dict: 'persona', 'score', 'strengths', 'weaknesses' and 'suggestions'
+        """
         # In a real application, you would use an AI model to generate the feedback
         # For this example, we'll use a template-based approach
         
         # Select random feedback points from each category
-        num_strengths = random.randint(2, 4)
-        num_weaknesses = random.randint(2, 4)
-        num_suggestions = random.randint(2, 4)
+        num_strengths = rng.randint(2, 4)
+        num_weaknesses = rng.randint(2, 4)
+        num_suggestions = rng.randint(2, 4)
         
-        strengths = random.sample(self.feedback_templates["strengths"], num_strengths)
-        weaknesses = random.sample(self.feedback_templates["weaknesses"], num_weaknesses)
-        suggestions = random.sample(self.feedback_templates["suggestions"], num_suggestions)
+        templates = self.feedback_templates
+        if cited:
+            templates = {
+                category: [point for point in points if "priorities" not in point] or points
+                for category, points in templates.items()
+            }
+        strengths = rng.sample(templates["strengths"], min(num_strengths, len(templates["strengths"])))
+        weaknesses = rng.sample(templates["weaknesses"], min(num_weaknesses, len(templates["weaknesses"])))
+        suggestions = rng.sample(templates["suggestions"], min(num_suggestions, len(templates["suggestions"])))
         
         # Generate an overall score (1-5)
-        score = random.randint(2, 5)
-        
-        # Format the feedback
-        feedback = f"## Reviewer Feedback\n\n"
-        feedback += f"### Overall Score: {score}/5\n\n"
+        score = rng.randint(2, 5)
         
-        feedback += "### Strengths:\n"
-        for i, strength in enumerate(strengths, 1):
-            feedback += f"{i}. {strength}\n"
-        
-        feedback += "\n### Weaknesses:\n"
-        for i, weakness in enumerate(weaknesses, 1):
-            feedback += f"{i}. {weakness}\n"
+        return {
+            "persona": persona["name"] if persona else "Reviewer",
+            "score": score,
+            "strengths": strengths,
+            "weaknesses": weaknesses,
+            "suggestions": suggestions
+        }
+    
+    def _priority_matches(self, topic, goals, funding_agency, outline=None):
+        """
+        Find the agency's stated priorities that best match the proposal.
         
-        feedback += "\n### Suggestions for Improvement:\n"
-        for i, suggestion in enumerate(suggestions, 1):
-            feedback += f"{i}. {suggestion}\n"
+        Returns:
+            list: Matches, best first (see PriorityIndex.search); None when
+                there is no priority index or no documents for the agency
+        """
+        if self.priority_index is None or not self.priority_index.covers(funding_agency):
+            return None
+        query = "\n".join(part for part in (topic, goals, outline) if part)
+        return self.priority_index.search(query, funding_agency, k=CITED_PRIORITIES, min_score=MIN_CITED_SCORE)
+    
+    def _priority_comments(self, funding_agency, priorities):
+        """Format the comment block citing the agency priorities a proposal matches"""
+        block = f"\n### Alignment with {funding_agency} Priorities:\n"
+        if not priorities:
+            return block + (
+                f"- The proposal does not clearly address any of {funding_agency}'s stated priorities; "
+                "connect its aims to them explicitly.\n"
+            )
+        return block + "The proposal is closest to these stated priorities:\n" + "".join(
+            format_citation(match, score=True) for match in priorities
+        )
+    
+    def _comment_blocks(self, outline=None, budget=None, funding_agency=None, priorities=None):
+        """Yield the comment blocks on priority alignment, the outline and budget"""
+        if priorities is not None:
+            yield self._priority_comments(funding_agency, priorities)
         
         # Add specific comments based on provided information
         if outline:
-            feedback += "\n### Comments on Outline:\n"
-            if "Executive Summary" in outline:
-                feedback += "- The executive summary provides a good overview of the project.\n"
-            if "Methodology" in outline:
-                feedback += "- The methodology section should be expanded to include more details on specific procedures.\n"
-            if "Budget" in outline:
-                feedback += "- Ensure the budget section includes detailed justifications for each category.\n"
+            # Parse the headings once instead of scanning the whole text per check
+            titles = " | ".join(section.title.lower() for section in parse_sections(outline).walk())
+            block = "\n### Comments on Outline:\n"
+            if "executive summary" in titles:
+                block += "- The executive summary provides a good overview of the project.\n"
+            if "methodology" in titles:
+                block += "- The methodology section should be expanded to include more details on specific procedures.\n"
+            if "budget" in titles:
+                block += "- Ensure the budget section includes detailed justifications for each category.\n"
+            yield block
         
         if budget:
-            feedback += "\n### Comments on Budget:\n"
-            total = sum(budget.values())
-            feedback += f"- The total budget of ${total:,.2f} seems {'reasonable' if total < 200000 else 'high'} for this type of project.\n"
+            yield self._budget_comments(budget)
+    
+    def _budget_comments(self, budget):
+        """Format the comment block on a budget"""
+        block = "\n### Comments on Budget:\n"
+        total = sum(budget.values())
+        block += f"- The total budget of ${total:,.2f} seems {'reasonable' if total < 200000 else 'high'} for this type of project.\n"
+        
+        # Comment on specific budget categories
+        if "Personnel" in budget:
+            personnel_percent = (budget["Personnel"] / total) * 100
+            block += f"- Personnel costs represent {personnel_percent:.1f}% of the total budget, which is {'reasonable' if 40 <= personnel_percent <= 70 else 'outside the typical range'}.\n"
+        
+        if "Indirect Costs" in budget or "Administrative Overhead" in budget:
+            indirect_key = "Indirect Costs" if "Indirect Costs" in budget else "Administrative Overhead"
+            indirect_percent = (budget[indirect_key] / total) * 100
+            block += f"- {indirect_key} represent {indirect_percent:.1f}% of the total budget, which is {'acceptable' if indirect_percent <= 35 else 'higher than typically allowed'}.\n"
+        return block
+    
+    @instrumented()
+    async def generate_feedback_async(self, topic, goals, funding_agency=None, outline=None, budget=None):
+        """
+        Async variant of generate_feedback that writes the review with the model backend.
+        
+        Falls back to the template-based feedback when no backend is configured
+        or the request fails.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            outline (str, optional): The proposal outline
+            budget (dict, optional): The proposed budget
+            
+        Returns:
+            str: Formatted reviewer feedback
+        """
+        chunks = untimed(self.stream_feedback_async)(topic, goals, funding_agency, outline, budget)
+        return "".join([chunk async for chunk in chunks])
+    
+    @instrumented()
+    @cached_stream
+    async def stream_feedback_async(self, topic, goals, funding_agency=None, outline=None, budget=None):
+        """
+        Async variant of stream_feedback that streams the model backend's review.
+        
+        Falls back to the template-based feedback when no backend is configured
+        or the request fails before any text was received.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            outline (str, optional): The proposal outline
+            budget (dict, optional): The proposed budget
+            
+        Yields:
+            str: Consecutive pieces of the feedback
+        """
+        if self.backend is None:
+            # Cached by stream_feedback itself
+            for block in self.stream_feedback(topic, goals, funding_agency, outline, budget):
+                yield uncached(block)
+            return
+        
+        from utils.llm import ModelBackendError
+        
+        budget_lines = "\n".join(f"- {category}: ${amount:,.2f}" for category, amount in (budget or {}).items())
+        prompt = (
+            "Review this grant proposal as a study section reviewer. Give an overall score from 1 to 5, "
+            "then strengths, weaknesses and suggestions for improvement, in Markdown.\n\n"
+            f"Topic: {topic}\n"
+            f"Goals: {goals}\n"
+            f"Funding agency: {funding_agency or 'Not specified'}\n\n"
+            f"Outline:\n{outline or 'Not provided'}\n\n"
+            f"Budget:\n{budget_lines or 'Not provided'}"
+        )
+        started = False
+        try:
+            async for chunk in self.backend.stream(prompt, system="You are a critical but fair grant reviewer."):
+                started = True
+                yield chunk
+        except ModelBackendError as e:
+            print(f"Error generating feedback with model backend: {e}")
+            # Do not cache a fallback or a partial review
+            if started:
+                yield uncached("")
+            else:
+                for block in self.stream_feedback(topic, goals, funding_agency, outline, budget):
+                    yield uncached(block)
+    
+    @instrumented()
+    @cached_generation
+    def review_panel(self, topic, goals, funding_agency=None, outline=None, budget=None, reviewers=3, seed=None):
+        """
+        Simulate a study section: several independent reviewers, merged into one review.
+        
+        Each reviewer has its own persona and random seed, and the reviewers
+        are drafted concurrently on a thread pool; use review_panel_async to
+        run model-backed reviewers concurrently on the event loop. A panel
+        drawn without a seed is random, so it is not cached.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            outline (str, optional): The proposal outline
+            budget (dict, optional): The proposed budget
+            reviewers (int): Number of reviewers on the panel
+            seed (int, optional): Base seed; reviewer i uses seed + i
+            
+        Returns:
+            dict: The merged review (see merge_reviews) plus 'feedback', the
+                panel review formatted as Markdown
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        priorities = self._priority_matches(topic, goals, funding_agency, outline)
+        panel = self._panel(reviewers, seed)
+        with ThreadPoolExecutor(max_workers=len(panel), thread_name_prefix="reviewer") as pool:
+            reviews = list(pool.map(
+                lambda seat: self._draft_review(random.Random(seat[1]), seat[0], cited=priorities is not None),
+                panel
+            ))
+        result = self._panel_result(reviews, outline, budget, funding_agency, priorities)
+        # An unseeded panel should be drawn afresh each time, not replayed from the cache
+        return uncached(result) if seed is None else result
+    
+    @instrumented()
+    @cached_generation
+    async def review_panel_async(self, topic, goals, funding_agency=None, outline=None, budget=None,
+                                 reviewers=3, seed=None):
+        """
+        Async variant of review_panel that runs the reviewers concurrently on the model backend.
+        
+        All reviewer requests are in flight at once, so the panel takes about
+        as long as its slowest reviewer rather than the sum of all of them.
+        Reviewers whose request fails fall back to a template review.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            outline (str, optional): The proposal outline
+            budget (dict, optional): The proposed budget
+            reviewers (int): Number of reviewers on the panel
+            seed (int, optional): Base seed; reviewer i uses seed + i
+            
+        Returns:
+            dict: The merged review plus 'feedback', as for review_panel
+        """
+        import asyncio
+        
+        priorities = self._priority_matches(topic, goals, funding_agency, outline)
+        results = await asyncio.gather(*(
+            self._review_async(persona, reviewer_seed, topic, goals, funding_agency, outline, budget,
+                               cited=priorities is not None)
+            for persona, reviewer_seed in self._panel(reviewers, seed)
+        ))
+        reviews = [review for review, _ in results]
+        result = self._panel_result(reviews, outline, budget, funding_agency, priorities)
+        # A panel with template stand-ins should be retried, and an unseeded one redrawn, not cached
+        if seed is None or not all(from_model for _, from_model in results):
+            return uncached(result)
+        return result
+    
+    def _panel(self, reviewers, seed):
+        """Pair each panel seat with a persona and a seed"""
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        return [(REVIEWER_PERSONAS[i % len(REVIEWER_PERSONAS)], seed + i) for i in range(max(1, reviewers))]
+    
+    async def _review_async(self, persona, seed, topic, goals, funding_agency, outline, budget, cited=False):
+        """
+        Get one reviewer's structured review from the model backend.
+        
+        Returns:
+            tuple: (review dict, whether it came from the model)
+        """
+        fallback = self._draft_review(random.Random(seed), persona, cited)
+        if self.backend is None:
+            return fallback, True
+        
+        from utils.llm import ModelBackendError, parse_json_object
+        
+        budget_lines = "\n".join(f"- {category}: ${amount:,.2f}" for category, amount in (budget or {}).items())
+        prompt = (
+            "Review this grant proposal. Return a JSON object with an integer \"score\" from 1 to 5 and "
+            "lists of short sentences under \"strengths\", \"weaknesses\" and \"suggestions\".\n\n"
+            f"Topic: {topic}\n"
+            f"Goals: {goals}\n"
+            f"Funding agency: {funding_agency or 'Not specified'}\n\n"
+            f"Outline:\n{outline or 'Not provided'}\n\n"
+            f"Budget:\n{budget_lines or 'Not provided'}"
+        )
+        try:
+            response = await self.backend.complete(
+                prompt, system=f"You are {persona['description']} on a grant study section.", json_mode=True
+            )
+        except ModelBackendError as e:
+            print(f"Error generating {persona['name']} review with model backend: {e}")
+            return fallback, False
+        
+        data = parse_json_object(response)
+        try:
+            review = {
+                "persona": persona["name"],
+                "score": min(5, max(1, int(data["score"]))),
+                "strengths": [str(point) for point in data.get("strengths", [])],
+                "weaknesses": [str(point) for point in data.get("weaknesses", [])],
+                "suggestions": [str(point) for point in data.get("suggestions", [])]
+            }
+        except (KeyError, TypeError, ValueError):
+            print(f"Error parsing {persona['name']} review from model backend")
+            return fallback, False
+        return review, True
+    
+    def _panel_result(self, reviews, outline, budget, funding_agency=None, priorities=None):
+        result = merge_reviews(reviews)
+        result["feedback"] = format_panel_review(result) + "".join(
+            self._comment_blocks(outline, budget, funding_agency, priorities)
+        )
+        return result
+    
+    @instrumented()
+    def review_incremental(self, topic, goals, funding_agency=None, outline=None, budget=None,
+                           previous_hashes=None):
+        """
+        Review a revised proposal, commenting again only on the sections that changed.
+        
+        Each "##" section is hashed together with its subsections, and its
+        comments are cached by that hash, so sections left untouched since an
+        earlier review reuse their comments, as do the budget comments while
+        the budget is unchanged. The review is deterministic: the rubric score
+        (when a rubric scorer is configured) plus the section and budget
+        comments.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            outline (str, optional): The proposal outline
+            budget (dict, optional): The proposed budget
+            previous_hashes (dict, optional): Section title -> hash of the
+                version reviewed last (see VersionTracker.get_section_hashes);
+                sections that differ from it are marked as updated
+            
+        Returns:
+            dict: 'feedback' (Markdown), 'section_hashes' of this outline,
+                'changed_sections' (titles new or changed since
+                previous_hashes), and 'recomputed' and 'reused', the number of
+                sections whose comments were generated or taken from the cache
+        """
+        sections = sections_by_title(outline)
+        comments = {}
+        recomputed = 0
+        for title, section in sections.items():
+            key = ("section", None, section.tree_hash)
+            comments[title] = self._cached_comments(key)
+            if comments[title] is None:
+                comments[title] = self._remember_comments(key, self._section_comments(section))
+                recomputed += 1
+        priorities = self._priority_matches(topic, goals, funding_agency, outline)
+        return self._incremental_result(sections, comments, recomputed, outline, budget, previous_hashes,
+                                        funding_agency, priorities)
+    
+    @instrumented()
+    async def review_incremental_async(self, topic, goals, funding_agency=None, outline=None, budget=None,
+                                       previous_hashes=None):
+        """
+        Async variant of review_incremental that comments on changed sections with the model backend.
+        
+        Only sections missing from the comment cache are sent to the backend,
+        all at once; a section whose request fails gets the template comments,
+        which are not cached for the model.
+        
+        Args:
+            topic (str): The research or project topic
+            goals (str): The project goals
+            funding_agency (str, optional): The target funding agency
+            outline (str, optional): The proposal outline
+            budget (dict, optional): The proposed budget
+            previous_hashes (dict, optional): Section title -> hash of the
+                version reviewed last
             
-            # Comment on specific budget categories
-            if "Personnel" in budget:
-                personnel_percent = (budget["Personnel"] / total) * 100
-                feedback += f"- Personnel costs represent {personnel_percent:.1f}% of the total budget, which is {'reasonable' if 40 <= personnel_percent <= 70 else 'outside the typical range'}.\n"
+        Returns:
+            dict: As for review_incremental
+        """
+        if self.backend is None:
+            return self.review_incremental(topic, goals, funding_agency, outline, budget, previous_hashes)
+        
+        import asyncio
+        
+        sections = sections_by_title(outline)
+        comments = {}
+        missing = []
+        for title, section in sections.items():
+            key = ("section", self.backend.model, section.tree_hash)
+            comments[title] = self._cached_comments(key)
+            if comments[title] is None:
+                missing.append((title, key, section))
+        
+        results = await asyncio.gather(*(
+            self._section_comments_async(topic, section) for _, _, section in missing
+        ))
+        for (title, key, section), (section_comments, from_model) in zip(missing, results):
+            comments[title] = self._remember_comments(key, section_comments) if from_model else section_comments
+        priorities = self._priority_matches(topic, goals, funding_agency, outline)
+        return self._incremental_result(sections, comments, len(missing), outline, budget, previous_hashes,
+                                        funding_agency, priorities)
+    
+    def remember_reviewed(self, outline=None, budget=None):
+        """
+        Cache the comments on a fully reviewed proposal's sections and budget.
+        
+        Call this once a generate_feedback, stream_feedback or review_panel
+        review is accepted, so the next review_incremental only recomputes
+        the sections edited since. Without a model backend, the section
+        comments are the deterministic template comments review_incremental
+        would compute; with one, they come from the model and are left to
+        review_incremental_async.
+        
+        Args:
+            outline (str, optional): The reviewed outline
+            budget (dict, optional): The reviewed budget
             
-            if "Indirect Costs" in budget or "Administrative Overhead" in budget:
-                indirect_key = "Indirect Costs" if "Indirect Costs" in budget else "Administrative Overhead"
-                indirect_percent = (budget[indirect_key] / total) * 100
-                feedback += f"- {indirect_key} represent {indirect_percent:.1f}% of the total budget, which is {'acceptable' if indirect_percent <= 35 else 'higher than typically allowed'}.\n"
+        Returns:
+            int: Number of sections whose comments were added to the cache
+        """
+        if self.backend is not None:
+            return 0
         
-        return feedback
\ No newline at end of file
+        added = 0
+        for section in sections_by_title(outline).values() if outline else ():
+            key = ("section", None, section.tree_hash)
+            if self._cached_comments(key) is None:
+                self._remember_comments(key, self._section_comments(section))
+                added += 1
+        if budget:
+            key = ("budget", None, json.dumps(budget, sort_keys=True))
+            if self._cached_comments(key) is None:
+                self._remember_comments(key, self._budget_comments(budget))
+        return added
+    
+    def _section_comments(self, section):
+        """Template comments on one section, from its title and length"""
+        title = section.title.lower()
+        comments = [advice for keywords, advice in SECTION_ADVICE if any(keyword in title for keyword in keywords)]
+        words = sum(len(tokenize(part.body)) for part in section.walk())
+        if not words:
+            comments.append("This section has no content yet.")
+        elif words < BRIEF_SECTION_WORDS:
+            comments.append(f"This section is brief ({words} word{'s' if words > 1 else ''}); add specific details.")
+        return comments or ["No specific concerns."]
+    
+    async def _section_comments_async(self, topic, section):
+        """
+        Get comments on one section from the model backend.
+        
+        Returns:
+            tuple: (list of comments, whether they came from the model)
+        """
+        from utils.llm import ModelBackendError
+        
+        prompt = (
+            f"Review this section of a grant proposal on \"{topic}\". Reply with at most three short "
+            "comments as a Markdown list, one per line.\n\n"
+            f"{section.to_markdown()}"
+        )
+        try:
+            response = await self.backend.complete(prompt, system="You are a critical but fair grant reviewer.")
+        except ModelBackendError as e:
+            print(f"Error reviewing section '{section.title}' with model backend: {e}")
+            return self._section_comments(section), False
+        
+        comments = [line.strip().lstrip("-*0123456789. ").strip() for line in response.splitlines()]
+        comments = [comment for comment in comments if comment]
+        return (comments, True) if comments else (self._section_comments(section), False)
+    
+    def _cached_comments(self, key):
+        with self._comment_lock:
+            comments = self._comment_cache.get(key)
+            if comments is not None:
+                self._comment_cache.move_to_end(key)
+            return comments
+    
+    def _remember_comments(self, key, comments):
+        with self._comment_lock:
+            self._comment_cache[key] = comments
+            while len(self._comment_cache) > COMMENT_CACHE_SIZE:
+                self._comment_cache.popitem(last=False)
+        return comments
+    
+    def _incremental_result(self, sections, comments, recomputed, outline, budget, previous_hashes,
+                            funding_agency=None, priorities=None):
+        """Assemble the incremental review from the section comments"""
+        hashes = {title: section.tree_hash for title, section in sections.items()}
+        changed = [
+            title for title, digest in hashes.items()
+            if previous_hashes is None or previous_hashes.get(title) != digest
+        ]
+        
+        feedback = "## Reviewer Feedback\n\n"
+        if self.rubric_scorer is not None:
+            rubric = self.rubric_scorer.score(outline, budget)
+            feedback += f"### Overall Score: {rubric['score']}/5\n\n" + format_rubric(rubric)
+        
+        if priorities is not None:
+            feedback += self._priority_comments(funding_agency, priorities).lstrip("\n") + "\n"
+        
+        if sections:
+            feedback += "### Section Comments:\n"
+            for title, section_comments in comments.items():
+                marker = " (updated)" if previous_hashes is not None and title in changed else ""
+                feedback += f"\n**{title}**{marker}\n" + "".join(f"- {comment}\n" for comment in section_comments)
+        
+        if budget:
+            key = ("budget", None, json.dumps(budget, sort_keys=True))
+            block = self._cached_comments(key)
+            if block is None:
+                block = self._remember_comments(key, self._budget_comments(budget))
+            feedback += block
+        
+        return {
+            "feedback": feedback,
+            "section_hashes": hashes,
+            "changed_sections": changed,
+            "recomputed": recomputed,
+            "reused": len(sections) - recomputed
+        }
+
+
+# Personas for panel reviewers; panels larger than this list reuse them in order
+REVIEWER_PERSONAS = [
+    {"name": "Methodologist", "description": "a reviewer focused on research design, methods and evaluation"},
+    {"name": "Domain Expert", "description": "a senior researcher judging significance and novelty in the field"},
+    {"name": "Program Officer", "description": "a program officer checking alignment with the agency's priorities"},
+    {"name": "Budget Analyst", "description": "a reviewer focused on cost realism and budget justification"},
+    {"name": "Impact Reviewer", "description": "a reviewer focused on expected outcomes and broader impacts"},
+]
+
+# Title keywords -> advice given on sections with a matching heading
+SECTION_ADVICE = [
+    (("executive summary", "abstract", "project summary"),
+     "Keep the summary to one page covering the problem, approach and expected impact."),
+    (("problem", "need", "background", "significance"),
+     "Support the significance of the problem with recent data or literature."),
+    (("goals", "objectives", "aims"), "Make each objective specific and measurable."),
+    (("methodology", "methods", "approach", "research design"),
+     "Describe the specific procedures, data sources and analysis for each objective."),
+    (("timeline", "schedule", "milestones"), "Tie each milestone to a deliverable and a target date."),
+    (("budget",), "Justify each budget category and link it to project activities."),
+    (("evaluation", "outcomes", "expected results"), "Define metrics and targets for each expected outcome."),
+    (("priorities", "alignment"), "Cite the agency's stated priorities that the project addresses."),
+]
+
+# Sections (with their subsections) shorter than this many words are flagged as brief
+BRIEF_SECTION_WORDS = 50
+
+# Section and budget comment sets kept by each reviewer for incremental reviews
+COMMENT_CACHE_SIZE = 1024
+
+# Word overlap (Jaccard) above which two review points count as the same point
+DUPLICATE_THRESHOLD = 0.6
+
+
+def _point_words(point):
+    return frozenset(word.strip(".,;:!?()\"'").lower() for word in point.split()) - {""}
+
+
+def _group_points(reviews, key):
+    """
+    Group near-identical points raised by different reviewers.
+    
+    Returns:
+        list: {'text', 'reviewers'} dicts, most widely raised first
+    """
+    groups = []
+    for index, review in enumerate(reviews):
+        for point in review[key]:
+            words = _point_words(point)
+            for group in groups:
+                union = words | group["words"]
+                if union and len(words & group["words"]) / len(union) >= DUPLICATE_THRESHOLD:
+                    group["reviewers"].add(index)
+                    break
+            else:
+                groups.append({"text": point, "words": words, "reviewers": {index}})
+    
+    # Stable sort keeps the order in which points were first raised among ties
+    groups.sort(key=lambda group: -len(group["reviewers"]))
+    return [{"text": group["text"], "reviewers": len(group["reviewers"])} for group in groups]
+
+
+def merge_reviews(reviews):
+    """
+    Merge independent reviews into one panel review.
+    
+    Args:
+        reviews (list): Review dicts with 'persona', 'score', 'strengths',
+            'weaknesses' and 'suggestions'
+        
+    Returns:
+        dict: 'reviews' (persona and score of each reviewer), 'score_mean',
+            'score_variance' (population variance), 'score_min', 'score_max',
+            deduplicated 'strengths' and 'weaknesses', and 'suggestions'
+            raised by a majority of the reviewers (or the most common ones if
+            no suggestion reaches a majority)
+    """
+    import statistics
+    
+    scores = [review["score"] for review in reviews]
+    suggestions = _group_points(reviews, "suggestions")
+    majority = len(reviews) // 2 + 1
+    consensus = [point for point in suggestions if point["reviewers"] >= majority]
+    if not consensus and suggestions:
+        top = suggestions[0]["reviewers"]
+        consensus = [point for point in suggestions if point["reviewers"] == top]
+    
+    return {
+        "reviews": [{"persona": review["persona"], "score": review["score"]} for review in reviews],
+        "score_mean": statistics.fmean(scores),
+        "score_variance": statistics.pvariance(scores),
+        "score_min": min(scores),
+        "score_max": max(scores),
+        "strengths": _group_points(reviews, "strengths"),
+        "weaknesses": _group_points(reviews, "weaknesses"),
+        "suggestions": consensus
+    }
+
+
+def format_rubric(rubric):
+    """
+    Format a rubric result as a Markdown feedback block.
+    
+    Args:
+        rubric (dict): Result of RubricScorer.score
+        
+    Returns:
+        str: The rubric breakdown
+    """
+    block = f"### Rubric: {rubric['points']:g}/{rubric['max_points']:g} points\n"
+    for name, result in rubric["criteria"].items():
+        if not (result["passed"] or result["failed"]):
+            continue
+        block += f"- {name.replace('_', ' ').capitalize()}: {result['points']:.1f}/{result['weight']:g}"
+        if result["failed"]:
+            block += f" (missing: {', '.join(result['failed'])})"
+        block += "\n"
+    return block + "\n"
+
+
+def format_panel_review(merged):
+    """
+    Format a merged panel review as Markdown.
+    
+    Args:
+        merged (dict): Result of merge_reviews
+        
+    Returns:
+        str: The panel review
+    """
+    panel_size = len(merged["reviews"])
+    
+    def points(items):
+        return "".join(
+            f"{i}. {item['text']} ({item['reviewers']} of {panel_size} reviewers)\n"
+            for i, item in enumerate(items, 1)
+        )
+    
+    feedback = f"## Panel Review ({panel_size} reviewers)\n\n"
+    feedback += (
+        f"### Overall Score: {merged['score_mean']:.1f}/5 "
+        f"(variance {merged['score_variance']:.2f}, range {merged['score_min']}-{merged['score_max']})\n\n"
+    )
+    feedback += "".join(f"- {review['persona']}: {review['score']}/5\n" for review in merged["reviews"])
+    feedback += "\n### Strengths:\n" + points(merged["strengths"])
+    feedback += "\n### Weaknesses:\n" + points(merged["weaknesses"])
+    feedback += "\n### Consensus Suggestions:\n" + points(merged["suggestions"])
+    return feedback
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import threading
+
+from utils.instrumentation import instrumented
+from utils.sections import SectionIndex, SectionTermCache
+
+# Default review rubric. Each criterion has a weight; a proposal earns the
+# weight times the fraction of the criterion's checks it passes.
+DEFAULT_RUBRIC = {
+    "required_sections": {
+        "weight": 4,
+        # Section -> heading names that count as that section
+        "sections": {
+            "Executive Summary": ["executive summary", "abstract", "project summary"],
+            "Problem Statement": ["problem statement", "need statement", "introduction", "background"],
+            "Goals and Objectives": ["goals", "objectives", "specific aims"],
+            "Methodology": ["methodology", "methods", "research design", "approach", "implementation"],
+            "Evaluation": ["evaluation", "expected results", "outcomes", "impact"],
+            "Timeline": ["timeline", "schedule", "work plan"],
+            "Budget": ["budget"]
+        }
+    },
+    "keyword_coverage": {
+        "weight": 3,
+        # Topic -> terms or phrases; a topic is covered if any of them occurs.
+        # Terms match exactly, so plurals and other forms are listed too.
+        "groups": {
+            "Measurable outcomes": ["outcome", "outcomes", "metric", "metrics", "measure", "measures",
+                                    "measurement", "measurements", "result", "results"],
+            "Data and analysis": ["data", "analysis", "analyses", "statistical"],
+            "Sustainability": ["sustainability", "sustainable", "long term"],
+            "Evaluation plan": ["evaluation", "evaluations", "assessment", "assessments"],
+            "Prior work": ["literature", "prior work", "previous work", "prior studies", "background"]
+        }
+    },
+    "budget_ratios": {
+        "weight": 3,
+        # Share of the total budget allowed for a category (or any of several names)
+        "ratios": [
+            {"categories": ["Personnel"], "min": 0.4, "max": 0.7},
+            {"categories": ["Indirect Costs", "Administrative Overhead"], "max": 0.35}
+        ]
+    }
+}
+
+
+def load_rubric(path):
+    """
+    Load a rubric from a JSON or YAML file.
+
+    Criteria missing from the file keep their default definition.
+
+    Args:
+        path (str): Path to the rubric file
+
+    Returns:
+        dict: The rubric
+    """
+    with open(path, 'rb') as f:
+        if path.endswith('.json'):
+            rubric = json.load(f)
+        else:
+            import yaml
+            rubric = yaml.safe_load(f)
+    return {**DEFAULT_RUBRIC, **(rubric or {})}
+
+
+class RubricScorer:
+    """
+    Deterministic rubric scoring of a proposal outline and budget.
+
+    The outline is parsed once into a section tree with an inverted term
+    index, and every rubric check is a lookup in that index. Term counts are
+    cached per section hash, so re-scoring an edited proposal only tokenizes
+    the sections that changed.
+    """
+
+    def __init__(self, rubric=None, max_sections=8192):
+        """
+        Initialize the scorer.
+
+        Args:
+            rubric (dict, optional): Rubric in the shape of DEFAULT_RUBRIC
+            max_sections (int): Number of sections whose term counts are cached
+        """
+        self.rubric = rubric or DEFAULT_RUBRIC
+        # Identifies the rubric in response cache keys
+        self.version = hashlib.sha256(json.dumps(self.rubric, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        self.term_cache = SectionTermCache(max_sections)
+        self._lock = threading.Lock()
+        self._index = SectionIndex(term_cache=self.term_cache)
+
+    @instrumented()
+    def score(self, outline, budget=None):
+        """
+        Score a proposal against the rubric.
+
+        Args:
+            outline (str): The proposal outline or full text (Markdown)
+            budget (dict, optional): Budget category -> amount
+
+        Returns:
+            dict: 'score' (1-5), 'points', 'max_points', and 'criteria', a
+                dict of per-criterion results with 'points', 'weight',
+                'passed' and 'failed' check names. Criteria with no checks
+                to run are left out of the points.
+        """
+        with self._lock:
+            # Updating the previous index in place only touches the postings
+            # of sections that changed, the common case when re-scoring
+            self._index.update(outline or "")
+            criteria = {}
+            if "required_sections" in self.rubric:
+                criteria["required_sections"] = self._required_sections(self.rubric["required_sections"])
+            if "keyword_coverage" in self.rubric:
+                criteria["keyword_coverage"] = self._keyword_coverage(self.rubric["keyword_coverage"])
+        if "budget_ratios" in self.rubric:
+            criteria["budget_ratios"] = self._budget_ratios(self.rubric["budget_ratios"], budget)
+
+        # Criteria with nothing to check (e.g. no budget given) do not count
+        applicable = [result for result in criteria.values() if result["passed"] or result["failed"]]
+        points = sum(result["points"] for result in applicable)
+        max_points = sum(result["weight"] for result in applicable)
+        fraction = points / max_points if max_points else 0.0
+        return {
+            "score": 1 + round(4 * fraction),
+            "points": round(points, 2),
+            "max_points": max_points,
+            "criteria": criteria
+        }
+
+    @staticmethod
+    def _result(weight, passed, failed):
+        checks = len(passed) + len(failed)
+        return {
+            "weight": weight,
+            "points": weight * len(passed) / checks if checks else 0.0,
+            "passed": passed,
+            "failed": failed
+        }
+
+    def _required_sections(self, criterion):
+        passed, failed = [], []
+        for name, aliases in criterion["sections"].items():
+            (passed if self._index.find_sections(*aliases) else failed).append(name)
+        return self._result(criterion["weight"], passed, failed)
+
+    def _keyword_coverage(self, criterion):
+        passed, failed = [], []
+        for name, terms in criterion["groups"].items():
+            (passed if any(self._index.has_phrase(term) for term in terms) else failed).append(name)
+        return self._result(criterion["weight"], passed, failed)
+
+    def _budget_ratios(self, criterion, budget):
+        if not budget:
+            return self._result(criterion["weight"], [], [])
+
+        total = sum(budget.values())
+        passed, failed = [], []
+        for ratio in criterion["ratios"]:
+            category = next((name for name in ratio["categories"] if name in budget), None)
+            if category is None or not total:
+                continue
+            share = budget[category] / total
+            ok = ratio.get("min", 0.0) <= share <= ratio.get("max", 1.0)
+            (passed if ok else failed).append(f"{category} share {share:.0%}")
+        return self._result(criterion["weight"], passed, failed)
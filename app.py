@@ -1,14 +1,22 @@
 import streamlit as st
 import os
 import json
+import io
+import uuid
 from datetime import datetime
+from functools import partial
 import pandas as pd
 
-# Import agent modules
-from agents.outline_designer import OutlineDesigner
-from agents.budget_estimator import BudgetEstimator
-from agents.reviewer import ReviewerSimulation
-from utils.memory import VersionTracker
+# Agents are built once per process and shared across reruns and sessions
+from utils.currency import currency_symbol, format_amount
+from utils.diagnostics import show_agent_diagnostics, show_diagnostics_page
+from utils.instrumentation import metrics
+from utils.jobs import CANCELLED, DONE, QUEUED, QueueFullError
+from utils.registry import get_agent, registry
+from utils.storage import ProposalStore
+
+# Construction stats at the start of this rerun, for the diagnostics panel
+construction_stats_before = registry.stats()
 
 # Set page configuration
 st.set_page_config(
@@ -32,11 +40,179 @@ if 'current_proposal' not in st.session_state:
         'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
-if 'proposals' not in st.session_state:
-    st.session_state.proposals = []
+# Shared version tracker (persists across reruns)
+version_tracker = get_agent("version_tracker")
+
+# Persistent proposal store (shared SQLite connection per process)
+proposal_store = ProposalStore(os.environ.get("GRANT_ASSISTANT_DB", "proposals.db"))
+
+# Most recently updated saved proposals, without their version payloads
+st.session_state.proposals = proposal_store.list_proposals(limit=20)
+
+# Agent work runs on a shared pool of background workers, queued fairly per
+# session; the session only keeps the ids of its pending jobs
+job_scheduler = get_agent("job_scheduler")
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {}
+# Identifies the proposal currently open in this session; jobs remember the
+# token they were submitted under, so results never land on another proposal
+if 'proposal_token' not in st.session_state:
+    st.session_state.proposal_token = uuid.uuid4().hex
+
+# Seconds a rerun waits for a new job before polling, so quick jobs such as
+# template-based generation show their result right away
+JOB_INLINE_WAIT = 0.25
+
+
+def save_proposal_version(rationale):
+    """Record the current proposal in the version history and the proposal store; returns the history version number."""
+    proposal = st.session_state.current_proposal
+    with metrics.request("save_proposal_version"):
+        version_number = version_tracker.save_version(proposal, rationale)
+        
+        if not proposal.get('id'):
+            proposal['id'] = proposal_store.create_proposal(proposal)
+        proposal['version'] = proposal_store.save_version(proposal['id'], proposal, rationale)
+    return version_number
+
+
+def call_agent(agent, method, **kwargs):
+    """Call an agent method, using its async model-backed variant when a backend is configured."""
+    with metrics.request(f"{type(agent).__name__}.{method}"):
+        if getattr(agent, 'backend', None) is not None:
+            from utils.llm import run_sync
+            return run_sync(getattr(agent, f"{method}_async")(**kwargs))
+        return getattr(agent, method)(**kwargs)
+
+
+def stream_agent(agent, method, **kwargs):
+    """Like call_agent, for streaming agent methods; returns a chunk iterator for st.write_stream."""
+    def chunks():
+        with metrics.request(f"{type(agent).__name__}.{method}"):
+            if getattr(agent, 'backend', None) is not None:
+                from utils.llm import iter_sync
+                yield from iter_sync(getattr(agent, f"{method}_async")(**kwargs))
+            else:
+                yield from getattr(agent, method)(**kwargs)
+    return chunks()
+
+
+def submit_agent_job(purpose, agent, method, stream=False, **kwargs):
+    """
+    Run an agent method as a background job for this session.
+    
+    Only one job per purpose ("outline", "budget" or "feedback") is pending at
+    a time; collect_jobs() applies its result once it is done, as long as the
+    same proposal is still open.
+    """
+    run = stream_agent if stream else call_agent
+    try:
+        job = job_scheduler.submit(
+            st.session_state.session_id, f"{type(agent).__name__}.{method}",
+            partial(run, agent, method, **kwargs)
+        )
+    except QueueFullError as e:
+        st.error(f"Too many requests in progress: {e}")
+        return
+    
+    previous = st.session_state.jobs.get(purpose)
+    if previous:
+        job_scheduler.cancel(previous['id'])
+    st.session_state.jobs[purpose] = {
+        'id': job.id,
+        'proposal': st.session_state.proposal_token,
+        'incremental': method == "review_incremental"
+    }
+    if job.wait(JOB_INLINE_WAIT):
+        collect_jobs()
+
 
-# Initialize version tracker
-version_tracker = VersionTracker()
+def collect_jobs():
+    """Apply the results of this session's finished jobs to the current proposal."""
+    proposal = st.session_state.current_proposal
+    for purpose, entry in list(st.session_state.jobs.items()):
+        job = job_scheduler.get(entry['id'])
+        if entry['proposal'] != st.session_state.proposal_token:
+            # Submitted for a proposal that is no longer open
+            job_scheduler.cancel(entry['id'])
+            del st.session_state.jobs[purpose]
+            continue
+        if job is not None and not job.done:
+            continue
+        del st.session_state.jobs[purpose]
+        if job is None or job.state == CANCELLED:
+            continue
+        if job.state != DONE:
+            st.error(f"Error running {job.name}: {job.error}")
+            continue
+        
+        if purpose == "outline":
+            proposal['outline'] = job.result
+            rationale = "Generated outline"
+        elif purpose == "budget":
+            proposal['budget'] = job.result
+            rationale = "Generated budget estimate"
+        else:
+            review = job.result
+            if entry['incremental']:
+                st.session_state.review_note = (
+                    f"Re-reviewed {review['recomputed']} sections, reused comments on {review['reused']} "
+                    f"({len(review['changed_sections'])} changed since the last review)"
+                )
+            proposal['feedback'] = review if isinstance(review, str) else review['feedback']
+            rationale = "Generated reviewer feedback"
+        proposal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Save to version history
+        version_number = save_proposal_version(rationale)
+        if purpose == "feedback":
+            proposal['reviewed_version'] = version_number
+            if not entry['incremental']:
+                # So the next incremental review reuses the comments on unchanged sections
+                get_agent("reviewer").remember_reviewed(proposal['outline'], proposal.get('budget'))
+
+
+def open_proposal(proposal, proposal_id):
+    """Make a saved proposal the current one, cancelling the jobs submitted for the previous one."""
+    for entry in st.session_state.jobs.values():
+        job_scheduler.cancel(entry['id'])
+    st.session_state.jobs = {}
+    st.session_state.current_proposal = proposal
+    st.session_state.current_proposal['id'] = proposal_id
+    st.session_state.proposal_token = uuid.uuid4().hex
+
+
+def budget_table(ledger, currencies):
+    """Format the amount columns of a budget ledger with currency symbols for display."""
+    return ledger.style.format({f"Amount ({currency})": currency_symbol(currency) + "{:,.2f}" for currency in currencies})
+
+
+@st.fragment(run_every=1)
+def show_job(purpose):
+    """Show the progress of a pending job, refreshing every second until it is done."""
+    entry = st.session_state.jobs.get(purpose)
+    job = job_scheduler.get(entry['id']) if entry else None
+    if job is None:
+        return
+    if job.done:
+        # Rerun the whole app so collect_jobs() applies the result
+        st.rerun()
+    
+    if job.cancelling:
+        st.info("Cancelling...")
+        return
+    if job.state == QUEUED:
+        st.info(f"Waiting for a free worker ({job_scheduler.position(job.id)} requests ahead)...")
+    else:
+        st.info(f"Working... ({job.run_seconds:.0f} s)")
+        # Streaming jobs show what they have produced so far
+        if job.chunks:
+            st.markdown(job.partial_text())
+    if st.button("Cancel", key=f"cancel_{purpose}"):
+        job_scheduler.cancel(job.id)
+        st.rerun()
 
 # Title and description
 st.title("AI-Powered Grant Proposal Assistant")
@@ -45,10 +221,51 @@ This application helps researchers and nonprofits draft effective grant proposal
 Input your project details and use the different tools to develop your proposal.
 """)
 
+# Apply results of jobs that finished since the last rerun
+collect_jobs()
+
 # Sidebar for navigation
 st.sidebar.title("Navigation")
 page = st.sidebar.radio("Go to", ["Input Details", "Outline Designer", "Budget Estimator", "Reviewer Simulation"])
 
+# Hidden diagnostics page, opened by adding ?diagnostics to the URL
+if "diagnostics" in st.query_params:
+    page = "Diagnostics"
+
+# Load a previously saved proposal
+if st.session_state.proposals:
+    st.sidebar.subheader("Saved Proposals")
+    saved = st.sidebar.selectbox(
+        "Open proposal",
+        st.session_state.proposals,
+        format_func=lambda p: f"{p['topic'] or 'Untitled'} (v{p['latest_version']}, {p['updated_at']})"
+    )
+    if st.sidebar.button("Load Proposal"):
+        latest = proposal_store.get_latest_version(saved['id'])
+        if latest:
+            open_proposal(latest['proposal'], saved['id'])
+            st.rerun()
+
+# Full-text search over every saved version, without loading their payloads
+with st.sidebar.expander("Search History"):
+    search_query = st.text_input("Search outlines, feedback and rationales", help='Put "quotes" around phrases')
+    search_agency = st.text_input("Funding agency", key="search_agency")
+    search_since = st.date_input("Saved since", value=None, key="search_since")
+    if search_query:
+        results = proposal_store.search_versions(
+            search_query, funding_agency=search_agency or None, since=search_since, limit=10
+        )
+        if not results:
+            st.caption("No matching versions")
+        for result in results:
+            st.markdown(f"**{result['topic'] or 'Untitled'}** v{result['version']} ({result['created_at']})")
+            # Snippets span lines of Markdown; show them as one line of text
+            st.caption(" ".join(result['snippet'].split()))
+            if st.button("Open", key=f"open_{result['proposal_id']}_{result['version']}"):
+                version = proposal_store.get_version(result['proposal_id'], result['version'])
+                open_proposal(version['proposal'], result['proposal_id'])
+                st.rerun()
+
 # Input Details Page
 if page == "Input Details":
     st.header("Project Details")
@@ -69,7 +286,7 @@ if page == "Input Details":
             st.session_state.current_proposal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             # Save to version history
-            version_tracker.save_version(st.session_state.current_proposal, "Updated project details")
+            save_proposal_version("Updated project details")
             
             st.success("Project details saved successfully!")
 
@@ -84,21 +301,18 @@ elif page == "Outline Designer":
         st.write(f"Generating outline for: **{st.session_state.current_proposal['topic']}**")
         
         # Initialize outline designer agent
-        outline_designer = OutlineDesigner()
+        outline_designer = get_agent("outline_designer")
         
         if st.button("Generate Outline"):
-            with st.spinner("Generating outline..."):
-                outline = outline_designer.generate_outline(
-                    topic=st.session_state.current_proposal['topic'],
-                    goals=st.session_state.current_proposal['goals'],
-                    funding_agency=st.session_state.current_proposal['funding_agency']
-                )
-                
-                st.session_state.current_proposal['outline'] = outline
-                st.session_state.current_proposal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Save to version history
-                version_tracker.save_version(st.session_state.current_proposal, "Generated outline")
+            # Sections are shown as they are produced while the job runs
+            submit_agent_job(
+                "outline", outline_designer, "stream_outline", stream=True,
+                topic=st.session_state.current_proposal['topic'],
+                goals=st.session_state.current_proposal['goals'],
+                funding_agency=st.session_state.current_proposal['funding_agency']
+            )
+        if "outline" in st.session_state.jobs:
+            show_job("outline")
         
         # Display current outline if it exists
         if st.session_state.current_proposal['outline']:
@@ -113,7 +327,7 @@ elif page == "Outline Designer":
                 st.session_state.current_proposal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
                 # Save to version history
-                version_tracker.save_version(st.session_state.current_proposal, "Edited outline")
+                save_proposal_version("Edited outline")
                 
                 st.success("Outline saved successfully!")
 
@@ -128,61 +342,136 @@ elif page == "Budget Estimator":
         st.write(f"Estimating budget for: **{st.session_state.current_proposal['topic']}**")
         
         # Initialize budget estimator agent
-        budget_estimator = BudgetEstimator()
+        budget_estimator = get_agent("budget_estimator")
         
         # Input for budget parameters
         project_duration = st.slider("Project Duration (months)", 1, 60, 12)
         team_size = st.slider("Team Size (people)", 1, 20, 3)
         
-        if st.button("Generate Budget Estimate"):
-            with st.spinner("Estimating budget..."):
-                budget = budget_estimator.estimate_budget(
-                    topic=st.session_state.current_proposal['topic'],
-                    goals=st.session_state.current_proposal['goals'],
-                    funding_agency=st.session_state.current_proposal['funding_agency'],
-                    duration=project_duration,
-                    team_size=team_size
-                )
-                
-                st.session_state.current_proposal['budget'] = budget
-                st.session_state.current_proposal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Currencies budgets are shown and exported in
+        rate_table = budget_estimator.rate_table
+        available_currencies = rate_table.currencies()
+        currencies = st.multiselect(
+            "Currencies", available_currencies,
+            default=[currency for currency in ("USD", "INR") if currency in available_currencies]
+        ) or ["USD"]
+        
+        # Budgets for every slider position are computed once per template, so sweeping is instant
+        if st.checkbox("What-if mode", help="Compare template budgets across durations and team sizes without re-estimating"):
+            grid = budget_estimator.budget_grid(st.session_state.current_proposal['topic'])
+            
+            col1, col2 = st.columns([2, 3])
+            with col1:
+                st.metric(f"Total for {project_duration} months, {team_size} people",
+                          f"${grid.total(project_duration, team_size):,.2f}")
+                st.table(budget_table(rate_table.budget_ledger(grid.budget(project_duration, team_size), currencies),
+                                      currencies))
                 
-                # Save to version history
-                version_tracker.save_version(st.session_state.current_proposal, "Generated budget estimate")
+                if st.button("Use This Estimate"):
+                    st.session_state.current_proposal['budget'] = grid.budget(project_duration, team_size)
+                    st.session_state.current_proposal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    
+                    # Save to version history
+                    save_proposal_version("Chose what-if budget estimate")
+            
+            with col2:
+                # A plain Vega-Lite spec: building it costs nothing per rerun,
+                # and the selected cell is outlined by filtering the same data
+                axes = {
+                    'x': {'field': "team_size", 'type': "ordinal", 'title': "Team Size"},
+                    'y': {'field': "duration", 'type': "ordinal", 'title': "Duration (months)", 'sort': "descending"}
+                }
+                st.vega_lite_chart(grid.totals_frame().stack().rename("Total").reset_index(), {
+                    'height': 480,
+                    'layer': [
+                        {
+                            'mark': "rect",
+                            'encoding': {
+                                **axes,
+                                'color': {'field': "Total", 'type': "quantitative", 'title': "Total (USD)",
+                                          'scale': {'scheme': "blues"}},
+                                'tooltip': [
+                                    {'field': "duration", 'title': "Duration (months)"},
+                                    {'field': "team_size", 'title': "Team Size"},
+                                    {'field': "Total", 'type': "quantitative", 'format': "$,.0f"}
+                                ]
+                            }
+                        },
+                        {
+                            'transform': [{'filter': f"datum.duration == {project_duration} && datum.team_size == {team_size}"}],
+                            'mark': {'type': "rect", 'fill': None, 'stroke': "red", 'strokeWidth': 2},
+                            'encoding': axes
+                        }
+                    ]
+                }, use_container_width=True)
+            
+            st.caption(f"Built from the '{grid.template}' budget template with a fixed variation (seed {grid.seed}).")
+            st.download_button(
+                label="Download What-if Grid as CSV",
+                data=grid.to_csv(),
+                file_name="budget_what_if_grid.csv",
+                mime="text/csv"
+            )
+        
+        if st.button("Generate Budget Estimate"):
+            submit_agent_job(
+                "budget", budget_estimator, "estimate_budget",
+                topic=st.session_state.current_proposal['topic'],
+                goals=st.session_state.current_proposal['goals'],
+                funding_agency=st.session_state.current_proposal['funding_agency'],
+                duration=project_duration,
+                team_size=team_size
+            )
+        if "budget" in st.session_state.jobs:
+            show_job("budget")
         
         # Display current budget if it exists
         if st.session_state.current_proposal.get('budget'):
             st.subheader("Budget Estimate")
             
-            # Convert budget to DataFrame for display
-            budget_df = pd.DataFrame(st.session_state.current_proposal['budget'].items(), columns=['Category', 'Amount (USD)'])
+            # One converted table feeds the display, the totals and both downloads
+            ledger = rate_table.budget_ledger(st.session_state.current_proposal['budget'], currencies)
+            st.table(budget_table(ledger, currencies))
             
-            # Add INR column (using conversion rate of 1 USD = 75 INR)
-            budget_df['Amount (INR)'] = budget_df['Amount (USD)'].apply(lambda x: x * 75)
+            # Display the total in every selected currency
+            totals = [format_amount(ledger[f"Amount ({currency})"].sum(), currency) for currency in currencies]
+            st.write(f"**Total Budget: {totals[0]}" + (f" ({', '.join(totals[1:])})" if len(totals) > 1 else "") + "**")
+            st.caption(f"Exchange rates as of {rate_table.rates()[0]}")
             
-            # Format the currency values
-            budget_df['Amount (USD)'] = budget_df['Amount (USD)'].apply(lambda x: f"${x:,.2f}")
-            budget_df['Amount (INR)'] = budget_df['Amount (INR)'].apply(lambda x: f"₹{x:,.2f}")
-            
-            st.table(budget_df)
-            
-            # Display total in both currencies
-            total_usd = sum(st.session_state.current_proposal['budget'].values())
-            total_inr = total_usd * 75
-            st.write(f"**Total Budget: ${total_usd:,.2f} (₹{total_inr:,.2f})**")
-            
-            # Allow downloading budget as CSV
-            # Create a copy of the DataFrame with numeric values for CSV export
-            export_df = pd.DataFrame(st.session_state.current_proposal['budget'].items(), columns=['Category', 'Amount (USD)'])
-            export_df['Amount (INR)'] = export_df['Amount (USD)'] * 75
-            csv = export_df.to_csv(index=False)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label="Download Budget as CSV",
+                    data=ledger.to_csv(index=False),
+                    file_name="budget_estimate.csv",
+                    mime="text/csv"
+                )
+            with col2:
+                parquet = io.BytesIO()
+                ledger.to_parquet(parquet, index=False)
+                st.download_button(
+                    label="Download Budget as Parquet",
+                    data=parquet.getvalue(),
+                    file_name="budget_estimate.parquet",
+                    mime="application/octet-stream"
+                )
             
-            st.download_button(
-                label="Download Budget as CSV",
-                data=csv,
-                file_name="budget_estimate.csv",
-                mime="text/csv"
-            )
+            # Show how spread out the cost could be
+            if st.checkbox("Show cost uncertainty (Monte Carlo simulation)"):
+                with st.spinner("Simulating budgets..."):
+                    simulation = budget_estimator.simulate_budget(
+                        topic=st.session_state.current_proposal['topic'],
+                        goals=st.session_state.current_proposal['goals'],
+                        funding_agency=st.session_state.current_proposal['funding_agency'],
+                        duration=project_duration,
+                        team_size=team_size,
+                        n_samples=200000,
+                        seed=0
+                    )
+                
+                total = simulation['total']
+                st.write(f"**Total Budget Range (USD): P10 ${total['P10']:,.0f} · P50 ${total['P50']:,.0f} · P90 ${total['P90']:,.0f}**")
+                st.table(pd.DataFrame(simulation['categories']).T[['P10', 'P50', 'P90']])
 
 # Reviewer Simulation Page
 elif page == "Reviewer Simulation":
@@ -195,28 +484,50 @@ elif page == "Reviewer Simulation":
         st.write("Simulating reviewer feedback for your proposal")
         
         # Initialize reviewer simulation agent
-        reviewer = ReviewerSimulation()
+        reviewer = get_agent("reviewer")
+        
+        # A panel of several reviewers is merged into one review
+        panel_size = st.slider("Number of Reviewers", min_value=1, max_value=5, value=1)
+        
+        # After a first review, only sections edited since then need new comments
+        reviewed_version = st.session_state.current_proposal.get('reviewed_version')
+        incremental = panel_size == 1 and reviewed_version is not None and st.checkbox(
+            "Only re-review changed sections", value=True
+        )
         
         if st.button("Generate Reviewer Feedback"):
-            with st.spinner("Generating feedback..."):
-                feedback = reviewer.generate_feedback(
-                    topic=st.session_state.current_proposal['topic'],
-                    goals=st.session_state.current_proposal['goals'],
-                    funding_agency=st.session_state.current_proposal['funding_agency'],
-                    outline=st.session_state.current_proposal['outline'],
-                    budget=st.session_state.current_proposal.get('budget', {})
-                )
-                
-                st.session_state.current_proposal['feedback'] = feedback
-                st.session_state.current_proposal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Save to version history
-                version_tracker.save_version(st.session_state.current_proposal, "Generated reviewer feedback")
+            review_inputs = {
+                'topic': st.session_state.current_proposal['topic'],
+                'goals': st.session_state.current_proposal['goals'],
+                'funding_agency': st.session_state.current_proposal['funding_agency'],
+                'outline': st.session_state.current_proposal['outline'],
+                'budget': st.session_state.current_proposal.get('budget', {})
+            }
+            if incremental:
+                submit_agent_job("feedback", reviewer, "review_incremental",
+                                 previous_hashes=version_tracker.get_section_hashes(reviewed_version),
+                                 **review_inputs)
+            elif panel_size > 1:
+                submit_agent_job("feedback", reviewer, "review_panel", reviewers=panel_size, **review_inputs)
+            else:
+                # Feedback blocks are shown as they are produced while the job runs
+                submit_agent_job("feedback", reviewer, "stream_feedback", stream=True, **review_inputs)
+        if "feedback" in st.session_state.jobs:
+            show_job("feedback")
         
         # Display current feedback if it exists
         if st.session_state.current_proposal.get('feedback'):
             st.subheader("Reviewer Feedback")
+            if 'review_note' in st.session_state:
+                st.caption(st.session_state.pop('review_note'))
             st.write(st.session_state.current_proposal['feedback'])
 
+# Live span timings and request profiles
+elif page == "Diagnostics":
+    show_diagnostics_page(job_scheduler)
+
+# Agent construction diagnostics for this rerun
+show_agent_diagnostics(construction_stats_before)
+
 # Footer
 st.markdown("---")
\ No newline at end of file
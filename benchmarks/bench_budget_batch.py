@@ -0,0 +1,65 @@
+"""
+Benchmark BudgetEstimator.estimate_budgets_batch against a per-call loop.
+
+Usage:
+    python benchmarks/bench_budget_batch.py --size 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.budget_estimator import BudgetEstimator
+
+TOPICS = [
+    "Research study on coastal erosion",
+    "Community health outreach",
+    "Open-source tooling for small businesses",
+    "Analysis of urban heat islands",
+    "Social service volunteer network",
+]
+
+
+def make_requests(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {'topic': rng.choice(TOPICS), 'duration': rng.randint(1, 60), 'team_size': rng.randint(1, 20)}
+        for _ in range(size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    estimator = BudgetEstimator()
+    requests = make_requests(args.size)
+
+    loop_times = []
+    batch_times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for request in requests:
+            estimator.estimate_budget(request['topic'], '', duration=request['duration'],
+                                      team_size=request['team_size'])
+        loop_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        estimator.estimate_budgets_batch(requests, seed=0)
+        batch_times.append(time.perf_counter() - start)
+
+    loop_best = min(loop_times)
+    batch_best = min(batch_times)
+    print(f"budgets:      {args.size}")
+    print(f"per-call loop: {loop_best * 1000:10.1f} ms")
+    print(f"batch:         {batch_best * 1000:10.1f} ms")
+    print(f"speedup:       {loop_best / batch_best:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Microbenchmark topic classification as the keyword catalog grows.
+
+Compares the original per-category any(keyword in topic) scans with the
+shared Aho-Corasick TopicClassifier, uncached (every topic distinct) and
+cached (repeated topics, as on Streamlit reruns).
+
+Usage:
+    python benchmarks/bench_classifier.py
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.classifier import DEFAULT_KEYWORDS, TopicClassifier
+
+
+def make_keywords(extra, rng):
+    keywords = {category: list(words) for category, words in DEFAULT_KEYWORDS.items()}
+    for i in range(extra):
+        category = f"domain{i % 20}"
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+        keywords.setdefault(category, []).append(word)
+    return keywords
+
+
+def naive_classify(keywords, topic):
+    lowered = topic.lower()
+    for category, words in keywords.items():
+        if any(keyword in lowered for keyword in words):
+            return category
+    return "general"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--topics', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = ["community", "health", "analysis", "urban", "climate", "youth", "service", "data"]
+    topics = [
+        " ".join(rng.choice(vocabulary) for _ in range(6)) + f" project {i}"
+        for i in range(args.topics)
+    ]
+
+    print(f"{'keywords':>9} {'naive (us)':>11} {'automaton (us)':>15} {'cached (us)':>12}")
+    for extra in (0, 100, 1000, 5000):
+        keywords = make_keywords(extra, rng)
+        classifier = TopicClassifier(keywords, cache_size=len(topics))
+
+        start = time.perf_counter()
+        for topic in topics:
+            naive_classify(keywords, topic)
+        naive = (time.perf_counter() - start) / len(topics) * 1e6
+
+        start = time.perf_counter()
+        for topic in topics:
+            classifier.classify(topic)
+        uncached = (time.perf_counter() - start) / len(topics) * 1e6
+
+        start = time.perf_counter()
+        for topic in topics:
+            classifier.classify(topic)
+        cached = (time.perf_counter() - start) / len(topics) * 1e6
+
+        total = sum(len(words) for words in keywords.values())
+        print(f"{total:>9} {naive:11.2f} {uncached:15.2f} {cached:12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Startup benchmark: measure the cold import time of the agents and utils.
+
+Runs a fresh interpreter with `python -X importtime` several times and
+reports the slowest imports of the median run. Exits with status 1 if a
+heavy dependency is imported eagerly, or on an import time regression.
+
+Absolute import times on a shared machine drift by 2x from one minute to
+the next, so each run also imports a fixed set of standard library modules
+in another fresh interpreter, and the check uses the ratio of the two. The
+median ratio fails when it is more than the regression threshold times the
+stored baseline ratio (the "startup.import_time_ratio" entry of
+baselines.json, as in suite.py).
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --update-baseline
+    python benchmarks/bench_import_time.py --budget-ms 25   # also enforce an absolute budget
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from suite import BASELINE_FILE, DEFAULT_THRESHOLD, load_baselines, machine_info
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE_NAME = "startup.import_time_ratio"
+
+MODULES = [
+    "agents.outline_designer",
+    "agents.budget_estimator",
+    "agents.reviewer",
+    "utils.memory",
+    "utils.storage",
+    "utils.registry",
+]
+
+# Must only be imported by the code paths that need them
+LAZY_MODULES = ["numpy", "pandas", "openai", "yaml", "httpx"]
+
+# Standard library modules whose import time is the yardstick for ours
+REFERENCE_MODULES = [
+    "argparse", "ast", "csv", "dataclasses", "decimal", "email.message", "fractions",
+    "logging", "pprint", "shutil", "tarfile", "xml.dom.minidom",
+]
+
+
+def measure_imports(modules):
+    """
+    Import modules in a fresh interpreter with -X importtime.
+
+    Returns:
+        list: (module name, self microseconds, cumulative microseconds) per import
+    """
+    code = "; ".join(f"import {module}" for module in modules) or "pass"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=9)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Fail when the median import time ratio is this many times the baseline")
+    parser.add_argument('--budget-ms', type=float, help="Also fail when the median import time exceeds this")
+    parser.add_argument('--baseline-file', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Store this run's median import time ratio as the baseline instead of comparing")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    # Modules loaded by interpreter startup (site, .pth files) are not ours
+    startup = {name for name, _, _ in measure_imports([])}
+
+    def total_ms(entries):
+        return sum(self_us for name, self_us, _ in entries if name not in startup) / 1000
+
+    # Each run is paired with a reference run right after it, on a machine in the same state
+    runs = []
+    for _ in range(args.runs):
+        entries = [entry for entry in measure_imports(MODULES) if entry[0] not in startup]
+        reference_ms = total_ms(measure_imports(REFERENCE_MODULES))
+        runs.append((total_ms(entries) / reference_ms, total_ms(entries), reference_ms, entries))
+    runs.sort(key=lambda run: run[0])
+    median_ratio, median_ms, reference_ms, median_entries = runs[len(runs) // 2]
+
+    stored = load_baselines(args.baseline_file)
+    baseline = stored["cases"].get(BASELINE_NAME)
+    print(f"Total import time: {median_ms:.1f} ms, {median_ratio:.3f}x the standard library reference "
+          f"({reference_ms:.1f} ms); median of {args.runs} runs")
+    if baseline and not args.update_baseline:
+        print(f"Baseline ratio: {baseline:.3f}, change {median_ratio / baseline:.2f}x (threshold {args.threshold:.2f}x)")
+        if stored["machine"] and stored["machine"] != machine_info():
+            print(f"Warning: the baseline was recorded on {stored['machine']['platform']} "
+                  f"(Python {stored['machine']['python']}); timings may not be comparable")
+    elif not args.update_baseline:
+        print(f"No baseline in {args.baseline_file}; store one with --update-baseline")
+    print(f"\n{'cumulative (ms)':>16}  module")
+    for name, _, cumulative in sorted(median_entries, key=lambda e: -e[2])[:args.top]:
+        print(f"{cumulative / 1000:16.2f}  {name}")
+
+    failures = []
+    imported = {name for *_, entries in runs for name, _, _ in entries}
+    for module in LAZY_MODULES:
+        if module in imported:
+            failures.append(f"{module} is imported at startup")
+
+    if args.update_baseline:
+        # "machine" describes where suite.py's timings were recorded, so it is
+        # left alone; the ratio is relative to this machine's own stdlib imports
+        stored["cases"][BASELINE_NAME] = median_ratio
+        with open(args.baseline_file, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Stored the import time baseline in {args.baseline_file}")
+    elif baseline and median_ratio / baseline > args.threshold:
+        failures.append(f"import time ratio {median_ratio:.3f} is more than {args.threshold:.2f}x "
+                        f"the baseline {baseline:.3f}")
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        failures.append(f"import time {median_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Load benchmark for the async model backend against the local stub server.
+
+Generates many outlines concurrently through one shared ModelBackend and
+reports throughput and latency percentiles. All requests are submitted at
+once, so latencies include time spent queued behind the concurrency limit. With a concurrency limit of C
+and a stub latency of L seconds, throughput should approach C / L.
+
+Usage:
+    python benchmarks/bench_llm_backend.py --requests 200 --concurrency 16 --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agents.outline_designer import OutlineDesigner
+from utils.llm import ModelBackend
+
+
+async def run(designer, requests):
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        await designer.generate_outline_async(f"Research study {i}", "Measure outcomes", "NSF")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    await designer.backend.aclose()
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    # Run the stub in its own process so it does not compete for our GIL
+    server = subprocess.Popen(
+        [sys.executable, "-m", "utils.llm_stub", "--port", "0",
+         "--latency", str(args.latency), "--failure-rate", str(args.failure_rate)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        base_url = server.stdout.readline().split()[-1]
+        backend = ModelBackend(base_url, "stub", max_concurrency=args.concurrency, backoff_base=0.05)
+        designer = OutlineDesigner(backend=backend)
+        elapsed, latencies = asyncio.run(run(designer, args.requests))
+    finally:
+        server.terminate()
+
+    latencies.sort()
+    print(f"requests:     {args.requests} (concurrency {args.concurrency}, stub latency {args.latency * 1000:.0f} ms)")
+    print(f"elapsed:      {elapsed:.2f} s")
+    ideal = f" (ideal {args.concurrency / args.latency:.1f})" if args.latency else ""
+    print(f"throughput:   {args.requests / elapsed:.1f} req/s{ideal}")
+    print(f"latency p50:  {statistics.median(latencies) * 1000:.0f} ms")
+    print(f"latency p95:  {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
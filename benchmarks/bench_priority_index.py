@@ -0,0 +1,90 @@
+"""
+Benchmark the agency priority index as the number of priority chunks grows.
+
+Writes synthetic priority documents for a few agencies, then times building
+the index, opening the stored index (memory-mapped), single queries across
+all agencies and within one agency, and batches of queries answered with one
+matrix product.
+
+Usage:
+    python benchmarks/bench_priority_index.py --chunks 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import AGENCIES, TOPICS, make_text
+from utils.priorities import PriorityIndex
+
+# Paragraphs of about CHUNK_WORDS words, so each one becomes a chunk
+PARAGRAPH_WORDS = 120
+PARAGRAPHS_PER_DOCUMENT = 50
+
+
+def write_documents(directory, chunks, rng):
+    """Write priority documents holding about the given number of chunks"""
+    agencies = [agency for agency in AGENCIES if agency]
+    for number in range(max(1, chunks // PARAGRAPHS_PER_DOCUMENT)):
+        agency = agencies[number % len(agencies)]
+        os.makedirs(os.path.join(directory, agency), exist_ok=True)
+        sections = [
+            f"## Priority {number}.{i}: {rng.choice(TOPICS)}\n\n{make_text(rng, PARAGRAPH_WORDS)}"
+            for i in range(PARAGRAPHS_PER_DOCUMENT)
+        ]
+        with open(os.path.join(directory, agency, f"priorities-{number}.md"), 'w') as f:
+            f.write("\n\n".join(sections))
+
+
+def time_queries(index, queries, agency=None):
+    """Median milliseconds per search() call"""
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, agency)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chunks', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    queries = [f"{rng.choice(TOPICS)} {make_text(rng, 40)}" for _ in range(args.queries)]
+
+    print(f"{'chunks':>7} {'build (s)':>10} {'open (ms)':>10} {'query (ms)':>11} "
+          f"{'agency (ms)':>12} {'batch/query (ms)':>17}")
+    for chunks in args.chunks:
+        with tempfile.TemporaryDirectory() as directory:
+            write_documents(directory, chunks, rng)
+
+            start = time.perf_counter()
+            built = len(PriorityIndex(directory))
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = PriorityIndex(directory)
+            index.search(queries[0])
+            opened = (time.perf_counter() - start) * 1000
+
+            query = time_queries(index, queries)
+            agency = time_queries(index, queries, "NIH")
+
+            batch_queries = (queries * (args.batch // len(queries) + 1))[:args.batch]
+            start = time.perf_counter()
+            index.search_batch(batch_queries)
+            batch = (time.perf_counter() - start) * 1000 / len(batch_queries)
+
+        print(f"{built:>7} {build:10.2f} {opened:10.1f} {query:11.2f} {agency:12.2f} {batch:17.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Wall-clock benchmark for reviewer panels against the local stub server.
+
+Times one reviewer, a panel of K reviewers run concurrently with
+ReviewerSimulation.review_panel_async, and the same K reviewers awaited one
+after another. The concurrent panel should take about as long as a single
+reviewer, while the sequential panel takes about K times as long. Exits
+non-zero if the concurrent panel is slower than --max-ratio times a single
+reviewer.
+
+Usage:
+    python benchmarks/bench_review_panel.py --reviewers 5 --latency 0.2 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agents.reviewer import REVIEWER_PERSONAS, ReviewerSimulation
+from utils.llm import ModelBackend
+
+PROPOSAL = {
+    'topic': "Machine learning for early sepsis detection",
+    'goals': "Build and validate a real-time risk model in three hospitals",
+    'funding_agency': "NIH",
+    'outline': "# Grant Proposal\n\n## Specific Aims\n\n## Research Strategy\n\n## Budget",
+    'budget': {"Personnel": 120000, "Equipment": 20000, "Indirect Costs": 40000}
+}
+
+
+async def run(reviewer, reviewers, rounds):
+    single, panel, sequential = [], [], []
+    for i in range(rounds):
+        start = time.perf_counter()
+        await reviewer.review_panel_async(**PROPOSAL, reviewers=1, seed=i)
+        single.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await reviewer.review_panel_async(**PROPOSAL, reviewers=reviewers, seed=i)
+        panel.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for seat in range(reviewers):
+            persona = REVIEWER_PERSONAS[seat % len(REVIEWER_PERSONAS)]
+            await reviewer._review_async(persona, i + seat, **PROPOSAL)
+        sequential.append(time.perf_counter() - start)
+
+    await reviewer.backend.aclose()
+    return single, panel, sequential
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reviewers', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--max-ratio', type=float, default=1.5)
+    args = parser.parse_args()
+
+    # Run the stub in its own process so it does not compete for our GIL
+    server = subprocess.Popen(
+        [sys.executable, "-m", "utils.llm_stub", "--port", "0", "--latency", str(args.latency)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        base_url = server.stdout.readline().split()[-1]
+        backend = ModelBackend(base_url, "stub", max_concurrency=max(8, args.reviewers))
+        # No response cache, so every round reaches the stub
+        reviewer = ReviewerSimulation(backend=backend)
+        single, panel, sequential = asyncio.run(run(reviewer, args.reviewers, args.rounds))
+    finally:
+        server.terminate()
+
+    single_ms = statistics.median(single) * 1000
+    panel_ms = statistics.median(panel) * 1000
+    sequential_ms = statistics.median(sequential) * 1000
+    ratio = panel_ms / single_ms
+
+    print(f"reviewers:           {args.reviewers} (stub latency {args.latency * 1000:.0f} ms, {args.rounds} rounds)")
+    print(f"single reviewer:     {single_ms:.0f} ms")
+    print(f"concurrent panel:    {panel_ms:.0f} ms ({ratio:.2f}x single)")
+    print(f"sequential panel:    {sequential_ms:.0f} ms ({sequential_ms / single_ms:.2f}x single)")
+
+    if ratio > args.max_ratio:
+        print(f"FAIL: concurrent panel is more than {args.max_ratio}x a single reviewer")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark RubricScorer on a large synthetic proposal.
+
+Builds a proposal of roughly --pages pages (about 500 words per page, split
+into sections), scores it once from scratch, then re-scores it after
+editing one section at a time. Re-scoring only re-tokenizes the edited
+section, so it should be much cheaper than the first score.
+
+Usage:
+    python benchmarks/bench_rubric.py --pages 200 --edits 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.rubric import RubricScorer
+
+HEADINGS = [
+    "Executive Summary", "Background and Significance", "Specific Aims", "Methodology",
+    "Data Collection and Analysis", "Evaluation Plan", "Timeline", "Budget Justification"
+]
+VOCABULARY = (
+    "data analysis outcome measure community participants study model evaluation sample "
+    "method research impact sustainability literature design baseline cohort survey "
+    "intervention protocol results metric assessment training program partner"
+).split()
+
+
+def make_proposal(pages, seed=0, words_per_page=500, words_per_section=250):
+    rng = random.Random(seed)
+    sections = []
+    for i in range(pages * words_per_page // words_per_section):
+        words = [rng.choice(VOCABULARY) for _ in range(words_per_section)]
+        lines = [" ".join(words[j:j + 15]) + "." for j in range(0, len(words), 15)]
+        sections.append(f"## {HEADINGS[i % len(HEADINGS)]} {i + 1}\n\n" + "\n".join(lines))
+    return sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--edits', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sections = make_proposal(args.pages, args.seed)
+    budget = {"Personnel": 250000, "Equipment": 40000, "Travel": 10000, "Indirect Costs": 90000}
+    scorer = RubricScorer()
+
+    text = "# Grant Proposal\n\n" + "\n\n".join(sections)
+    start = time.perf_counter()
+    result = scorer.score(text, budget)
+    first = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    rescores = []
+    for _ in range(args.edits):
+        edited = rng.randrange(len(sections))
+        sections[edited] += f"\nRevised {rng.random():.6f}."
+        text = "# Grant Proposal\n\n" + "\n\n".join(sections)
+        start = time.perf_counter()
+        scorer.score(text, budget)
+        rescores.append(time.perf_counter() - start)
+
+    print(f"proposal:      {len(text) / 1e6:.2f} MB, {len(sections)} sections (score {result['score']}/5)")
+    print(f"first score:   {first * 1000:.1f} ms")
+    print(f"re-score p50:  {statistics.median(rescores) * 1000:.1f} ms (one section edited)")
+    print(f"re-score max:  {max(rescores) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark VersionTracker save latency as the history grows.
+
+Saves up to --max-versions versions in journal mode and reports the mean save
+latency around each checkpoint (10, 100, 1k, ...). With the append-only
+journal the latency should stay flat; with --compare-json the legacy
+rewrite-everything mode is measured too, up to --json-limit versions.
+
+Usage:
+    python benchmarks/bench_version_journal.py --max-versions 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.memory import VersionTracker
+
+SAMPLE_PROPOSAL = {
+    'topic': 'Community health research study',
+    'goals': 'Measure outcomes of a community outreach program.',
+    'funding_agency': 'NSF',
+    'outline': "# Grant Proposal\n\n" + "\n\n".join(f"## Section {i}" for i in range(12)),
+    'budget': {'Personnel': 225000.0, 'Equipment': 27000.0, 'Travel': 6000.0},
+    'feedback': '',
+    'version': 1,
+}
+
+
+def measure(tracker, max_versions, window=10):
+    """Return {checkpoint: mean save latency in microseconds}."""
+    checkpoints = []
+    n = 10
+    while n <= max_versions:
+        checkpoints.append(n)
+        n *= 10
+
+    results = {}
+    for checkpoint in checkpoints:
+        # Fill up to just before the checkpoint, then time a window of saves
+        while len(tracker.versions) < checkpoint - window:
+            tracker.save_version(SAMPLE_PROPOSAL, "filler")
+        start = time.perf_counter()
+        for _ in range(window):
+            tracker.save_version(SAMPLE_PROPOSAL, "timed")
+        results[checkpoint] = (time.perf_counter() - start) / window * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--max-versions', type=int, default=100000)
+    parser.add_argument('--fsync-every', type=int, default=16)
+    parser.add_argument('--compare-json', action='store_true')
+    parser.add_argument('--json-limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = VersionTracker(os.path.join(tmp, 'versions.jsonl'), fsync_every=args.fsync_every)
+        journal_results = measure(journal, args.max_versions)
+        journal.close()
+
+        json_results = {}
+        if args.compare_json:
+            legacy = VersionTracker(os.path.join(tmp, 'versions.json'))
+            json_results = measure(legacy, min(args.max_versions, args.json_limit))
+
+    print(f"{'versions':>10} {'journal (us/save)':>18} {'json (us/save)':>15}")
+    for checkpoint, latency in journal_results.items():
+        legacy = json_results.get(checkpoint)
+        legacy_text = f"{legacy:15.1f}" if legacy is not None else f"{'-':>15}"
+        print(f"{checkpoint:>10} {latency:18.1f} {legacy_text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Stress test a shared VersionTracker with several processes saving at once.
+
+Each of --processes workers saves --saves versions to the same storage file,
+then waits for the others and refreshes. With --torn-writes, another
+process meanwhile appends partial records under the file lock, as a writer
+that crashed mid-record would leave them. The run fails (exit status 1) if any
+version is lost or duplicated, if two saves got the same version number, if
+the file does not reload cleanly, or if a worker does not see every version
+after refreshing.
+
+Usage:
+    python benchmarks/stress_version_tracker.py --processes 8 --saves 200
+    python benchmarks/stress_version_tracker.py --format json --saves 50
+    python benchmarks/stress_version_tracker.py --torn-writes 20
+    python benchmarks/stress_version_tracker.py --no-shared    # show what goes wrong without locking
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.journal import FileLock
+from utils.memory import VersionTracker
+
+# The start of a record, cut off as if its writer crashed
+TORN_RECORD = b'{"timestamp": 0, "rati'
+
+
+def worker(worker_id, path, saves, options, barrier, results):
+    """Save versions, then report the version numbers and what this worker can see"""
+    tracker = VersionTracker(path, **options)
+    proposal = {'topic': f"Worker {worker_id}", 'outline': "# Grant Proposal\n\n## Methodology", 'budget': {}}
+    numbers = []
+    start = time.perf_counter()
+    for i in range(saves):
+        proposal['outline'] += f"\n\nEdit {i}"
+        numbers.append(tracker.save_version(proposal, f"worker-{worker_id}-{i}"))
+    elapsed = time.perf_counter() - start
+    tracker.close()
+
+    barrier.wait()
+    tracker.refresh()
+    results.put((worker_id, numbers, elapsed, len(tracker.versions)))
+
+
+def torn_writer(path, writes, interval):
+    """Append partial records while the workers save"""
+    lock = FileLock(path + '.lock')
+    for _ in range(writes):
+        time.sleep(interval)
+        with lock:
+            with open(path, 'ab') as f:
+                f.write(TORN_RECORD)
+
+
+def check(path, processes, saves, options, results):
+    """Return a list of problems found after a run"""
+    problems = []
+    expected = processes * saves
+
+    numbers = Counter(number for _, worker_numbers, _, _ in results for number in worker_numbers)
+    duplicates = sorted(number for number, count in numbers.items() if count > 1)
+    if duplicates:
+        problems.append(f"{len(duplicates)} version numbers were returned to more than one save")
+
+    seen = sorted(visible for _, _, _, visible in results)
+    if seen[0] != expected:
+        problems.append(f"workers saw {seen[0]}-{seen[-1]} versions after refreshing, expected {expected}")
+
+    try:
+        reloaded = VersionTracker(path, **options)
+    except Exception as e:
+        return problems + [f"reloading failed: {e}"]
+    rationales = Counter(version['rationale'] for version in reloaded.get_all_versions())
+    missing = expected - sum(1 for rationale in rationales if rationale.startswith("worker-"))
+    if missing:
+        problems.append(f"{missing} of {expected} versions were lost")
+    repeated = sum(count - 1 for count in rationales.values())
+    if repeated:
+        problems.append(f"{repeated} versions were stored more than once")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--saves', type=int, default=200)
+    parser.add_argument('--format', choices=['jsonl', 'json'], default='jsonl',
+                        help="journal (jsonl) or single JSON document (json)")
+    parser.add_argument('--compact-every', type=int, default=None,
+                        help="compact the journal every this many saves per worker")
+    parser.add_argument('--delta-encoding', action='store_true')
+    parser.add_argument('--no-shared', action='store_true', help="run without locking, for comparison")
+    parser.add_argument('--torn-writes', type=int, default=0,
+                        help="partial records appended by a crashing writer during the run (jsonl only)")
+    parser.add_argument('--torn-interval', type=float, default=0.01,
+                        help="seconds between partial records")
+    args = parser.parse_args()
+    if args.torn_writes and args.format != 'jsonl':
+        parser.error("--torn-writes needs --format jsonl")
+
+    options = {
+        'shared': not args.no_shared,
+        'fsync_every': 0,
+        'compact_every': args.compact_every,
+        'delta_encoding': args.delta_encoding,
+    }
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"versions.{args.format}")
+        barrier = context.Barrier(args.processes)
+        queue = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(i, path, args.saves, options, barrier, queue))
+            for i in range(args.processes)
+        ]
+        if args.torn_writes:
+            processes.append(context.Process(target=torn_writer,
+                                             args=(path, args.torn_writes, args.torn_interval)))
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in range(args.processes)]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        problems = check(path, args.processes, args.saves, options, results)
+
+    total = args.processes * args.saves
+    slowest = max(worker_elapsed for _, _, worker_elapsed, _ in results)
+    print(f"{args.processes} processes x {args.saves} saves ({args.format}, "
+          f"{'unshared' if args.no_shared else 'shared'}): {total / slowest:,.0f} saves/s, {elapsed:.2f} s total")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: no versions lost or duplicated")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+Benchmark suite for the agents, the version tracker and the app's page flows.
+
+Each case times one operation on seeded synthetic data (see synthetic.py)
+and is compared against the stored baseline in baselines.json. A case
+slower than its baseline by more than the regression threshold fails the
+run with exit status 1.
+
+The "quick" scale runs in about a minute; "full" adds the 100k-version
+histories and the long-outline page flows.
+
+Usage:
+    python benchmarks/suite.py                       # quick scale, compare with the baselines
+    python benchmarks/suite.py --scale full --filter tracker
+    python benchmarks/suite.py --update-baseline     # store the current timings as the baselines
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# A case fails when it takes this many times its baseline
+DEFAULT_THRESHOLD = 1.5
+
+SCALES = ["quick", "full"]
+
+CASES = []
+
+
+def case(name, scale="quick", repeat=7, threshold=None):
+    """
+    Register a benchmark case.
+
+    The decorated function gets a random.Random and a scratch directory, does
+    its (untimed) setup and returns the zero-argument function to time.
+
+    Args:
+        name (str): Case name, unique within the suite
+        scale (str): Smallest scale that runs the case
+        repeat (int): Number of timed runs; the median is reported
+        threshold (float, optional): Regression threshold for this case
+    """
+    def register(setup):
+        CASES.append({"name": name, "scale": scale, "repeat": repeat, "threshold": threshold, "setup": setup})
+        return setup
+    return register
+
+
+# Agents -------------------------------------------------------------------
+
+def _agent(module, cls):
+    # No response cache, so every call does the work being measured
+    import importlib
+    return getattr(importlib.import_module(module), cls)()
+
+
+for _scale in ["short", "long"]:
+    @case(f"outline.generate_outline[{_scale}]")
+    def _generate_outline(rng, tmp, _scale=_scale):
+        designer = _agent("agents.outline_designer", "OutlineDesigner")
+        proposal = synthetic.make_proposal(rng, _scale)
+        return lambda: designer.generate_outline(proposal["topic"], proposal["goals"], proposal["funding_agency"])
+
+
+for _duration, _team in [(12, 3), (60, 20)]:
+    @case(f"budget.estimate_budget[{_duration}mo,{_team}ppl]")
+    def _estimate_budget(rng, tmp, _duration=_duration, _team=_team):
+        estimator = _agent("agents.budget_estimator", "BudgetEstimator")
+        proposal = synthetic.make_proposal(rng)
+        return lambda: estimator.estimate_budget(proposal["topic"], proposal["goals"], proposal["funding_agency"],
+                                                 duration=_duration, team_size=_team)
+
+
+@case("budget.budget_grid[60x20]")
+def _budget_grid(rng, tmp):
+    estimator = _agent("agents.budget_estimator", "BudgetEstimator")
+    proposal = synthetic.make_proposal(rng)
+
+    def run():
+        # Time building the grid, not the cached lookup
+        estimator._grids.clear()
+        estimator.budget_grid(proposal["topic"])
+    return run
+
+
+for _scale in ["short", "long"]:
+    @case(f"reviewer.generate_feedback[{_scale}]")
+    def _generate_feedback(rng, tmp, _scale=_scale):
+        reviewer = _agent("agents.reviewer", "ReviewerSimulation")
+        proposal = synthetic.make_proposal(rng, _scale)
+        return lambda: reviewer.generate_feedback(proposal["topic"], proposal["goals"], proposal["funding_agency"],
+                                                  proposal["outline"], proposal["budget"])
+
+
+@case("reviewer.review_incremental[long,one edit]")
+def _review_incremental(rng, tmp):
+    reviewer = _agent("agents.reviewer", "ReviewerSimulation")
+    proposal = synthetic.make_proposal(rng, "long")
+    reviewer.review_incremental(**{key: proposal[key] for key in ("topic", "goals", "outline", "budget")})
+
+    def run():
+        proposal["outline"] = synthetic.edit_outline(rng, proposal["outline"])
+        reviewer.review_incremental(**{key: proposal[key] for key in ("topic", "goals", "outline", "budget")})
+    return run
+
+
+# Version tracker ------------------------------------------------------------
+
+def _history(rng, tmp, versions, **options):
+    """Path of a synthetic journal with this many versions, built once per run"""
+    suffix = "-delta" if options.get("delta_encoding") else ""
+    path = os.path.join(tmp, f"history-{versions}{suffix}.jsonl")
+    if not os.path.exists(path):
+        synthetic.make_history(random.Random(versions), path, versions, **options)
+    return path
+
+
+def _copy(path):
+    """Copy of a shared history, for cases that append to it"""
+    copy = path.replace(".jsonl", "-copy.jsonl")
+    shutil.copyfile(path, copy)
+    return copy
+
+
+for _versions, _scale in [(10, "quick"), (1000, "quick"), (100000, "full")]:
+    @case(f"tracker.save_version[{_versions}]", scale=_scale)
+    def _save_version(rng, tmp, _versions=_versions):
+        from utils.memory import VersionTracker
+        tracker = VersionTracker(_copy(_history(rng, tmp, _versions)), fsync_every=0)
+        revisions = synthetic.iter_revisions(rng, tracker.get_latest_version()["proposal"], 10 ** 6)
+        return lambda: tracker.save_version(*next(revisions))
+
+    @case(f"tracker.save_version[{_versions},delta]", scale=_scale)
+    def _save_version_delta(rng, tmp, _versions=_versions):
+        from utils.memory import VersionTracker
+        tracker = VersionTracker(_copy(_history(rng, tmp, _versions, delta_encoding=True)), fsync_every=0,
+                                 delta_encoding=True)
+        revisions = synthetic.iter_revisions(rng, tracker.get_latest_version()["proposal"], 10 ** 6)
+        return lambda: tracker.save_version(*next(revisions))
+
+    @case(f"tracker.load[{_versions}]", scale=_scale, repeat=5)
+    def _load(rng, tmp, _versions=_versions):
+        from utils.memory import VersionTracker
+        path = _history(rng, tmp, _versions)
+        return lambda: VersionTracker(path).close()
+
+    @case(f"tracker.compare_versions[{_versions}]", scale=_scale)
+    def _compare_versions(rng, tmp, _versions=_versions):
+        from utils.memory import VersionTracker
+        tracker = VersionTracker(_history(rng, tmp, _versions))
+        pairs = iter([sorted(rng.sample(range(1, _versions + 1), 2)) for _ in range(100000)])
+
+        def run():
+            # Small histories have few distinct pairs; keep the comparison cache from answering
+            tracker._comparisons.clear()
+            tracker.compare_versions(*next(pairs))
+        return run
+
+
+# App page flows (headless) --------------------------------------------------
+
+def _app_test():
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+
+
+def _fill_details(at, proposal):
+    at.run()
+    at.main.text_input[0].set_value(proposal["topic"])
+    at.main.text_area[0].set_value(proposal["goals"])
+    at.main.text_input[1].set_value(proposal["funding_agency"])
+    at.main.button[0].click().run()
+
+
+@case("app.input_details", repeat=5)
+def _app_input_details(rng, tmp):
+    proposal = synthetic.make_proposal(rng)
+    return lambda: _fill_details(_app_test(), proposal)
+
+
+@case("app.full_flow", repeat=5)
+def _app_full_flow(rng, tmp):
+    proposal = synthetic.make_proposal(rng)
+
+    def run():
+        at = _app_test()
+        _fill_details(at, proposal)
+        for page, button in [("Outline Designer", "Generate Outline"),
+                             ("Budget Estimator", "Generate Budget Estimate"),
+                             ("Reviewer Simulation", "Generate Reviewer Feedback")]:
+            at.sidebar.radio[0].set_value(page).run()
+            next(b for b in at.main.button if b.label == button).click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return run
+
+
+@case("app.rerun[long outline]", scale="full", repeat=5)
+def _app_rerun_long(rng, tmp):
+    proposal = synthetic.make_proposal(rng, "long")
+    at = _app_test()
+    at.run()
+    at.session_state.current_proposal = dict(at.session_state.current_proposal, **proposal)
+    at.sidebar.radio[0].set_value("Outline Designer").run()
+    return lambda: at.run()
+
+
+# Runner ---------------------------------------------------------------------
+
+def measure(function, repeat, min_time=0.2):
+    """
+    Time a function like timeit.autorange: each run calls it enough times to
+    take at least min_time, and the median per-call time is returned.
+
+    Returns:
+        float: Median seconds per call
+    """
+    start = time.perf_counter()
+    function()
+    single = time.perf_counter() - start
+    number = max(1, int(min_time / single)) if single > 0 else 1000
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return statistics.median(timings)
+
+
+def machine_info():
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()}
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {"machine": None, "cases": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def run_suite(scale="quick", name_filter=None, seed=0, baselines=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Run the benchmark cases for a scale.
+
+    Args:
+        scale (str): "quick" or "full"
+        name_filter (str, optional): Only run cases whose name contains this
+        seed (int): Seed; each case gets its own stream derived from it
+        baselines (dict, optional): Baseline seconds per case name
+        threshold (float): Default regression threshold
+
+    Returns:
+        list: Per case: 'name', 'seconds', 'baseline', 'ratio' and 'status'
+            ("ok", "regression", "faster", "new" or "error: ...")
+    """
+    baselines = baselines or {}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app's shared stores write to the scratch directory
+        os.environ.update({
+            "GRANT_ASSISTANT_DB": os.path.join(tmp, "proposals.db"),
+            "GRANT_ASSISTANT_VERSIONS": os.path.join(tmp, "versions.jsonl"),
+            "GRANT_RESPONSE_CACHE": "",
+        })
+        for bench in CASES:
+            if SCALES.index(bench["scale"]) > SCALES.index(scale):
+                continue
+            if name_filter and name_filter not in bench["name"]:
+                continue
+
+            # String seeds are hashed deterministically, unlike hash()
+            random.seed(f"{seed}:{bench['name']}")
+            rng = random.Random(f"{seed}:{bench['name']}")
+            result = {"name": bench["name"], "seconds": None, "baseline": baselines.get(bench["name"]),
+                      "ratio": None}
+            try:
+                result["seconds"] = measure(bench["setup"](rng, tmp), bench["repeat"])
+            except Exception as e:
+                result["status"] = f"error: {type(e).__name__}: {e}"
+                results.append(result)
+                print(f"{bench['name']:<45} {result['status']}", flush=True)
+                continue
+
+            limit = bench["threshold"] or threshold
+            if result["baseline"] is None:
+                result["status"] = "new"
+            else:
+                result["ratio"] = result["seconds"] / result["baseline"]
+                if result["ratio"] > limit:
+                    result["status"] = "regression"
+                elif result["ratio"] < 1 / limit:
+                    result["status"] = "faster"
+                else:
+                    result["status"] = "ok"
+            results.append(result)
+
+            baseline_text = f"{result['baseline'] * 1000:10.3f}" if result["baseline"] else f"{'-':>10}"
+            ratio_text = f"{result['ratio']:6.2f}x" if result["ratio"] else f"{'':>7}"
+            print(f"{bench['name']:<45} {result['seconds'] * 1000:10.3f} {baseline_text} {ratio_text}  "
+                  f"{result['status']}", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', choices=SCALES, default="quick")
+    parser.add_argument('--filter', help="Only run cases whose name contains this text")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Fail when a case takes this many times its baseline")
+    parser.add_argument('--baseline-file', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Store this run's timings as the baselines instead of comparing")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    stored = load_baselines(args.baseline_file)
+    if stored["machine"] and stored["machine"] != machine_info() and not args.update_baseline:
+        print(f"Warning: baselines were recorded on {stored['machine']['platform']} "
+              f"(Python {stored['machine']['python']}); timings may not be comparable")
+
+    print(f"{'case':<45} {'ms':>10} {'baseline':>10} {'ratio':>7}  status")
+    results = run_suite(args.scale, args.filter, args.seed,
+                        None if args.update_baseline else stored["cases"], args.threshold)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"machine": machine_info(), "scale": args.scale, "seed": args.seed, "results": results},
+                      f, indent=2)
+
+    if args.update_baseline:
+        stored["machine"] = machine_info()
+        stored["cases"].update({result["name"]: result["seconds"] for result in results
+                                if result["seconds"] is not None})
+        with open(args.baseline_file, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Stored {len(results)} baselines in {args.baseline_file}")
+        return 0
+
+    failed = [result for result in results if result["status"] == "regression" or result["status"].startswith("error")]
+    if failed:
+        print(f"{len(failed)} of {len(results)} cases regressed or failed: "
+              f"{', '.join(result['name'] for result in failed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
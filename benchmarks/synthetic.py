@@ -0,0 +1,151 @@
+"""
+Seeded generators of synthetic proposals and version histories for benchmarks.
+
+Every generator takes a random.Random, so the same seed always produces the
+same data.
+"""
+from utils.memory import VersionTracker
+
+TOPICS = [
+    "Community health outreach for rural clinics",
+    "Machine learning for crop disease detection",
+    "Soil carbon monitoring with low-cost sensors",
+    "After-school coding program for underserved youth",
+    "Clinical trial of a digital sleep intervention",
+    "Oral history archive of coastal communities",
+]
+AGENCIES = ["NSF", "NIH", "USDA", "Gates Foundation", ""]
+HEADINGS = [
+    "Executive Summary", "Problem Statement", "Background and Significance", "Specific Aims",
+    "Methodology", "Data Collection and Analysis", "Evaluation Plan", "Timeline", "Budget Justification",
+    "Expected Outcomes", "Sustainability", "References"
+]
+VOCABULARY = (
+    "data analysis outcome measure community participants study model evaluation sample "
+    "method research impact sustainability literature design baseline cohort survey "
+    "intervention protocol results metric assessment training program partner"
+).split()
+
+# Outline sizes: (number of "##" sections, words of text per section)
+OUTLINE_SCALES = {
+    "short": (8, 0),
+    "medium": (12, 120),
+    "long": (200, 250),
+}
+
+
+def make_text(rng, words):
+    """Sentences of random vocabulary words"""
+    chosen = [rng.choice(VOCABULARY) for _ in range(words)]
+    return "\n".join(" ".join(chosen[i:i + 15]).capitalize() + "." for i in range(0, words, 15))
+
+
+def make_outline(rng, scale="short", title="Grant Proposal"):
+    """
+    Generate a Markdown outline.
+
+    Args:
+        rng (random.Random): Source of randomness
+        scale (str): One of OUTLINE_SCALES
+        title (str): Top-level heading
+
+    Returns:
+        str: The outline
+    """
+    sections, words = OUTLINE_SCALES[scale]
+    parts = [f"# {title}"]
+    for i in range(sections):
+        heading = HEADINGS[i % len(HEADINGS)]
+        if i >= len(HEADINGS):
+            heading += f" {i // len(HEADINGS) + 1}"
+        parts.append(f"## {heading}" + (f"\n\n{make_text(rng, words)}" if words else ""))
+    return "\n\n".join(parts)
+
+
+def edit_outline(rng, outline):
+    """
+    Revise one random "##" section of an outline.
+
+    The section's revision note is replaced rather than added to, so long
+    histories of edits keep the outline the same size.
+    """
+    sections = outline.split("\n\n## ")
+    index = rng.randrange(1, len(sections)) if len(sections) > 1 else 0
+    section = sections[index].split("\n\nRevised ")[0]
+    sections[index] = f"{section}\n\nRevised {rng.choice(VOCABULARY)} {rng.randrange(10 ** 6)}."
+    return "\n\n## ".join(sections)
+
+
+def make_budget(rng):
+    """A budget with the usual categories"""
+    personnel = rng.randrange(50, 400) * 1000.0
+    return {
+        "Personnel": personnel,
+        "Equipment": rng.randrange(5, 80) * 1000.0,
+        "Travel": rng.randrange(1, 20) * 1000.0,
+        "Materials and Supplies": rng.randrange(1, 30) * 1000.0,
+        "Indirect Costs": round(personnel * rng.uniform(0.2, 0.4), 2),
+    }
+
+
+def make_proposal(rng, scale="short"):
+    """
+    Generate a complete proposal.
+
+    Returns:
+        dict: Proposal fields as stored by the app (topic, goals,
+            funding_agency, outline, budget, feedback)
+    """
+    topic = rng.choice(TOPICS)
+    return {
+        "topic": topic,
+        "goals": make_text(rng, 40),
+        "funding_agency": rng.choice(AGENCIES),
+        "outline": make_outline(rng, scale, f"Grant Proposal: {topic}"),
+        "budget": make_budget(rng),
+        "feedback": "",
+    }
+
+
+def iter_revisions(rng, proposal, count):
+    """
+    Yield (proposal, rationale) for a history of small edits to a proposal.
+
+    Most revisions edit one outline section; some change the budget or the
+    feedback, as the app's pages do.
+    """
+    proposal = dict(proposal)
+    for number in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            proposal["outline"] = edit_outline(rng, proposal["outline"])
+            rationale = "Edited outline"
+        elif kind < 0.9:
+            proposal["budget"] = make_budget(rng)
+            rationale = "Generated budget estimate"
+        else:
+            proposal["feedback"] = make_text(rng, 60)
+            rationale = "Generated reviewer feedback"
+        proposal["version"] = number + 1
+        yield dict(proposal), rationale
+
+
+def make_history(rng, path, versions, scale="short", **tracker_options):
+    """
+    Write a VersionTracker journal with a synthetic history.
+
+    Args:
+        rng (random.Random): Source of randomness
+        path (str): Journal path (".jsonl")
+        versions (int): Number of versions to save
+        scale (str): Outline scale of the proposal
+        **tracker_options: Passed to VersionTracker
+
+    Returns:
+        str: The journal path
+    """
+    tracker = VersionTracker(path, fsync_every=0, **tracker_options)
+    for proposal, rationale in iter_revisions(rng, make_proposal(rng, scale), versions):
+        tracker.save_version(proposal, rationale)
+    tracker.close()
+    return path
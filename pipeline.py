@@ -0,0 +1,395 @@
+"""
+Headless batch pipeline: Outline -> Budget -> Review over a file of proposals.
+
+Proposals are streamed from a JSONL or CSV file with "topic", "goals" and
+optional "id", "funding_agency", "duration", "team_size" and "reviewers"
+columns. Each agent runs as its own pipeline stage in a pool of worker
+processes, connected by bounded queues so a slow stage applies backpressure
+instead of buffering the whole input. Results are appended to a JSONL file
+as they complete, each proposal's history is kept in its own VersionTracker
+journal, and re-running the same command skips proposals that already
+completed.
+
+Usage:
+    python pipeline.py proposals.jsonl results.jsonl --workers 4
+    python pipeline.py proposals.csv results.jsonl --seed 0 --parquet results.parquet
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from utils.journal import VersionJournal
+
+STAGES = ["outline", "budget", "review"]
+
+# Agent used by each stage (names from utils.registry)
+STAGE_AGENTS = {
+    "outline": "outline_designer",
+    "budget": "budget_estimator",
+    "review": "reviewer",
+}
+
+
+def read_proposals(path):
+    """
+    Stream proposals from a JSONL or CSV file.
+
+    Records without an "id" get their 1-based line/row number, so ids stay
+    stable across runs over the same file.
+
+    Yields:
+        dict: Proposal inputs
+    """
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for number, row in enumerate(csv.DictReader(f), 1):
+                yield _normalize_record(row, number)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield _normalize_record(json.loads(line), number)
+
+
+def _normalize_record(record, number):
+    def integer(value, default):
+        try:
+            return int(value) if value not in (None, '') else default
+        except (TypeError, ValueError):
+            return default
+
+    return {
+        'id': str(record.get('id') or number),
+        'topic': record.get('topic') or '',
+        'goals': record.get('goals') or '',
+        'funding_agency': record.get('funding_agency') or '',
+        'duration': integer(record.get('duration'), 12),
+        'team_size': integer(record.get('team_size'), 3),
+        'reviewers': integer(record.get('reviewers'), 1),
+    }
+
+
+def _call(agent, method, **kwargs):
+    """Call an agent method, using its async model-backed variant when a backend is configured"""
+    if getattr(agent, 'backend', None) is not None:
+        from utils.llm import run_sync
+        return run_sync(getattr(agent, f"{method}_async")(**kwargs))
+    return getattr(agent, method)(**kwargs)
+
+
+def run_stage(stage, agent, item):
+    """
+    Run one pipeline stage on a proposal, storing its output on the item.
+
+    Args:
+        stage (str): "outline", "budget" or "review"
+        agent: The stage's agent
+        item (dict): Proposal inputs plus the outputs of earlier stages
+    """
+    inputs = {'topic': item['topic'], 'goals': item['goals'], 'funding_agency': item['funding_agency']}
+    if stage == "outline":
+        item['outline'] = _call(agent, "generate_outline", **inputs)
+    elif stage == "budget":
+        item['budget'] = _call(agent, "estimate_budget", duration=item['duration'],
+                               team_size=item['team_size'], **inputs)
+    elif item['reviewers'] > 1:
+        panel = _call(agent, "review_panel", outline=item['outline'], budget=item['budget'],
+                      reviewers=item['reviewers'], **inputs)
+        item['feedback'] = panel['feedback']
+        item['score'] = panel['score_mean']
+    else:
+        item['feedback'] = _call(agent, "generate_feedback", outline=item['outline'],
+                                 budget=item['budget'], **inputs)
+
+
+def _stage_worker(stage, inbox, outbox, upstream_workers, downstream_workers, seed):
+    """
+    Worker process loop for one stage.
+
+    Items that already failed in an earlier stage are passed through. Every
+    worker sends one end-of-input marker (None) per worker of the next stage
+    when it finishes, after its own items, and stops once it has received
+    one marker per worker of the previous stage. Queue puts from different
+    processes can arrive in any order, so a marker from one worker may
+    overtake another worker's items; counting markers this way guarantees
+    that some worker is still reading until every item has been taken.
+    """
+    from utils.registry import get_agent
+
+    agent = get_agent(STAGE_AGENTS[stage])
+    remaining = upstream_workers
+    while remaining:
+        item = inbox.get()
+        if item is None:
+            remaining -= 1
+            continue
+        if 'error' not in item:
+            try:
+                if seed is not None:
+                    # String seeds are hashed deterministically, unlike hash().
+                    # The agent's cached results are keyed by the seed too, so
+                    # a cache hit is the result this seed produces.
+                    agent.generation_seed = f"{seed}:{item['id']}:{stage}"
+                    random.seed(agent.generation_seed)
+                run_stage(stage, agent, item)
+            except Exception as e:
+                item['error'] = f"{stage}: {type(e).__name__}: {e}"
+        outbox.put(item)
+
+    for _ in range(downstream_workers):
+        outbox.put(None)
+
+
+def _history_path(history_dir, proposal_id):
+    """Per-proposal journal path, with the id made safe for use as a file name"""
+    return os.path.join(history_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', proposal_id) + '.jsonl')
+
+
+def _save_history(history_dir, item):
+    """Record the proposal's three generation steps in its VersionTracker journal"""
+    from utils.memory import VersionTracker
+
+    path = _history_path(history_dir, item['id'])
+    # A journal left by a run that crashed before the result was written is incomplete
+    if os.path.exists(path):
+        os.remove(path)
+
+    tracker = VersionTracker(path, fsync_every=0)
+    proposal = {
+        'topic': item['topic'],
+        'goals': item['goals'],
+        'funding_agency': item['funding_agency'],
+        'outline': item['outline'],
+        'budget': {},
+        'feedback': ''
+    }
+    tracker.save_version(proposal, "Generated outline")
+    proposal['budget'] = item['budget']
+    tracker.save_version(proposal, "Generated budget estimate")
+    proposal['feedback'] = item['feedback']
+    tracker.save_version(proposal, "Generated reviewer feedback")
+    tracker.close()
+
+
+def run_pipeline(input_path, output_path, history_dir=None, workers=1, queue_size=64, seed=None,
+                 report_every=5.0, fsync_every=64):
+    """
+    Run the batch pipeline.
+
+    Args:
+        input_path (str): JSONL or CSV file of proposals
+        output_path (str): JSONL file that results are appended to
+        history_dir (str, optional): Directory for per-proposal version
+            journals; defaults to "<output_path>.history"
+        workers (int): Worker processes per stage
+        queue_size (int): Capacity of each queue between stages
+        seed (int, optional): Seed for reproducible generations
+        report_every (float): Seconds between progress reports
+        fsync_every (int): Results written between fsync calls
+
+    Returns:
+        dict: 'inputs' (proposals read), 'completed', 'failed', 'skipped',
+            'seconds' and 'throughput' (completed proposals per second)
+    """
+    history_dir = history_dir or output_path + '.history'
+    os.makedirs(history_dir, exist_ok=True)
+
+    # Resume: proposals that completed in an earlier run are skipped; failed
+    # ones are retried
+    output = VersionJournal(output_path, fsync_every=fsync_every)
+    completed_ids = {record['id'] for record in output.iter_records() if record.get('status') == 'ok'}
+
+    context = multiprocessing.get_context()
+    queues = [context.Queue(maxsize=queue_size) for _ in range(len(STAGES) + 1)]
+    processes = []
+    for index, stage in enumerate(STAGES):
+        # The first stage is fed by the reader thread, the last one read by this process
+        upstream = workers if index > 0 else 1
+        downstream = workers if index + 1 < len(STAGES) else 1
+        for _ in range(workers):
+            process = context.Process(
+                target=_stage_worker,
+                args=(stage, queues[index], queues[index + 1], upstream, downstream, seed),
+                daemon=True
+            )
+            process.start()
+            processes.append(process)
+
+    stats = {'inputs': 0, 'completed': 0, 'failed': 0, 'skipped': 0}
+
+    def feed():
+        try:
+            for record in read_proposals(input_path):
+                stats['inputs'] += 1
+                if record['id'] in completed_ids:
+                    stats['skipped'] += 1
+                    continue
+                queues[0].put(record)
+        except Exception as e:
+            print(f"Error reading proposals from {input_path}: {e}")
+        finally:
+            for _ in range(workers):
+                queues[0].put(None)
+
+    reader = threading.Thread(target=feed, daemon=True)
+    reader.start()
+
+    start = time.perf_counter()
+    last_report = start
+    try:
+        remaining = workers
+        while remaining:
+            item = queues[-1].get()
+            if item is None:
+                remaining -= 1
+                continue
+
+            if 'error' in item:
+                stats['failed'] += 1
+                print(f"Error processing proposal {item['id']}: {item['error']}")
+                output.append({'id': item['id'], 'status': 'error', 'error': item['error']})
+            else:
+                _save_history(history_dir, item)
+                item['status'] = 'ok'
+                item['total_budget'] = sum(item['budget'].values())
+                output.append(item)
+                stats['completed'] += 1
+
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                last_report = now
+                print(f"{stats['completed']} completed, {stats['failed']} failed, {stats['skipped']} skipped "
+                      f"({stats['completed'] / (now - start):.1f} proposals/s)", flush=True)
+    finally:
+        output.close()
+        reader.join(timeout=1)
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    stats['seconds'] = time.perf_counter() - start
+    stats['throughput'] = stats['completed'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def export_parquet(output_path, parquet_path, batch_size=10000, currencies=(), rate_table=None):
+    """
+    Export the completed results of a run to Parquet.
+
+    Records are converted in batches, each written as one row group, so the
+    results never have to fit in memory at once. Requires pyarrow.
+
+    Args:
+        output_path (str): JSONL results written by run_pipeline
+        parquet_path (str): Parquet file to write
+        batch_size (int): Records per row group
+        currencies (list): Also write the total budget in these currencies,
+            as "total_budget_<currency>" columns
+        rate_table (RateTable, optional): Exchange rates for the currencies;
+            defaults to the rate file in GRANT_EXCHANGE_RATES
+
+    Raises:
+        ValueError: If a currency has no exchange rate; raised before the
+            Parquet file is created
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = ['id', 'topic', 'goals', 'funding_agency', 'duration', 'team_size', 'reviewers',
+               'outline', 'budget', 'total_budget', 'feedback', 'score']
+    schema = pa.schema([
+        ('id', pa.string()), ('topic', pa.string()), ('goals', pa.string()),
+        ('funding_agency', pa.string()), ('duration', pa.int64()), ('team_size', pa.int64()),
+        ('reviewers', pa.int64()), ('outline', pa.string()),
+        ('budget', pa.map_(pa.string(), pa.float64())), ('total_budget', pa.float64()),
+        ('feedback', pa.string()), ('score', pa.float64())
+    ] + [(f"total_budget_{currency}", pa.float64()) for currency in currencies])
+    if currencies and rate_table is None:
+        from utils.registry import get_agent
+        rate_table = get_agent("rate_table")
+    if currencies:
+        rate_table.factors(list(currencies))
+
+    def write(batch):
+        table = pa.Table.from_pylist(batch, schema=schema)
+        if currencies:
+            # Convert the whole batch in one vectorized pass
+            totals = rate_table.convert([row['total_budget'] for row in batch], list(currencies))
+            for index, currency in enumerate(currencies):
+                name = f"total_budget_{currency}"
+                table = table.set_column(table.schema.get_field_index(name), name, pa.array(totals[:, index]))
+        writer.write_table(table)
+
+    # A re-run may have written a proposal again after an earlier error
+    latest = {}
+    for record in VersionJournal(output_path).iter_records():
+        if record.get('status') == 'ok':
+            latest[record['id']] = record
+
+    with pq.ParquetWriter(parquet_path, schema) as writer:
+        batch = []
+        for record in latest.values():
+            row = {column: record.get(column) for column in columns}
+            row['budget'] = list(record['budget'].items())
+            batch.append(row)
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Outline -> Budget -> Review pipeline over a file of proposals")
+    parser.add_argument('input', help="JSONL or CSV file of proposals")
+    parser.add_argument('output', help="JSONL file to append results to")
+    parser.add_argument('--history-dir', help="Directory for per-proposal version journals")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes per stage")
+    parser.add_argument('--queue-size', type=int, default=64, help="Capacity of each queue between stages")
+    parser.add_argument('--seed', type=int, help="Seed for reproducible generations")
+    parser.add_argument('--report-every', type=float, default=5.0, help="Seconds between progress reports")
+    parser.add_argument('--parquet', help="Also export the completed results to this Parquet file")
+    parser.add_argument('--currencies', default="",
+                        help="Comma-separated currencies to add total budget columns for in the Parquet export, e.g. INR,EUR")
+    args = parser.parse_args()
+
+    # Check the currencies before the run rather than when exporting after it
+    currencies = [currency.strip().upper() for currency in args.currencies.split(",") if currency.strip()]
+    if currencies:
+        from utils.registry import get_agent
+        try:
+            known = get_agent("rate_table").currencies()
+        except ValueError as e:
+            print(f"Error loading exchange rates: {e}")
+            sys.exit(1)
+        unknown = [currency for currency in currencies if currency not in known]
+        if unknown:
+            print(f"Error: no exchange rate for {', '.join(unknown)} (known currencies: {', '.join(known)})")
+            sys.exit(1)
+
+    stats = run_pipeline(args.input, args.output, history_dir=args.history_dir, workers=args.workers,
+                         queue_size=args.queue_size, seed=args.seed, report_every=args.report_every)
+    print(f"Done: {stats['completed']} completed, {stats['failed']} failed, {stats['skipped']} skipped "
+          f"in {stats['seconds']:.1f} s ({stats['throughput']:.1f} proposals/s)")
+    accounted = stats['completed'] + stats['failed'] + stats['skipped']
+    if accounted != stats['inputs']:
+        print(f"Error: {stats['inputs'] - accounted} of {stats['inputs']} proposals have no result")
+        sys.exit(1)
+
+    if args.parquet:
+        try:
+            export_parquet(args.output, args.parquet, currencies=currencies)
+        except ImportError as e:
+            print(f"Error exporting Parquet (pyarrow is required): {e}")
+
+
+if __name__ == '__main__':
+    main()
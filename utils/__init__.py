@@ -0,0 +1,34 @@
+"""
+Shared utilities: version history, storage and agent registry.
+
+Public names are re-exported lazily (PEP 562) so that importing the package
+only loads the modules that are actually used.
+"""
+import importlib
+
+_EXPORTS = {
+    "VersionTracker": "utils.memory",
+    "VersionJournal": "utils.journal",
+    "ProposalStore": "utils.storage",
+    "VersionSearchIndex": "utils.search",
+    "TopicClassifier": "utils.classifier",
+    "classify_topic": "utils.classifier",
+    "get_agent": "utils.registry",
+    "SectionIndex": "utils.sections",
+    "parse_sections": "utils.sections",
+    "RateTable": "utils.currency",
+    "PriorityIndex": "utils.priorities",
+    "metrics": "utils.instrumentation",
+    "instrumented": "utils.instrumentation",
+    "untimed": "utils.instrumentation",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,174 @@
+from collections import deque
+from functools import lru_cache
+
+# Topic keywords per template category, in priority order: when a topic
+# matches keywords of several categories, the first category listed wins.
+DEFAULT_KEYWORDS = {
+    "research": ["research", "study", "investigation", "analysis"],
+    "nonprofit": ["nonprofit", "community", "social", "service"],
+}
+
+
+def normalize_topic(topic):
+    """Lowercase a topic and collapse runs of whitespace"""
+    return " ".join((topic or "").lower().split())
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a set of keywords, each tagged with a category.
+
+    Scanning a text costs time proportional to its length, no matter how many
+    keywords are registered.
+    """
+
+    def __init__(self, keywords):
+        """
+        Build the automaton.
+
+        Args:
+            keywords (dict): Category name -> list of keywords
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [frozenset()]
+
+        for category, words in keywords.items():
+            for word in words:
+                self._add(word.lower(), category)
+        self._link()
+
+    def _add(self, word, category):
+        node = 0
+        for char in word:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(frozenset())
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node] = self._output[node] | {category}
+
+    def _link(self):
+        # Breadth-first so every failure target is finished before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] | self._output[self._fail[child]]
+
+    def find_categories(self, text):
+        """
+        Find the categories of every keyword occurring in a text.
+
+        Args:
+            text (str): Text to scan (already lowercased)
+
+        Returns:
+            set: Matching category names
+        """
+        found = set()
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found |= output[node]
+        return found
+
+
+class TopicClassifier:
+    """
+    Classifies project topics into template categories by keyword.
+
+    All keyword sets are compiled into one automaton and results are memoized
+    per normalized topic.
+    """
+
+    def __init__(self, keywords=None, default="general", cache_size=4096):
+        """
+        Initialize the classifier.
+
+        Args:
+            keywords (dict, optional): Category name -> list of keywords, in
+                priority order. Defaults to DEFAULT_KEYWORDS.
+            default (str): Category used when no keyword matches
+            cache_size (int): Number of classified topics to memoize
+        """
+        self.keywords = {category: list(words) for category, words in (keywords or DEFAULT_KEYWORDS).items()}
+        self.default = default
+        self._automaton = KeywordAutomaton(self.keywords)
+        self._classify = lru_cache(maxsize=cache_size)(self._classify_normalized)
+
+    def add_keywords(self, category, keywords):
+        """
+        Register additional keywords for a category and rebuild the automaton.
+
+        New categories are added with the lowest priority.
+
+        Args:
+            category (str): Category name
+            keywords (list): Keywords to add
+        """
+        self.keywords.setdefault(category, []).extend(keywords)
+        self._automaton = KeywordAutomaton(self.keywords)
+        self._classify.cache_clear()
+
+    def classify(self, topic):
+        """
+        Classify a topic.
+
+        Args:
+            topic (str): The research or project topic
+
+        Returns:
+            str: The category name, or the default category if nothing matches
+        """
+        return self._classify(normalize_topic(topic))
+
+    def _classify_normalized(self, topic):
+        found = self._automaton.find_categories(topic)
+        for category in self.keywords:
+            if category in found:
+                return category
+        return self.default
+
+    def cache_info(self):
+        """Return hit/miss statistics of the classification cache"""
+        return self._classify.cache_info()
+
+
+_default_classifier = None
+
+
+def get_classifier():
+    """Get the shared classifier built from DEFAULT_KEYWORDS"""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = TopicClassifier()
+    return _default_classifier
+
+
+def classify_topic(topic):
+    """
+    Classify a topic with the shared classifier.
+
+    Args:
+        topic (str): The research or project topic
+
+    Returns:
+        str: "research", "nonprofit" or "general"
+    """
+    return get_classifier().classify(topic)
@@ -0,0 +1,238 @@
+import csv
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime
+
+# NumPy and pandas are imported inside the conversion methods to keep
+# importing this module cheap.
+
+# Built-in rates in units of each currency per US dollar, used when no rate
+# file is configured
+BUILTIN_RATES = {
+    "base": "USD",
+    "rates": {
+        "2022-01-01": {"INR": 75.0, "EUR": 0.88, "GBP": 0.74, "JPY": 115.0, "CAD": 1.27, "AUD": 1.39}
+    }
+}
+
+CURRENCY_SYMBOLS = {"USD": "$", "INR": "₹", "EUR": "€", "GBP": "£", "JPY": "¥", "CAD": "CA$", "AUD": "A$"}
+
+
+def currency_symbol(currency):
+    """The symbol used to display amounts in a currency, e.g. "₹" for INR"""
+    return CURRENCY_SYMBOLS.get(currency, currency + " ")
+
+
+def format_amount(amount, currency):
+    """Format an amount for display, e.g. "₹1,234.50" """
+    return f"{currency_symbol(currency)}{amount:,.2f}"
+
+
+def _date_key(value):
+    """Convert a date, datetime or ISO date string to an ISO date string"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return date.fromisoformat(str(value)[:10]).isoformat()
+
+
+class RateTable:
+    """
+    Dated exchange rates loaded from a local file and cached in memory.
+
+    The file is JSON of the form {"base": "USD", "rates": {"2025-01-02":
+    {"INR": 85.6, "EUR": 0.97}}}, or CSV with "date", "currency" and "rate"
+    columns giving units of each currency per unit of the base currency. A
+    conversion uses the latest rates dated on or before the requested day.
+    The file's modification time is re-checked every check_interval seconds,
+    so an updated rate file is picked up without restarting.
+    """
+
+    def __init__(self, path=None, check_interval=60.0):
+        """
+        Initialize the rate table.
+
+        Args:
+            path (str, optional): JSON or CSV rate file; the built-in rates are
+                used if not provided
+            check_interval (float): Seconds between modification time checks
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._checked_at = 0.0
+        self._dates = []
+        self._tables = []
+        self.base = "USD"
+        self._factors = {}
+        if path:
+            self._reload()
+        else:
+            self._set(BUILTIN_RATES)
+
+    def _current(self):
+        """The loaded dates and rate tables, reloading the file if it changed"""
+        if self.path and time.monotonic() - self._checked_at >= self.check_interval:
+            self._reload()
+        return self._dates, self._tables
+
+    def _reload(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime_ns = os.stat(self.path).st_mtime_ns
+                if mtime_ns == self._mtime_ns:
+                    return
+                data = self._parse(self.path)
+            except Exception as e:
+                print(f"Error loading exchange rates from {self.path}: {e}")
+                if not self._tables:
+                    self._set(BUILTIN_RATES)
+                return
+            self._set(data)
+            self._mtime_ns = mtime_ns
+
+    def _parse(self, path):
+        if path.endswith('.csv'):
+            rates = {}
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    rates.setdefault(_date_key(row['date']), {})[row['currency'].strip().upper()] = float(row['rate'])
+            return {"base": "USD", "rates": rates}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _set(self, data):
+        base = data.get("base", "USD").upper()
+        tables = []
+        dates = sorted(_date_key(day) for day in data["rates"])
+        by_date = {_date_key(day): rates for day, rates in data["rates"].items()}
+        for day in dates:
+            table = {currency.upper(): float(rate) for currency, rate in by_date[day].items()}
+            table[base] = 1.0
+            tables.append(table)
+        if not tables:
+            raise ValueError("The rate table has no rates")
+        self.base = base
+        self._dates = dates
+        self._tables = tables
+        self._factors = {}
+
+    def rates(self, as_of=None):
+        """
+        Get the rates in effect on a day.
+
+        Args:
+            as_of (date, datetime or str, optional): The day; defaults to the
+                latest rates. Days before the first dated rates use the first.
+
+        Returns:
+            tuple: (date of the rates as an ISO string, dict of currency ->
+                units per unit of the base currency)
+        """
+        dates, tables = self._current()
+        index = len(dates) - 1 if as_of is None else max(bisect_right(dates, _date_key(as_of)) - 1, 0)
+        return dates[index], tables[index]
+
+    def currencies(self, as_of=None):
+        """The currencies with a rate on a day, sorted"""
+        return sorted(self.rates(as_of)[1])
+
+    def factors(self, currencies, source="USD", as_of=None):
+        """
+        Get the multipliers that convert amounts in one currency to others.
+
+        Args:
+            currencies (list): Target currency codes
+            source (str): Currency the amounts are in
+            as_of (date, datetime or str, optional): Day of the rates to use
+
+        Returns:
+            ndarray: One multiplier per target currency
+
+        Raises:
+            ValueError: If a currency has no rate on that day
+        """
+        import numpy as np
+
+        day, table = self.rates(as_of)
+        key = (day, source, tuple(currencies))
+        factors = self._factors.get(key)
+        if factors is None:
+            unknown = [currency for currency in (source, *currencies) if currency not in table]
+            if unknown:
+                raise ValueError(f"No exchange rate for {', '.join(unknown)} on {day}")
+            factors = np.array([table[currency] for currency in currencies]) / table[source]
+            self._factors[key] = factors
+        return factors
+
+    def convert(self, amounts, currencies, source="USD", as_of=None):
+        """
+        Convert amounts to several currencies at once.
+
+        Args:
+            amounts (array-like): Amounts in the source currency, of any shape
+            currencies (list): Target currency codes
+            source (str): Currency the amounts are in
+            as_of (date, datetime or str, optional): Day of the rates to use
+
+        Returns:
+            ndarray: The amounts with a trailing axis of one entry per target
+                currency
+        """
+        import numpy as np
+
+        return np.asarray(amounts, dtype=float)[..., None] * self.factors(currencies, source, as_of)
+
+    def convert_frame(self, frame, currencies, columns, source="USD", as_of=None):
+        """
+        Convert amount columns of a DataFrame to several currencies in one pass.
+
+        Works the same for one budget (a row per category) and for a portfolio
+        of thousands of budgets (a row per budget, a column per category).
+
+        Args:
+            frame (DataFrame): The amounts
+            currencies (list): Target currency codes
+            columns (list): Amount columns, in the source currency
+            source (str): Currency the amounts are in
+            as_of (date, datetime or str, optional): Day of the rates to use
+
+        Returns:
+            DataFrame: The other columns of the frame, then for each amount
+                column one "<column> (<currency>)" column per currency
+        """
+        import pandas as pd
+
+        converted = self.convert(frame[columns].to_numpy(dtype=float), currencies, source, as_of)
+        names = [f"{column} ({currency})" for column in columns for currency in currencies]
+        amounts = pd.DataFrame(converted.reshape(len(frame), -1), index=frame.index, columns=names)
+        return pd.concat([frame.drop(columns=columns), amounts], axis=1)
+
+    def budget_ledger(self, budget, currencies, as_of=None):
+        """
+        Tabulate one budget in several currencies.
+
+        The same table feeds the budget display and its CSV and Parquet
+        exports, so they always agree.
+
+        Args:
+            budget (dict): Category -> amount in USD
+            currencies (list): Currency codes to show
+            as_of (date, datetime or str, optional): Day of the rates to use
+
+        Returns:
+            DataFrame: A 'Category' column and one "Amount (<currency>)"
+                column per currency
+        """
+        import pandas as pd
+
+        frame = pd.DataFrame({'Category': list(budget), 'Amount': list(budget.values())})
+        return self.convert_frame(frame, currencies, ['Amount'], as_of=as_of)
@@ -0,0 +1,109 @@
+"""
+Diagnostics views for the Streamlit app: live span timings, request profiles,
+job queue state and agent construction stats.
+
+These live outside app.py because Streamlit transforms and compiles the app
+script for every new script runner; the diagnostics views are only compiled
+once, when this module is first imported.
+"""
+import pandas as pd
+import streamlit as st
+
+from utils.instrumentation import metrics
+from utils.registry import get_agent, registry
+
+
+def show_diagnostics_page(job_scheduler):
+    """
+    Render the Diagnostics page.
+
+    Args:
+        job_scheduler (JobScheduler): Shared scheduler whose queue is shown
+    """
+    st.header("Diagnostics")
+
+    profile_memory = st.checkbox("Also trace memory allocations")
+    if st.button("Profile the Next Request"):
+        metrics.profile_next(memory=profile_memory)
+        st.success("The next agent request will be profiled")
+    if st.button("Reset Metrics"):
+        metrics.reset()
+
+    @st.fragment(run_every=2)
+    def live_metrics():
+        queue = job_scheduler.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Queued Jobs", queue['queued'])
+        col2.metric("Running Jobs", f"{queue['running']} / {job_scheduler.max_workers}")
+        col3.metric("Sessions Waiting", len(queue['queued_by_user']))
+        col4.metric("p95 Queue Wait", f"{queue['wait']['p95'] * 1000:.0f} ms" if queue['wait'] else "-")
+
+        snapshot = metrics.snapshot()
+        rows = [
+            {
+                'Span': name,
+                'Calls': summary['count'],
+                'p50 (ms)': round(summary['p50'] * 1000, 3),
+                'p95 (ms)': round(summary['p95'] * 1000, 3),
+                'p99 (ms)': round(summary['p99'] * 1000, 3),
+                'Max (ms)': round(summary['max'] * 1000, 3),
+                'Total (s)': round(summary['sum'], 3)
+            }
+            for name, summary in snapshot['spans'].items()
+        ]
+        if rows:
+            st.dataframe(pd.DataFrame(rows).sort_values('Total (s)', ascending=False), hide_index=True)
+        else:
+            st.info("No spans recorded yet")
+
+        st.subheader("Recent Requests")
+        for request in snapshot['requests'][:10]:
+            label = f"{request['name']}: {request['seconds'] * 1000:.1f} ms"
+            if 'profile' in request or 'memory' in request:
+                label += " (profiled)"
+            with st.expander(label):
+                if request['spans']:
+                    st.table(pd.DataFrame([
+                        {'Span': name, 'Start (ms)': round(offset * 1000, 3), 'Duration (ms)': round(duration * 1000, 3)}
+                        for name, offset, duration in request['spans']
+                    ]))
+                if 'profile' in request:
+                    st.code(request['profile'])
+                if 'memory' in request:
+                    st.code("\n".join(request['memory']))
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download Prometheus Metrics", metrics.to_prometheus(), "metrics.prom", "text/plain")
+        with col2:
+            st.download_button("Download JSON", metrics.to_json(), "metrics.json", "application/json")
+
+    live_metrics()
+
+
+def show_agent_diagnostics(construction_stats_before):
+    """
+    Render the sidebar's agent construction and response cache stats.
+
+    Args:
+        construction_stats_before (dict): registry.stats() at the start of
+            this rerun, to show what the rerun itself constructed
+    """
+    with st.sidebar.expander("Agent Diagnostics"):
+        construction_stats = registry.stats()
+        rows = []
+        for name, stats in construction_stats.items():
+            before = construction_stats_before.get(name, {'constructions': 0, 'seconds': 0.0})
+            rows.append({
+                'Agent': name,
+                'Built (total)': stats['constructions'],
+                'Built (this rerun)': stats['constructions'] - before['constructions'],
+                'Build time this rerun (ms)': round((stats['seconds'] - before['seconds']) * 1000, 2)
+            })
+        st.table(pd.DataFrame(rows))
+
+        cache_stats = get_agent("response_cache").stats()
+        st.caption(
+            f"Response cache: {cache_stats['memory_hits']} memory hits, {cache_stats['disk_hits']} disk hits, "
+            f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate)"
+        )
@@ -0,0 +1,294 @@
+from bisect import bisect_left
+from collections import deque
+
+# Myers is only used on the small gaps between patience anchors; past this
+# many edits a gap is reported as a plain delete/insert block instead.
+MAX_MYERS_EDITS = 1000
+
+
+def _unique_lcs(a, alo, ahi, b, blo, bhi):
+    """
+    Find the longest common subsequence of lines that occur exactly once in
+    both a[alo:ahi] and b[blo:bhi] (the patience diff anchors).
+
+    Returns:
+        list: (i, j) index pairs in increasing order
+    """
+    counts = {}
+    for i in range(alo, ahi):
+        entry = counts.setdefault(a[i], [0, 0, i, 0])
+        entry[0] += 1
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = j
+
+    pairs = sorted((i, j) for count_a, count_b, i, j in counts.values() if count_a == 1 and count_b == 1)
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence of the b indices (patience sorting)
+    tails = []
+    tail_index = []
+    previous = [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        previous[k] = tail_index[pos - 1] if pos else None
+
+    result = []
+    k = tail_index[-1]
+    while k is not None:
+        result.append(pairs[k])
+        k = previous[k]
+    result.reverse()
+    return result
+
+
+def _myers(a, alo, ahi, b, blo, bhi):
+    """
+    Myers O(ND) diff of a[alo:ahi] against b[blo:bhi].
+
+    Returns:
+        list: ('=' | '-' | '+', i, j) edit operations in order
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = min(n + m, MAX_MYERS_EDITS)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+
+    for d in range(max_d + 1):
+        trace.append(v[:])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, offset, n, m, alo, blo)
+
+    # Too many edits: fall back to replacing the whole block
+    return ([('-', alo + i, blo) for i in range(n)] +
+            [('+', ahi, blo + j) for j in range(m)])
+
+
+def _myers_backtrack(trace, offset, x, y, alo, blo):
+    ops = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[offset + prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            ops.append(('=', alo + x, blo + y))
+        if d > 0:
+            if x == prev_x:
+                ops.append(('+', alo + x, blo + prev_y))
+            else:
+                ops.append(('-', alo + prev_x, blo + y))
+        x, y = prev_x, prev_y
+    ops.reverse()
+    return ops
+
+
+def iter_line_ops(a, b):
+    """
+    Lazily diff two lists of lines using patience diff, with Myers diff for
+    the gaps between unique anchor lines.
+
+    Operations are yielded in order as soon as they are known, so callers can
+    start rendering before the whole diff has been computed.
+
+    Args:
+        a (list): Old lines
+        b (list): New lines
+
+    Yields:
+        tuple: (op, i, j) where op is '=' (a[i] == b[j]), '-' (a[i] removed)
+            or '+' (b[j] added)
+    """
+    # Explicit stack instead of recursion so long inputs cannot overflow it
+    stack = [('range', 0, len(a), 0, len(b))]
+    while stack:
+        task = stack.pop()
+        if task[0] == 'equal':
+            _, i, j, count = task
+            for step in range(count):
+                yield ('=', i + step, j + step)
+            continue
+
+        _, alo, ahi, blo, bhi = task
+
+        # Common prefix
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            yield ('=', alo, blo)
+            alo += 1
+            blo += 1
+
+        # Common suffix is emitted after the middle
+        suffix = 0
+        while alo < ahi - suffix and blo < bhi - suffix and a[ahi - 1 - suffix] == b[bhi - 1 - suffix]:
+            suffix += 1
+        ahi -= suffix
+        bhi -= suffix
+
+        if alo == ahi or blo == bhi:
+            for i in range(alo, ahi):
+                yield ('-', i, blo)
+            for j in range(blo, bhi):
+                yield ('+', ahi, j)
+            if suffix:
+                stack.append(('equal', ahi, bhi, suffix))
+            continue
+
+        anchors = _unique_lcs(a, alo, ahi, b, blo, bhi)
+        if not anchors:
+            yield from _myers(a, alo, ahi, b, blo, bhi)
+            if suffix:
+                stack.append(('equal', ahi, bhi, suffix))
+            continue
+
+        # Push in reverse so the leftmost gap is processed first
+        if suffix:
+            stack.append(('equal', ahi, bhi, suffix))
+        tasks = []
+        for i, j in anchors:
+            tasks.append(('range', alo, i, blo, j))
+            tasks.append(('equal', i, j, 1))
+            alo, blo = i + 1, j + 1
+        tasks.append(('range', alo, ahi, blo, bhi))
+        stack.extend(reversed(tasks))
+
+
+def iter_hunks(old_text, new_text, context=3):
+    """
+    Lazily diff two texts line by line and group the changes into hunks.
+
+    Each hunk is yielded as soon as it is complete.
+
+    Args:
+        old_text (str): Old text
+        new_text (str): New text
+        context (int): Number of unchanged lines to keep around each change
+
+    Yields:
+        dict: A hunk with 'old_start', 'old_lines', 'new_start', 'new_lines'
+            (1-indexed, like unified diff headers) and 'lines', a list of
+            lines prefixed with ' ', '-' or '+'
+    """
+    a = (old_text or '').splitlines()
+    b = (new_text or '').splitlines()
+
+    leading = deque(maxlen=context)
+    hunk = None
+    trailing = 0
+
+    for op in iter_line_ops(a, b):
+        if op[0] == '=':
+            if hunk is None:
+                leading.append(op)
+                continue
+            hunk.append(op)
+            trailing += 1
+            if trailing > 2 * context:
+                # Keep `context` lines after the change, carry the last
+                # `context` lines over as leading context for the next hunk
+                tail = hunk[len(hunk) - trailing:]
+                del hunk[len(hunk) - trailing + context:]
+                yield _finish_hunk(hunk, a, b)
+                hunk = None
+                leading.clear()
+                if context:
+                    leading.extend(tail[-context:])
+            continue
+
+        if hunk is None:
+            hunk = list(leading)
+            leading.clear()
+        hunk.append(op)
+        trailing = 0
+
+    if hunk is not None:
+        if trailing > context:
+            del hunk[len(hunk) - trailing + context:]
+        yield _finish_hunk(hunk, a, b)
+
+
+def _finish_hunk(ops, a, b):
+    lines = []
+    old_start = new_start = None
+    old_count = new_count = 0
+    for op, i, j in ops:
+        if old_start is None:
+            old_start, new_start = i + 1, j + 1
+        if op == '=':
+            lines.append(' ' + a[i])
+            old_count += 1
+            new_count += 1
+        elif op == '-':
+            lines.append('-' + a[i])
+            old_count += 1
+        else:
+            lines.append('+' + b[j])
+            new_count += 1
+    return {
+        'old_start': old_start,
+        'old_lines': old_count,
+        'new_start': new_start,
+        'new_lines': new_count,
+        'lines': lines
+    }
+
+
+def diff_text(old_text, new_text, context=3):
+    """
+    Diff two texts line by line.
+
+    Returns:
+        list: All hunks, see iter_hunks
+    """
+    return list(iter_hunks(old_text, new_text, context))
+
+
+def diff_dict(old, new):
+    """
+    Compute per-key differences between two flat dicts, such as budgets.
+
+    Returns:
+        dict: 'added' and 'removed' map keys to values; 'changed' maps keys to
+            {'old', 'new'} plus 'delta' when both values are numbers
+    """
+    old = old or {}
+    new = new or {}
+    changed = {}
+    for key in old.keys() & new.keys():
+        if old[key] != new[key]:
+            change = {'old': old[key], 'new': new[key]}
+            if isinstance(old[key], (int, float)) and isinstance(new[key], (int, float)):
+                change['delta'] = new[key] - old[key]
+            changed[key] = change
+
+    return {
+        'added': {key: new[key] for key in new if key not in old},
+        'removed': {key: old[key] for key in old if key not in new},
+        'changed': changed
+    }
@@ -0,0 +1,477 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Histogram bucket upper bounds in seconds, for the Prometheus export
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Samples per span kept for the percentiles
+RECENT_SAMPLES = 2048
+
+CO_GENERATOR = 0x20
+CO_COROUTINE = 0x80
+CO_ASYNC_GENERATOR = 0x200
+
+# Spans of the request being traced in this context, if any
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+class Histogram:
+    """
+    Latency histogram of one span.
+
+    Keeps cumulative bucket counts for export and a window of the most
+    recent samples, from which the percentiles are computed on demand.
+    """
+
+    __slots__ = ('count', 'sum', 'min', 'max', 'buckets', 'recent', '_lock')
+
+    def __init__(self, window=RECENT_SAMPLES):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Record one duration"""
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+            self.buckets[bisect_left(BUCKETS, seconds)] += 1
+            self.recent.append(seconds)
+
+    def snapshot(self):
+        """
+        Summarize the histogram.
+
+        Returns:
+            dict: 'count', 'sum', 'mean', 'min', 'max' and the 'p50', 'p95'
+                and 'p99' of the recent samples, in seconds
+        """
+        with self._lock:
+            recent = sorted(self.recent)
+            summary = {
+                'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else 0.0,
+                'min': self.min or 0.0,
+                'max': self.max or 0.0,
+            }
+        for name, quantile in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            # Nearest-rank percentile
+            summary[name] = recent[min(len(recent) - 1, int(quantile * len(recent)))] if recent else 0.0
+        return summary
+
+
+class _Span:
+    """Context manager timing one span; records into the metrics on exit"""
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    """Stand-in for _Span when metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Metrics:
+    """
+    In-process latency metrics for spans, with optional per-request profiling.
+
+    Every span name gets a Histogram. A request (see request()) additionally
+    records the timeline of the spans run inside it and can be sampled with
+    cProfile and tracemalloc; the most recent requests are kept for the
+    diagnostics page.
+    """
+
+    def __init__(self, enabled=True, sample_rate=0.0, max_requests=50):
+        """
+        Initialize the metrics.
+
+        Args:
+            enabled (bool): Record spans; when False, spans cost one call
+            sample_rate (float): Fraction of requests to profile
+            max_requests (int): Number of recent requests kept
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._histograms = {}
+        self._counters = {}
+        self._requests = deque(maxlen=max_requests)
+        self._profile_next = []
+        self._profiling = threading.Lock()
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        """
+        Time a block of code.
+
+        Usage:
+            with metrics.span("VersionTracker.save_version"):
+                ...
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start, seconds):
+        """Record a finished span that started at perf_counter() time start"""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        histogram.observe(seconds)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, start, seconds))
+
+    def increment(self, name, amount=1):
+        """Add to a counter"""
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def profile_next(self, count=1, memory=False):
+        """
+        Profile the next requests with cProfile, and tracemalloc if memory is set.
+
+        Args:
+            count (int): Number of requests to profile
+            memory (bool): Also trace memory allocations
+        """
+        with self._lock:
+            self._profile_next.extend([memory] * count)
+
+    def request(self, name, profile=None, memory=False):
+        """
+        Time a user-facing request and trace the spans inside it.
+
+        Args:
+            name (str): Request name, e.g. "OutlineDesigner.generate_outline"
+            profile (bool, optional): Profile this request; by default it is
+                profiled if profile_next() asked for it or it is sampled at
+                sample_rate
+            memory (bool): Also trace memory allocations when profiling
+
+        Returns:
+            A context manager
+        """
+        if profile is None:
+            with self._lock:
+                if self._profile_next:
+                    profile, memory = True, self._profile_next.pop(0) or memory
+            if profile is None and self.sample_rate:
+                import random
+                profile = random.random() < self.sample_rate
+        return _Request(self, name, bool(profile), memory)
+
+    def snapshot(self):
+        """
+        Get the current numbers.
+
+        Returns:
+            dict: 'spans' (name -> Histogram.snapshot()), 'counters' and
+                'requests' (recent requests, newest first)
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+            requests = list(self._requests)
+        return {
+            'spans': {name: histogram.snapshot() for name, histogram in sorted(histograms.items())},
+            'counters': counters,
+            'requests': requests[::-1],
+        }
+
+    def to_json(self, indent=2):
+        """The snapshot as a JSON document"""
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def dump_json(self, path):
+        """Write the snapshot to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+
+    def to_prometheus(self, prefix="grant"):
+        """
+        Export the metrics in the Prometheus text exposition format.
+
+        Spans are one histogram family labelled by span name, with the
+        recent percentiles as a gauge; counters are one counter family.
+
+        Returns:
+            str: The exposition text
+        """
+        snapshot = self.snapshot()
+        with self._lock:
+            histograms = dict(self._histograms)
+
+        lines = [
+            f"# HELP {prefix}_span_seconds Time spent in instrumented spans",
+            f"# TYPE {prefix}_span_seconds histogram",
+        ]
+        for name, histogram in sorted(histograms.items()):
+            label = f'span="{_escape_label(name)}"'
+            with histogram._lock:
+                buckets = list(histogram.buckets)
+                count, total = histogram.count, histogram.sum
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_span_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_span_seconds_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{prefix}_span_seconds_sum{{{label}}} {total}")
+            lines.append(f"{prefix}_span_seconds_count{{{label}}} {count}")
+
+        lines.append(f"# HELP {prefix}_span_recent_seconds Percentiles of recent span durations")
+        lines.append(f"# TYPE {prefix}_span_recent_seconds gauge")
+        for name, summary in snapshot['spans'].items():
+            for quantile in ('p50', 'p95', 'p99'):
+                lines.append(f'{prefix}_span_recent_seconds{{span="{_escape_label(name)}",'
+                             f'quantile="0.{quantile[1:]}"}} {summary[quantile]}')
+
+        lines.append(f"# HELP {prefix}_events_total Instrumentation event counters")
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{prefix}_events_total{{event="{_escape_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Forget all recorded spans, counters and requests"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._requests.clear()
+
+
+class _Request:
+    """Context manager for Metrics.request"""
+
+    def __init__(self, metrics, name, profile, memory):
+        self.metrics = metrics
+        self.name = name
+        self.profile = profile
+        self.memory = memory
+        self._profiler = None
+        self._tracing = False
+        self._profiling = False
+
+    def __enter__(self):
+        self.trace = []
+        self._token = _trace.set(self.trace)
+        # Only one request at a time can be profiled
+        if self.profile and self.metrics._profiling.acquire(blocking=False):
+            self._profiling = True
+            import cProfile
+            if self.memory:
+                import tracemalloc
+                self._tracing = not tracemalloc.is_tracing()
+                if self._tracing:
+                    tracemalloc.start()
+                self._memory_before = tracemalloc.take_snapshot()
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:
+                # Another profiler is active in this thread
+                self._profiler = None
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        report = {}
+        if self._profiling:
+            report = self._finish_profiling()
+            self.metrics._profiling.release()
+        _trace.reset(self._token)
+
+        self.metrics.record(f"request:{self.name}", self.start, seconds)
+        self.metrics._requests.append({
+            'name': self.name,
+            'started_at': self.started_at,
+            'seconds': seconds,
+            'error': f"{exc_type.__name__}: {exc}" if exc_type else None,
+            # Offsets from the start of the request, in seconds
+            'spans': sorted(((name, start - self.start, duration) for name, start, duration in self.trace),
+                            key=lambda span: span[1]),
+            **report,
+        })
+        return False
+
+    def _finish_profiling(self):
+        report = {}
+        if self._profiler is not None:
+            import io
+            import pstats
+            self._profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(30)
+            report['profile'] = stream.getvalue()
+        if self.memory:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                stats = tracemalloc.take_snapshot().compare_to(self._memory_before, 'lineno')
+                report['memory'] = [str(stat) for stat in stats[:15]]
+                report['memory_peak'] = tracemalloc.get_traced_memory()[1]
+            if self._tracing:
+                tracemalloc.stop()
+        return report
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Process-wide metrics; GRANT_METRICS=0 turns recording off
+metrics = Metrics(
+    enabled=os.environ.get("GRANT_METRICS", "1") != "0",
+    sample_rate=float(os.environ.get("GRANT_PROFILE_SAMPLE_RATE", "0") or 0)
+)
+
+
+def span(name):
+    """Time a block of code in the process-wide metrics (see Metrics.span)"""
+    return metrics.span(name)
+
+
+def instrumented(name=None):
+    """
+    Record every call of a function or method as a span.
+
+    Works for regular functions, coroutines, generators and async
+    generators; a generator's span covers the time spent producing its
+    items, not the time its consumer spends between them. While metrics
+    are disabled, a generator function returns its generator unwrapped, so
+    its items are not timed one by one.
+
+    Args:
+        name (str, optional): Span name; defaults to the function's
+            qualified name, e.g. "OutlineDesigner.stream_outline"
+
+    Usage:
+        @instrumented()
+        def generate_outline(self, ...):
+    """
+    def decorate(function):
+        span_name = name or function.__qualname__
+        flags = function.__code__.co_flags
+
+        if flags & CO_ASYNC_GENERATOR:
+            async def timed_async_generator(iterator):
+                start = time.perf_counter()
+                busy = 0.0
+                try:
+                    while True:
+                        resumed = time.perf_counter()
+                        try:
+                            item = await iterator.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            busy += time.perf_counter() - resumed
+                        yield item
+                finally:
+                    await iterator.aclose()
+                    metrics.record(span_name, start, busy)
+
+            @functools.wraps(function)
+            def async_generator_wrapper(*args, **kwargs):
+                iterator = function(*args, **kwargs)
+                return timed_async_generator(iterator) if metrics.enabled else iterator
+            async_generator_wrapper.__untimed__ = function
+            return async_generator_wrapper
+
+        if flags & CO_GENERATOR:
+            def timed_generator(iterator):
+                clock = time.perf_counter
+                start = resumed = clock()
+                busy = 0.0
+                try:
+                    for item in iterator:
+                        busy += clock() - resumed
+                        yield item
+                        resumed = clock()
+                    busy += clock() - resumed
+                finally:
+                    iterator.close()
+                    metrics.record(span_name, start, busy)
+
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                iterator = function(*args, **kwargs)
+                return timed_generator(iterator) if metrics.enabled else iterator
+            generator_wrapper.__untimed__ = function
+            return generator_wrapper
+
+        if flags & CO_COROUTINE:
+            @functools.wraps(function)
+            async def coroutine_wrapper(*args, **kwargs):
+                with metrics.span(span_name):
+                    return await function(*args, **kwargs)
+            return coroutine_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics.span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def untimed(method):
+    """
+    Get an instrumented generator function or method without its per-item timing.
+
+    For callers that consume the whole stream inside a span of their own,
+    such as generate_outline joining stream_outline, so the work is not
+    timed twice.
+
+    Args:
+        method (callable): A function or bound method decorated with instrumented()
+
+    Returns:
+        callable: The decorated function, bound like method; method itself if
+            it is not an instrumented generator
+    """
+    function = getattr(getattr(method, '__func__', method), '__untimed__', None)
+    if function is None:
+        return method
+    owner = getattr(method, '__self__', None)
+    return function if owner is None else function.__get__(owner)
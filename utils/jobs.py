@@ -0,0 +1,313 @@
+import itertools
+import threading
+import time
+import types
+from collections import OrderedDict, deque
+
+from utils.instrumentation import metrics
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when a user already has the maximum number of jobs queued"""
+
+
+class Job:
+    """
+    A unit of agent work run by a JobScheduler.
+
+    A job whose function returns a generator is run chunk by chunk: the chunks
+    produced so far are available as partial_text() while it runs, its result
+    is the joined text, and it can be cancelled between chunks.
+    """
+
+    def __init__(self, job_id, user, name, function, args, kwargs):
+        self.id = job_id
+        self.user = user
+        self.name = name
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.chunks = []
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def done(self):
+        """Whether the job has finished, failed or been cancelled"""
+        return self.state in FINISHED_STATES
+
+    @property
+    def cancelling(self):
+        """Whether the job was cancelled while running and has not stopped yet"""
+        return self._cancelled.is_set() and not self.done
+
+    @property
+    def wait_seconds(self):
+        """Time spent queued, so far if the job has not started"""
+        return (self.started_at or time.time()) - self.submitted_at
+
+    @property
+    def run_seconds(self):
+        """Time spent running, so far if the job has not finished"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def partial_text(self):
+        """The chunks a streaming job has produced so far"""
+        return "".join(self.chunks)
+
+    def wait(self, timeout=None):
+        """
+        Block until the job is done.
+
+        Returns:
+            bool: Whether the job is done
+        """
+        return self._finished.wait(timeout)
+
+    def __repr__(self):
+        return f"Job({self.id!r}, {self.name!r}, user={self.user!r}, state={self.state!r})"
+
+
+class JobScheduler:
+    """
+    In-process job queue with a bounded pool of worker threads.
+
+    Each user (a browser session in the app) has its own FIFO queue, and the
+    workers take jobs from the users with queued work in turn, so one user
+    submitting many jobs cannot starve the others. Job state lives here
+    rather than in a session, so a Streamlit rerun only submits or polls.
+    Queue depth and time spent waiting and running are reported to
+    utils.instrumentation.metrics.
+    """
+
+    def __init__(self, max_workers=4, max_queued_per_user=8, keep_finished=256):
+        """
+        Initialize the scheduler. Worker threads are started on first submit.
+
+        Args:
+            max_workers (int): Number of jobs run at the same time
+            max_queued_per_user (int): Queued jobs allowed per user before
+                submit() raises QueueFullError
+            keep_finished (int): Number of finished jobs kept for polling
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_queued_per_user = max_queued_per_user
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._finished = OrderedDict()
+        # User -> deque of their queued jobs, and the users with queued jobs in turn order
+        self._queues = {}
+        self._turns = deque()
+        self._running = 0
+        self._workers = []
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def submit(self, user, name, function, *args, **kwargs):
+        """
+        Queue a call of function(*args, **kwargs).
+
+        Args:
+            user (str): Who the job is for; queues are fair between users
+            name (str): Job name for display and metrics, e.g. "OutlineDesigner.generate_outline"
+            function (callable): The work; may return a generator of text chunks
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFullError: If the user already has max_queued_per_user jobs queued
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("JobScheduler is shut down")
+            queue = self._queues.get(user)
+            if queue is not None and len(queue) >= self.max_queued_per_user:
+                raise QueueFullError(f"{len(queue)} jobs already queued")
+
+            job = Job(f"job-{next(self._ids)}", user, name, function, args, kwargs)
+            self._jobs[job.id] = job
+            if queue is None:
+                queue = self._queues[user] = deque()
+                self._turns.append(user)
+            queue.append(job)
+
+            if len(self._workers) < self.max_workers and len(self._workers) < self._running + self._queued():
+                worker = threading.Thread(target=self._work, name=f"job-worker-{len(self._workers) + 1}",
+                                          daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify()
+
+        metrics.increment("jobs.submitted")
+        return job
+
+    def get(self, job_id):
+        """Get a job by id, or None if it is unknown or no longer kept"""
+        return self._jobs.get(job_id)
+
+    def position(self, job_id):
+        """
+        Number of queued jobs that will start before a queued job.
+
+        Returns:
+            int: Jobs ahead of it, or None if the job is not queued
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != QUEUED:
+                return None
+            # Users take turns: before the job's turn comes, every other user
+            # gets one job per round, and users earlier in the turn order one more
+            own_index = self._queues[job.user].index(job)
+            turn = self._turns.index(job.user)
+            ahead = own_index
+            for index, user in enumerate(self._turns):
+                if index != turn:
+                    ahead += min(len(self._queues[user]), own_index + (1 if index < turn else 0))
+            return ahead
+
+    def cancel(self, job_id):
+        """
+        Cancel a job.
+
+        A queued job is removed from its queue. A running streaming job stops
+        before its next chunk; a running job that is a single call finishes
+        but its result is discarded.
+
+        Returns:
+            bool: Whether the job was queued or running
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job._cancelled.set()
+            if job.state == QUEUED:
+                queue = self._queues[job.user]
+                queue.remove(job)
+                if not queue:
+                    del self._queues[job.user]
+                    self._turns.remove(job.user)
+                self._finish(job, CANCELLED)
+        metrics.increment("jobs.cancelled")
+        return True
+
+    def stats(self):
+        """
+        Get queue statistics.
+
+        Returns:
+            dict: 'queued', 'running', 'workers', 'queued_by_user' and
+                'wait' and 'run' latency summaries (see Histogram.snapshot)
+        """
+        with self._condition:
+            stats = {
+                'queued': self._queued(),
+                'running': self._running,
+                'workers': len(self._workers),
+                'queued_by_user': {user: len(queue) for user, queue in self._queues.items()},
+            }
+        spans = metrics.snapshot()['spans']
+        stats['wait'] = spans.get("jobs.wait")
+        stats['run'] = spans.get("jobs.run")
+        return stats
+
+    def shutdown(self, wait=True):
+        """Cancel queued jobs and stop the workers once running jobs finish"""
+        with self._condition:
+            self._closed = True
+            queued = [job for queue in self._queues.values() for job in queue]
+            self._condition.notify_all()
+        for job in queued:
+            self.cancel(job.id)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next_job(self):
+        """Take the next user's oldest job. Call with the condition held."""
+        user = self._turns.popleft()
+        queue = self._queues[user]
+        job = queue.popleft()
+        if queue:
+            self._turns.append(user)
+        else:
+            del self._queues[user]
+        return job
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._turns and not self._closed:
+                    self._condition.wait()
+                if not self._turns:
+                    return
+                job = self._next_job()
+                job.state = RUNNING
+                job.started_at = time.time()
+                self._running += 1
+
+            if metrics.enabled:
+                metrics.record("jobs.wait", time.perf_counter() - job.wait_seconds, job.wait_seconds)
+            start = time.perf_counter()
+            state = DONE
+            try:
+                result = job.function(*job.args, **job.kwargs)
+                if isinstance(result, types.GeneratorType):
+                    result = self._consume(job, result)
+                job.result = result
+            except Exception as e:
+                job.error = e
+                state = FAILED
+                metrics.increment("jobs.failed")
+            if job._cancelled.is_set():
+                state = CANCELLED
+                job.result = None
+            if metrics.enabled:
+                metrics.record("jobs.run", start, time.perf_counter() - start)
+
+            with self._condition:
+                self._running -= 1
+                self._finish(job, state)
+
+    def _consume(self, job, chunks):
+        """Run a streaming job, keeping its chunks for partial_text()"""
+        try:
+            for chunk in chunks:
+                job.chunks.append(chunk)
+                if job._cancelled.is_set():
+                    break
+        finally:
+            chunks.close()
+        return job.partial_text()
+
+    def _finish(self, job, state):
+        """Mark a job finished and forget the oldest finished jobs. Call with the condition held."""
+        job.state = state
+        job.finished_at = time.time()
+        job.function = job.args = job.kwargs = None
+        job._finished.set()
+        self._finished[job.id] = job
+        while len(self._finished) > self.keep_finished:
+            old_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(old_id, None)
@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Exclusive lock shared between the threads of a process and between
+    processes, using an advisory lock on a separate lock file (fcntl.flock on
+    POSIX, msvcrt.locking on Windows).
+
+    The lock is reentrant within a thread. The lock file is kept open and
+    never deleted, so it stays valid while the file it guards is replaced.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the lock.
+
+        Args:
+            path (str): Path to the lock file, created if it does not exist
+        """
+        self.path = path
+        self._file = None
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a+b')
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._file.seek(0)
+                    while True:
+                        # LK_LOCK gives up with an error after ten seconds
+                        try:
+                            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._lock.release()
+
+    def close(self):
+        """Close the lock file. The lock must not be held."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class VersionJournal:
+    """
+    Append-only JSON Lines log used as a storage backend for version records.
+
+    Each record is written as a single line, so saving a version costs the
+    size of that version rather than the size of the whole history.
+    """
+
+    def __init__(self, path, fsync_every=16):
+        """
+        Initialize the journal.
+
+        Args:
+            path (str): Path to the JSON Lines file
+            fsync_every (int): Number of appends between fsync calls. Use 1 to
+                fsync after every append, or 0 to only fsync on sync()/close().
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self._file = None
+        self._pending = 0
+        # Bytes of the log read or written so far, and the identity of the
+        # file they belong to, so read_new() can tell appends from rewrites
+        self.offset = 0
+        self._identity = None
+
+    def replay(self):
+        """
+        Read every complete record from the journal.
+
+        A trailing partial line (for example from a crash during a write) is
+        truncated away so that later appends start on a clean line.
+
+        Returns:
+            list: The records in the order they were appended
+        """
+        return list(self.iter_records())
+
+    def iter_records(self):
+        """
+        Stream the complete records of the journal one at a time.
+
+        Like replay(), but without holding every record in memory. The
+        partial-line truncation happens once the iteration is finished.
+
+        Yields:
+            dict: The records in the order they were appended
+        """
+        if not os.path.exists(self.path):
+            return
+
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good_offset += len(line)
+                yield record
+            identity = _identity(os.fstat(f.fileno()))
+
+        if good_offset < os.path.getsize(self.path):
+            print(f"Discarding incomplete record at the end of {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+        self.offset = good_offset
+        self._identity = identity
+
+    def read_new(self):
+        """
+        Read the records other writers appended since this journal last read
+        or wrote the log.
+
+        Only the bytes past the last offset are read, and a line that is still
+        being written is left for the next call. Unlike replay(), nothing is
+        ever truncated, so this is safe to call while other processes append.
+
+        Returns:
+            tuple: (records, rewritten). rewritten is True if the log was
+                replaced since the last read, for example compacted by another
+                process; records then hold the whole log.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return [], False
+
+        rewritten = self._identity is not None and (
+            _identity(stat) != self._identity or stat.st_size < self.offset
+        )
+        if rewritten:
+            # Our append handle points at the old file
+            self.close()
+            self.offset = 0
+        elif stat.st_size == self.offset:
+            return [], False
+
+        records = []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+            self._identity = _identity(os.fstat(f.fileno()))
+
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            try:
+                records.append(json.loads(data[start:end]))
+            except ValueError:
+                break
+            start = end + 1
+        self.offset += start
+        return records, rewritten
+
+    def discard_partial(self):
+        """
+        Truncate an incomplete record left past the offset by a crashed writer.
+
+        Call after read_new(), while holding the lock all writers take, so
+        no other process can be part-way through an append. Bytes past the
+        offset that start with a complete record are left alone, since they
+        mean read_new() has not been called since they were written.
+
+        Returns:
+            int: Number of bytes discarded
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+        if size <= self.offset:
+            return 0
+
+        with open(self.path, 'r+b') as f:
+            f.seek(self.offset)
+            data = f.read()
+            end = data.find(b'\n')
+            if end >= 0:
+                try:
+                    json.loads(data[:end])
+                    return 0
+                except ValueError:
+                    pass
+            print(f"Discarding incomplete record at the end of {self.path}")
+            f.truncate(self.offset)
+        return size - self.offset
+
+    def append(self, record):
+        """
+        Append a record to the journal.
+
+        Args:
+            record (dict): JSON-serializable record
+        """
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        data = line.encode('utf-8')
+        self._file.write(data)
+        self._file.flush()
+        self.offset += len(data)
+
+        self._pending += 1
+        if self.fsync_every and self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush buffered records and fsync them to disk."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def compact(self, records):
+        """
+        Rewrite the journal so it contains exactly the given records.
+
+        The new log is written to a temporary file and atomically renamed over
+        the old one, so a crash during compaction leaves the old log intact.
+
+        Args:
+            records (list): Records to keep
+        """
+        self.close()
+
+        tmp_path = self.path + '.compact'
+        with open(tmp_path, 'wb') as f:
+            for record in records:
+                line = json.dumps(record, separators=(',', ':')) + '\n'
+                f.write(line.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+            self._identity = _identity(os.fstat(f.fileno()))
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        """Sync and close the underlying file."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+def _identity(stat):
+    """Identify a file across renames from its os.stat() result"""
+    return (stat.st_dev, stat.st_ino)
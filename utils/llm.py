@@ -0,0 +1,331 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import threading
+import weakref
+
+
+class ModelBackendError(Exception):
+    """Raised when the model backend cannot produce a response"""
+
+
+class ModelBackend:
+    """
+    Asyncio client for an OpenAI-compatible chat completions API.
+
+    One backend is shared by all agents. Each event loop gets a single pooled
+    HTTP client, and a semaphore caps the number of requests in flight so one
+    worker can serve many proposals at once without overloading the model.
+    Failed requests are retried with jittered exponential backoff.
+    """
+
+    # Status codes worth retrying: rate limits and transient server errors
+    RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(self, base_url, model, api_key=None, max_concurrency=8, timeout=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        """
+        Initialize the backend.
+
+        Args:
+            base_url (str): API base URL, e.g. "https://api.openai.com/v1"
+            model (str): Model name
+            api_key (str, optional): Bearer token for the API
+            max_concurrency (int): Maximum number of requests in flight
+            timeout (float): Per-request timeout in seconds
+            max_retries (int): Retries after the first failed attempt
+            backoff_base (float): Initial backoff in seconds
+            backoff_max (float): Maximum backoff in seconds
+        """
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Clients and semaphores are bound to the loop they were created in
+        self._loop_state = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None:
+            import httpx
+
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency)
+            )
+            state = (client, asyncio.Semaphore(self.max_concurrency))
+            self._loop_state[loop] = state
+        return state
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring Retry-After when given"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def complete(self, prompt, system=None, temperature=0.7, max_tokens=None, json_mode=False):
+        """
+        Request a chat completion.
+
+        Args:
+            prompt (str): The user message
+            system (str, optional): The system message
+            temperature (float): Sampling temperature
+            max_tokens (int, optional): Maximum number of tokens to generate
+            json_mode (bool): Ask the model for a JSON object
+
+        Returns:
+            str: The generated text
+
+        Raises:
+            ModelBackendError: If all attempts fail
+        """
+        import httpx
+
+        payload = self._payload(prompt, system, temperature, max_tokens, json_mode)
+
+        client, semaphore = self._state()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with semaphore:
+                try:
+                    response = await client.post("/chat/completions", json=payload)
+                    if response.status_code in self.RETRY_STATUSES:
+                        retry_after = response.headers.get("Retry-After")
+                        last_error = f"HTTP {response.status_code}"
+                    else:
+                        response.raise_for_status()
+                        return response.json()["choices"][0]["message"]["content"]
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    last_error = f"{type(e).__name__}: {e}"
+                except (httpx.HTTPStatusError, KeyError, IndexError, ValueError) as e:
+                    raise ModelBackendError(f"Invalid response from model backend: {e}") from e
+
+            if attempt < self.max_retries:
+                # Sleep outside the semaphore so waiting does not hold a slot
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        raise ModelBackendError(f"Model request failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def stream(self, prompt, system=None, temperature=0.7, max_tokens=None):
+        """
+        Request a chat completion and yield its text as it is generated.
+
+        Failed requests are retried like complete() until the first chunk has
+        been received; after that an error ends the stream.
+
+        Args:
+            prompt (str): The user message
+            system (str, optional): The system message
+            temperature (float): Sampling temperature
+            max_tokens (int, optional): Maximum number of tokens to generate
+
+        Yields:
+            str: Chunks of the generated text
+
+        Raises:
+            ModelBackendError: If all attempts fail or the stream breaks off
+        """
+        import httpx
+
+        payload = self._payload(prompt, system, temperature, max_tokens, False)
+        payload["stream"] = True
+
+        client, semaphore = self._state()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            started = False
+            async with semaphore:
+                try:
+                    async with client.stream("POST", "/chat/completions", json=payload) as response:
+                        if response.status_code in self.RETRY_STATUSES:
+                            retry_after = response.headers.get("Retry-After")
+                            last_error = f"HTTP {response.status_code}"
+                        else:
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[5:].strip()
+                                if data == "[DONE]":
+                                    break
+                                content = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                                if content:
+                                    started = True
+                                    yield content
+                            return
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    if started:
+                        raise ModelBackendError(f"Model stream interrupted: {e}") from e
+                    last_error = f"{type(e).__name__}: {e}"
+                except (httpx.HTTPStatusError, KeyError, IndexError, ValueError) as e:
+                    raise ModelBackendError(f"Invalid response from model backend: {e}") from e
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        raise ModelBackendError(f"Model request failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def _payload(self, prompt, system, temperature, max_tokens, json_mode):
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+
+        payload = {"model": self.model, "messages": messages, "temperature": temperature}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    async def aclose(self):
+        """Close the HTTP client of the current event loop"""
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.pop(loop, None)
+        if state is not None:
+            await state[0].aclose()
+
+
+def parse_json_object(text):
+    """
+    Parse a JSON object from a model response, tolerating surrounding text
+    such as Markdown code fences.
+
+    Returns:
+        dict: The parsed object, or an empty dict if none was found
+    """
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end < start:
+        return {}
+    try:
+        value = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Get the shared model backend configured through environment variables.
+
+    GRANT_LLM_BASE_URL enables the backend; GRANT_LLM_MODEL,
+    GRANT_LLM_API_KEY (or OPENAI_API_KEY), GRANT_LLM_MAX_CONCURRENCY and
+    GRANT_LLM_TIMEOUT tune it.
+
+    Returns:
+        ModelBackend: The shared backend, or None if no backend is configured
+    """
+    global _backend
+    if _backend is None and os.environ.get("GRANT_LLM_BASE_URL"):
+        _backend = ModelBackend(
+            base_url=os.environ["GRANT_LLM_BASE_URL"],
+            model=os.environ.get("GRANT_LLM_MODEL", "gpt-4o-mini"),
+            api_key=os.environ.get("GRANT_LLM_API_KEY") or os.environ.get("OPENAI_API_KEY"),
+            max_concurrency=int(os.environ.get("GRANT_LLM_MAX_CONCURRENCY", "8")),
+            timeout=float(os.environ.get("GRANT_LLM_TIMEOUT", "60"))
+        )
+    return _backend
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def run_sync(coroutine, timeout=None):
+    """
+    Run a coroutine on the shared background event loop and wait for it.
+
+    Synchronous callers such as Streamlit scripts use this instead of
+    asyncio.run(), so the backend's pooled HTTP client survives between calls
+    and concurrent callers share one connection pool.
+
+    Args:
+        coroutine: The coroutine to run
+        timeout (float, optional): Seconds to wait for the result
+
+    Returns:
+        The coroutine's result
+    """
+    return _submit(coroutine).result(timeout)
+
+
+def _submit(coroutine):
+    """Schedule a coroutine on the shared background loop, starting it if needed"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="model-backend-loop", daemon=True).start()
+
+    # Run with the caller's context variables (e.g. the request being traced)
+    context = contextvars.copy_context()
+
+    async def in_caller_context():
+        for variable, value in context.items():
+            variable.set(value)
+        return await coroutine
+    return asyncio.run_coroutine_threadsafe(in_caller_context(), _loop)
+
+
+def iter_sync(async_iterable, timeout=None):
+    """
+    Iterate over an async iterable from synchronous code.
+
+    The iteration runs on the shared background event loop (see run_sync) and
+    each item is handed over as soon as it is produced, so callers such as
+    Streamlit can render a model stream incrementally. Closing the generator
+    early cancels the underlying iteration.
+
+    Args:
+        async_iterable: The async iterable, e.g. an async generator
+        timeout (float, optional): Seconds to wait for each item
+
+    Yields:
+        The items of the async iterable
+    """
+    import queue
+
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((done, e))
+            raise
+        items.put((done, None))
+
+    future = _submit(pump())
+    try:
+        while True:
+            item, error = items.get(timeout=timeout)
+            if item is done:
+                if error is not None and not isinstance(error, asyncio.CancelledError):
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
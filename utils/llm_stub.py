@@ -0,0 +1,165 @@
+"""
+Local OpenAI-compatible stub server for offline tests and load benchmarks.
+
+Serves POST /v1/chat/completions with canned responses after a configurable
+latency, streamed as server-sent events when requested, and can fail a
+fraction of requests to exercise retries.
+
+Usage:
+    python -m utils.llm_stub --port 8765 --latency 0.2
+    GRANT_LLM_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_reply(messages, json_mode=False):
+    """Build a deterministic canned reply for a chat request"""
+    prompt = messages[-1]["content"] if messages else ""
+    if json_mode:
+        # Review prompts ask for a score; anything else gets an empty object
+        if '"score"' in prompt:
+            return json.dumps({
+                "score": 3 + len(prompt) % 3,
+                "strengths": ["The objectives are clearly stated."],
+                "weaknesses": ["The evaluation plan lacks specific metrics."],
+                "suggestions": ["Add measurable milestones to the timeline."]
+            })
+        return "{}"
+
+    # Echo back Markdown headings from the prompt so outlines stay well-formed
+    headings = [line for line in prompt.splitlines() if line.startswith("#")]
+    if headings:
+        return "\n\n".join(headings)
+    return f"Stub response ({len(prompt)} characters of input)."
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.0 closes the connection after each response. Reused keep-alive
+    # connections to http.server stall on delayed ACKs under load, which would
+    # make the stub, rather than the client, the bottleneck in benchmarks.
+    protocol_version = "HTTP/1.0"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "Not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "Invalid JSON"}})
+            return
+
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.failure_rate and random.random() < server.failure_rate:
+            self._send(503, {"error": {"message": "Stub failure"}})
+            return
+
+        json_mode = request.get("response_format", {}).get("type") == "json_object"
+        with server.lock:
+            server.request_count += 1
+        reply = stub_reply(request.get("messages", []), json_mode)
+        if request.get("stream"):
+            self._send_stream(request.get("model", "stub"), reply)
+            return
+        self._send(200, {
+            "id": "stub",
+            "object": "chat.completion",
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }]
+        })
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model, reply):
+        """Send the reply as server-sent events, one line per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for chunk in reply.splitlines(keepends=True):
+            event = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.server.chunk_latency:
+                time.sleep(self.server.chunk_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 stalls load tests that open many connections at once
+    request_queue_size = 128
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0, chunk_latency=0.0):
+    """
+    Start the stub server in a background thread.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind, 0 for any free port
+        latency (float): Seconds to wait before answering each request
+        failure_rate (float): Fraction of requests answered with HTTP 503
+        chunk_latency (float): Seconds to wait between chunks of a streamed reply
+
+    Returns:
+        tuple: (server, base_url); call server.shutdown() to stop it
+    """
+    server = StubServer((host, port), StubHandler)
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.chunk_latency = chunk_latency
+    server.request_count = 0
+    server.lock = threading.Lock()
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--chunk-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency, args.failure_rate, args.chunk_latency)
+    print(f"Stub model server listening on {base_url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
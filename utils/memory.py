@@ -2,31 +2,112 @@ import json
 import os
 from datetime import datetime
 import copy
+import threading
+from collections import OrderedDict
+
+from utils.diff import diff_dict, diff_text, iter_hunks
+from utils.instrumentation import instrumented
+from utils.journal import FileLock, VersionJournal
+from utils.sections import section_hashes
+
+# Number of compare_versions results kept in memory
+COMPARISON_CACHE_SIZE = 128
+
+# Text fields that compare_versions diffs line by line
+DIFFED_TEXT_FIELDS = ('outline', 'feedback')
+
+
+def _copy_hunks(hunks):
+    """Copy diff hunks, see utils.diff.iter_hunks"""
+    return [dict(hunk, lines=list(hunk['lines'])) for hunk in hunks]
+
+
+def _copy_comparison(differences):
+    """
+    Copy a compare_versions result, so callers never modify the cached one.
+    
+    Much faster than copy.deepcopy, since the shape is known.
+    """
+    budget = differences['budget']
+    return {
+        **differences,
+        'changed_fields': list(differences['changed_fields']),
+        **{field: _copy_hunks(differences[field]) for field in DIFFED_TEXT_FIELDS},
+        'budget': {
+            'added': dict(budget['added']),
+            'removed': dict(budget['removed']),
+            'changed': {key: dict(change) for key, change in budget['changed'].items()}
+        }
+    }
+
 
 class VersionTracker:
     """
     Utility class for tracking versions of proposals and their rationales.
     """
     
-    def __init__(self, storage_file=None):
+    def __init__(self, storage_file=None, journal=None, fsync_every=16, compact_every=None,
+                 delta_encoding=False, keyframe_interval=20, shared=False):
         """
         Initialize the version tracker.
         
         Args:
             storage_file (str, optional): Path to the file for storing versions.
                 If not provided, versions will be stored in memory only.
+            journal (bool, optional): Store versions as an append-only JSON Lines
+                journal instead of rewriting a single JSON document on every save.
+                Defaults to True when storage_file ends with ".jsonl".
+            fsync_every (int): In journal mode, number of saves between fsync calls
+            compact_every (int, optional): In journal mode, rewrite the journal
+                after this many saves
+            delta_encoding (bool): Store only the proposal fields that changed
+                since the previous version instead of a full copy
+            keyframe_interval (int): In delta mode, store a full copy of the
+                proposal every this many versions
+            shared (bool): Share the storage file with trackers in other
+                processes. Saves hold an advisory file lock and first pick up
+                the versions other processes saved, so version numbers stay
+                unique, and reads call refresh() to see other processes' saves.
         """
         self.storage_file = storage_file
         self.versions = []
+        self.shared = bool(storage_file) and shared
         
-        # Load existing versions if storage file exists
-        if storage_file and os.path.exists(storage_file):
+        if journal is None:
+            journal = bool(storage_file) and storage_file.endswith('.jsonl')
+        self.compact_every = compact_every
+        self.delta_encoding = delta_encoding
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._journal = None
+        self._saves_since_compaction = 0
+        self._last_proposal = None
+        self._comparisons = OrderedDict()
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(storage_file + '.lock') if self.shared else None
+        # (size, mtime, inode) of the JSON file as last read or written
+        self._file_state = None
+        
+        # Load existing versions if storage file exists. A shared journal is
+        # replayed under the file lock, since replay truncates a partial record
+        # that might still be being written by another process.
+        if storage_file and journal:
+            self._journal = VersionJournal(storage_file, fsync_every=fsync_every)
+            try:
+                with self._locked():
+                    self.versions = self._journal.replay()
+            except Exception as e:
+                print(f"Error loading versions from {storage_file}: {e}")
+        elif storage_file and os.path.exists(storage_file):
             try:
-                with open(storage_file, 'r') as f:
-                    self.versions = json.load(f)
+                self._load_json()
             except Exception as e:
                 print(f"Error loading versions from {storage_file}: {e}")
+        
+        # Delta encoding diffs against the previous proposal, so rebuild it once
+        if self.delta_encoding and self.versions:
+            self._last_proposal = self._rebuild_proposal(len(self.versions) - 1)
     
+    @instrumented()
     def save_version(self, proposal, rationale):
         """
         Save a new version of the proposal with a rationale.
@@ -38,31 +119,217 @@ class VersionTracker:
         Returns:
             int: The version number (index + 1)
         """
-        # Create a deep copy to avoid reference issues
-        proposal_copy = copy.deepcopy(proposal)
+        # Serialize saves so a tracker can be shared between sessions, and
+        # between processes when the storage file is shared
+        with self._locked(), self._lock:
+            self.refresh()
+            if self.shared and self._journal:
+                # A writer that crashed mid-record left a partial line, which
+                # would swallow this record too
+                self._journal.discard_partial()
+            return self._save_version(proposal, rationale)
+    
+    def _locked(self):
+        """The lock serializing writers: the file lock if shared, else the in-process lock"""
+        return self._file_lock if self.shared else self._lock
+    
+    def refresh(self):
+        """
+        Pick up the versions other processes saved to a shared storage file.
+        
+        A journal is checked with one os.stat() call and only the bytes
+        appended since the last read are parsed; a JSON file is reloaded only
+        when its size, modification time or inode changed. Has no effect
+        unless the tracker is shared.
+        
+        Returns:
+            int: Number of versions added
+        """
+        if not self.shared:
+            return 0
         
+        with self._lock:
+            count = len(self.versions)
+            try:
+                if self._journal:
+                    records, rewritten = self._journal.read_new()
+                    if rewritten:
+                        self.versions = records
+                        self._comparisons.clear()
+                    else:
+                        self.versions.extend(records)
+                elif self._json_changed():
+                    self._load_json()
+                    self._comparisons.clear()
+            except Exception as e:
+                print(f"Error loading versions from {self.storage_file}: {e}")
+                return 0
+            
+            added = len(self.versions) - count
+            if self.delta_encoding and len(self.versions) != count:
+                # The next delta is taken against the latest version, whoever saved it
+                self._last_proposal = self._rebuild_proposal(len(self.versions) - 1) if self.versions else None
+            return max(added, 0)
+    
+    def _json_state(self):
+        stat = os.stat(self.storage_file)
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    
+    def _json_changed(self):
+        try:
+            return self._json_state() != self._file_state
+        except FileNotFoundError:
+            return False
+    
+    def _load_json(self):
+        with open(self.storage_file, 'r') as f:
+            self.versions = json.load(f)
+            stat = os.fstat(f.fileno())
+        self._file_state = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    
+    def _write_json(self):
+        """
+        Write all versions to the JSON file.
+        
+        The file is written under a temporary name and atomically renamed over
+        the old one, so readers and a crash mid-write never see a truncated
+        file.
+        """
+        tmp_path = f"{self.storage_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.versions, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.storage_file)
+        self._file_state = self._json_state()
+    
+    def _save_version(self, proposal, rationale):
         # Create version entry
         version = {
-            'proposal': proposal_copy,
             'rationale': rationale,
             'timestamp': datetime.now().timestamp(),
             'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
+        # Lets later reviews tell which outline sections changed since this version
+        if proposal.get('outline'):
+            version['section_hashes'] = section_hashes(proposal['outline'])
+        
+        if self.delta_encoding:
+            self._encode_delta(version, proposal)
+        else:
+            # Create a deep copy to avoid reference issues
+            version['proposal'] = copy.deepcopy(proposal)
+        
         # Add to versions list
         self.versions.append(version)
         
         # Save to file if storage_file is provided
-        if self.storage_file:
+        if self._journal:
+            try:
+                self._journal.append(version)
+                self._saves_since_compaction += 1
+                if self.compact_every and self._saves_since_compaction >= self.compact_every:
+                    self.compact()
+            except Exception as e:
+                print(f"Error saving versions to {self.storage_file}: {e}")
+        elif self.storage_file:
             try:
-                with open(self.storage_file, 'w') as f:
-                    json.dump(self.versions, f, indent=2)
+                self._write_json()
             except Exception as e:
                 print(f"Error saving versions to {self.storage_file}: {e}")
         
         return len(self.versions)
     
+    def _encode_delta(self, version, proposal):
+        """
+        Fill in a version entry with either a keyframe or a delta.
+        
+        Keyframes hold a full copy of the proposal under 'proposal'; deltas hold
+        the changed fields under 'delta' and the removed field names under
+        'removed'.
+        """
+        previous = self._last_proposal
+        if previous is None or len(self.versions) % self.keyframe_interval == 0:
+            version['proposal'] = copy.deepcopy(proposal)
+        else:
+            version['delta'] = {
+                key: copy.deepcopy(value)
+                for key, value in proposal.items()
+                if key not in previous or previous[key] != value
+            }
+            version['removed'] = [key for key in previous if key not in proposal]
+        
+        self._last_proposal = copy.deepcopy(proposal)
+    
+    def _rebuild_proposal(self, index):
+        """
+        Rebuild the full proposal stored at the given index (0-indexed) by
+        replaying deltas forward from the nearest keyframe.
+        """
+        start = index
+        while 'proposal' not in self.versions[start]:
+            start -= 1
+        
+        proposal = copy.deepcopy(self.versions[start]['proposal'])
+        for entry in self.versions[start + 1:index + 1]:
+            proposal.update(copy.deepcopy(entry['delta']))
+            for key in entry['removed']:
+                proposal.pop(key, None)
+        return proposal
+    
+    def _materialize(self, index, proposal):
+        """
+        Build a full version entry from a stored entry and its proposal.
+        """
+        entry = self.versions[index]
+        version = {key: value for key, value in entry.items() if key not in ('delta', 'removed')}
+        version['proposal'] = proposal
+        return version
+    
+    def get_stats(self):
+        """
+        Get storage statistics for the version history.
+        
+        Returns:
+            dict: Version, keyframe and delta counts, the serialized size of the
+                stored history and of the equivalent full copies, and their ratio
+        """
+        keyframes = sum(1 for entry in self.versions if 'proposal' in entry)
+        stored_bytes = sum(len(json.dumps(entry)) for entry in self.versions)
+        full_bytes = sum(len(json.dumps(version)) for version in self.get_all_versions())
+        
+        return {
+            'versions': len(self.versions),
+            'keyframes': keyframes,
+            'deltas': len(self.versions) - keyframes,
+            'stored_bytes': stored_bytes,
+            'full_bytes': full_bytes,
+            'compression_ratio': full_bytes / stored_bytes if stored_bytes else 1.0
+        }
+    
+    def compact(self):
+        """
+        Rewrite the journal so it contains exactly the in-memory versions.
+        
+        Has no effect unless the tracker is in journal mode.
+        """
+        if self._journal:
+            with self._locked(), self._lock:
+                self.refresh()
+                self._journal.compact(self.versions)
+                self._saves_since_compaction = 0
+    
+    def close(self):
+        """
+        Flush any pending journal writes to disk.
+        """
+        if self._journal:
+            self._journal.close()
+        if self._file_lock:
+            self._file_lock.close()
+    
     def get_version(self, version_number):
         """
         Get a specific version by number (1-indexed).
@@ -73,11 +340,36 @@ class VersionTracker:
         Returns:
             dict: The version data, or None if not found
         """
+        self.refresh()
         index = version_number - 1
         if 0 <= index < len(self.versions):
-            return self.versions[index]
+            if 'proposal' in self.versions[index]:
+                return self.versions[index]
+            return self._materialize(index, self._rebuild_proposal(index))
         return None
     
+    def get_section_hashes(self, version_number):
+        """
+        Get the hashes of the outline's "##" sections as of a version.
+        
+        Args:
+            version_number (int): The version number (1-indexed)
+            
+        Returns:
+            dict: Section title -> hash (empty if the version has no outline),
+                or None if the version does not exist
+        """
+        self.refresh()
+        index = version_number - 1
+        if not 0 <= index < len(self.versions):
+            return None
+        entry = self.versions[index]
+        if 'section_hashes' not in entry:
+            # Versions saved before section hashes were recorded
+            proposal = self.get_version(version_number)['proposal']
+            return section_hashes(proposal['outline']) if proposal.get('outline') else {}
+        return entry['section_hashes']
+    
     def get_all_versions(self):
         """
         Get all versions.
@@ -85,7 +377,25 @@ class VersionTracker:
         Returns:
             list: All version data
         """
-        return self.versions
+        self.refresh()
+        if all('proposal' in entry for entry in self.versions):
+            return self.versions
+        
+        # Replay the deltas once, front to back, instead of per version
+        versions = []
+        proposal = None
+        for index, entry in enumerate(self.versions):
+            if 'proposal' in entry:
+                proposal = entry['proposal']
+                versions.append(entry)
+                continue
+            # Deep copies, so versions never share nested values such as the budget
+            proposal = copy.deepcopy(proposal)
+            proposal.update(copy.deepcopy(entry['delta']))
+            for key in entry['removed']:
+                proposal.pop(key, None)
+            versions.append(self._materialize(index, proposal))
+        return versions
     
     def get_latest_version(self):
         """
@@ -94,30 +404,43 @@ class VersionTracker:
         Returns:
             dict: The latest version data, or None if no versions exist
         """
+        # Pick up versions saved by other processes before choosing the latest
+        self.refresh()
         if self.versions:
-            return self.versions[-1]
+            return self.get_version(len(self.versions))
         return None
     
-    def compare_versions(self, version1, version2):
+    @instrumented()
+    def compare_versions(self, version1, version2, context=3):
         """
         Compare two versions and return the differences.
         
+        The outline and feedback are diffed line by line (patience diff) into
+        unified-diff style hunks, and the budget is compared per category.
+        
         Args:
             version1 (int): First version number (1-indexed)
             version2 (int): Second version number (1-indexed)
+            context (int): Number of unchanged lines around each change
             
         Returns:
-            dict: Differences between the versions
+            dict: Differences between the versions; a copy the caller may modify
         """
+        cache_key = (version1, version2, context)
+        with self._lock:
+            cached = self._comparisons.get(cache_key)
+            if cached is not None:
+                self._comparisons.move_to_end(cache_key)
+                return _copy_comparison(cached)
+        
         v1 = self.get_version(version1)
         v2 = self.get_version(version2)
         
         if not v1 or not v2:
             return None
         
-        # In a real application, you would implement a more sophisticated
-        # comparison algorithm here. For this example, we'll just return
-        # a simple comparison of the two versions.
+        p1 = v1['proposal']
+        p2 = v2['proposal']
         
         differences = {
             'version1': version1,
@@ -125,7 +448,57 @@ class VersionTracker:
             'timestamp1': v1['timestamp'],
             'timestamp2': v2['timestamp'],
             'rationale1': v1['rationale'],
-            'rationale2': v2['rationale']
+            'rationale2': v2['rationale'],
+            'changed_fields': sorted(
+                key for key in p1.keys() | p2.keys() if p1.get(key) != p2.get(key)
+            ),
+            **{field: diff_text(p1.get(field, ''), p2.get(field, ''), context) for field in DIFFED_TEXT_FIELDS},
+            'budget': diff_dict(p1.get('budget'), p2.get('budget'))
         }
         
-        return differences
\ No newline at end of file
+        # Saved versions never change, so results can be reused
+        with self._lock:
+            self._comparisons[cache_key] = differences
+            self._comparisons.move_to_end(cache_key)
+            while len(self._comparisons) > COMPARISON_CACHE_SIZE:
+                self._comparisons.popitem(last=False)
+        
+        return _copy_comparison(differences)
+    
+    def iter_diff_hunks(self, version1, version2, field='outline', context=3):
+        """
+        Lazily diff one text field between two versions.
+        
+        Hunks are yielded as soon as they are computed, so a UI can render the
+        first changes of a long outline before the whole diff is done.
+        
+        Args:
+            version1 (int): First version number (1-indexed)
+            version2 (int): Second version number (1-indexed)
+            field (str): Proposal text field to diff, e.g. 'outline' or 'feedback'
+            context (int): Number of unchanged lines around each change
+            
+        Yields:
+            dict: Diff hunks, see utils.diff.iter_hunks
+        
+        Raises:
+            ValueError: For the budget, which is not text; compare_versions
+                compares it per category
+        """
+        if field == 'budget':
+            raise ValueError("The budget is not a text field; use compare_versions to compare budgets")
+        
+        if field in DIFFED_TEXT_FIELDS:
+            with self._lock:
+                cached = self._comparisons.get((version1, version2, context))
+                hunks = _copy_hunks(cached[field]) if cached is not None else None
+            if hunks is not None:
+                yield from hunks
+                return
+        
+        v1 = self.get_version(version1)
+        v2 = self.get_version(version2)
+        if not v1 or not v2:
+            return
+        
+        yield from iter_hunks(v1['proposal'].get(field, ''), v2['proposal'].get(field, ''), context)
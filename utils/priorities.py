@@ -0,0 +1,378 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+from utils.journal import FileLock
+from utils.sections import parse_sections, tokenize
+
+# NumPy is imported inside the methods to keep importing this module cheap.
+
+DEFAULT_DIMS = 1024
+# Paragraphs are grouped into chunks of about this many words
+CHUNK_WORDS = 120
+DOCUMENT_EXTENSIONS = ('.md', '.txt')
+# Priorities cited per outline or review, and the least similarity worth citing
+CITED_PRIORITIES = 3
+MIN_CITED_SCORE = 0.05
+# Bump when the chunking or vectorization changes, so stored indexes are rebuilt
+INDEX_FORMAT = 1
+# Agency names are free text, so only the most recently looked up are remembered
+MAX_AGENCY_LOOKUPS = 256
+
+
+def _features(text):
+    """The unigrams and bigrams of a text"""
+    terms = tokenize(text)
+    return terms + [f"{first} {second}" for first, second in zip(terms, terms[1:])]
+
+
+def excerpt(text, words=30):
+    """The first words of a text, with an ellipsis if it was cut"""
+    parts = text.split()
+    return " ".join(parts[:words]) + (" …" if len(parts) > words else "")
+
+
+def format_citation(match, score=False):
+    """Format a priority match as a Markdown list item, optionally with its similarity"""
+    similarity = f", similarity {match['score']:.2f}" if score else ""
+    return f"- **{match['title']}** ({match['source']}{similarity}): {excerpt(match['text'])}\n"
+
+
+def chunk_document(text, agency, source):
+    """
+    Split a priority document into chunks of whole paragraphs.
+
+    Each "#" section is chunked separately, so a chunk never spans two
+    headings and is cited by its heading.
+
+    Args:
+        text (str): Markdown or plain text
+        agency (str): Agency the document belongs to
+        source (str): Document path, relative to the priority directory
+
+    Returns:
+        list: Dicts with 'agency', 'source', 'title' and 'text'
+    """
+    chunks = []
+    for section in parse_sections(text).walk():
+        title = section.title or agency
+        paragraphs = [" ".join(paragraph.split()) for paragraph in section.body.split("\n\n")]
+        current, words = [], 0
+        for paragraph in filter(None, paragraphs):
+            current.append(paragraph)
+            words += len(paragraph.split())
+            if words >= CHUNK_WORDS:
+                chunks.append({"agency": agency, "source": source, "title": title, "text": "\n\n".join(current)})
+                current, words = [], 0
+        if current:
+            chunks.append({"agency": agency, "source": source, "title": title, "text": "\n\n".join(current)})
+    return chunks
+
+
+class HashingVectorizer:
+    """
+    TF-IDF vectors over hashed unigrams and bigrams.
+
+    Terms are hashed into a fixed number of dimensions with a signed hash, so
+    no vocabulary has to be stored; idf is kept per dimension.
+    """
+
+    def __init__(self, dims=DEFAULT_DIMS, idf=None):
+        self.dims = dims
+        self.idf = idf
+        self._buckets = {}
+
+    def _bucket(self, feature):
+        bucket = self._buckets.get(feature)
+        if bucket is None:
+            digest = zlib.crc32(feature.encode('utf-8'))
+            # The top bit of the hash gives the sign, so collisions tend to cancel out
+            bucket = self._buckets[feature] = (digest % self.dims, -1.0 if digest >> 31 else 1.0)
+        return bucket
+
+    def counts(self, text):
+        """Sublinear term frequencies of a text, as {dimension: weight}"""
+        weights = {}
+        for feature, count in Counter(_features(text)).items():
+            index, sign = self._bucket(feature)
+            weights[index] = weights.get(index, 0.0) + sign * (1.0 + math.log(count))
+        return weights
+
+    def fit_transform(self, texts):
+        """
+        Set the idf from a corpus and vectorize it.
+
+        Returns:
+            ndarray: float32 matrix with one L2-normalized row per text
+        """
+        import numpy as np
+
+        rows = [self.counts(text) for text in texts]
+        matrix = np.zeros((len(rows), self.dims), dtype=np.float32)
+        for row, weights in zip(matrix, rows):
+            row[list(weights)] = list(weights.values())
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        self.idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self._normalize(matrix * self.idf)
+
+    def transform(self, texts):
+        """Vectorize texts with the fitted idf, as for fit_transform"""
+        import numpy as np
+
+        matrix = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in zip(matrix, texts):
+            weights = self.counts(text)
+            row[list(weights)] = list(weights.values())
+        return self._normalize(matrix * self.idf)
+
+    def _normalize(self, matrix):
+        import numpy as np
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+
+class PriorityIndex:
+    """
+    Offline index of funding agencies' stated priorities.
+
+    The priority directory holds Markdown or text documents: a file such as
+    "NSF.md" holds one agency's priorities, and a subdirectory such as
+    "NIH/" holds several documents of one agency. Documents are split into
+    paragraph chunks and embedded as hashed TF-IDF vectors, which are stored
+    under the index directory as a .npy matrix memory-mapped on load, with
+    the chunks of each agency in one contiguous block of rows. A search of
+    any number of queries is one matrix product over those rows.
+
+    Nothing is read until the first search. The documents' sizes and
+    modification times are re-checked every check_interval seconds, and the
+    stored index is rebuilt when they change. Processes sharing an index
+    directory take turns through a lock file in it, so only one of them
+    rebuilds the index and none reads a half-replaced one.
+    """
+
+    def __init__(self, directory, index_dir=None, dims=DEFAULT_DIMS, check_interval=60.0):
+        """
+        Initialize the index.
+
+        Args:
+            directory (str): Directory of priority documents
+            index_dir (str, optional): Where the built index is stored;
+                defaults to ".index" inside the priority directory
+            dims (int): Dimensions of the hashed vectors
+            check_interval (float): Seconds between checks for changed documents
+        """
+        self.directory = directory
+        self.index_dir = index_dir or os.path.join(directory, ".index")
+        self.dims = dims
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # Held while the stored index is checked, rebuilt or opened
+        self._build_lock = FileLock(os.path.join(self.index_dir, "build.lock"))
+        self._checked_at = None
+        self._signature = None
+        self._state = None
+        # (index version, agency name as given) -> rows, least recently used first
+        self._agency_rows = OrderedDict()
+
+    @property
+    def version(self):
+        """A tag that changes whenever the priority documents change"""
+        return self._current()['version']
+
+    def agencies(self):
+        """The agencies with priority documents, sorted"""
+        return sorted(self._current()['agencies'])
+
+    def __len__(self):
+        return len(self._current()['chunks'])
+
+    def covers(self, agency):
+        """Whether there are priority documents for an agency"""
+        return bool(agency) and self._rows(self._current(), agency) is not None
+
+    def search(self, query, agency=None, k=3, min_score=0.0):
+        """
+        Find the priorities that best match a text.
+
+        Args:
+            query (str): Text to match, e.g. a topic and goals
+            agency (str, optional): Only search this agency's priorities
+            k (int): Number of matches to return
+            min_score (float): Leave out matches less similar than this
+
+        Returns:
+            list: Matches, best first (see search_batch)
+        """
+        return self.search_batch([query], agency, k, min_score)[0]
+
+    def search_batch(self, queries, agency=None, k=3, min_score=0.0):
+        """
+        Find the best-matching priorities for several texts at once.
+
+        Args:
+            queries (list): Texts to match
+            agency (str, optional): Only search this agency's priorities. The
+                name is matched case-insensitively against the document
+                names as whole words, so "National Science Foundation (NSF)"
+                finds "NSF.md".
+            k (int): Number of matches per query
+            min_score (float): Leave out matches less similar than this
+
+        Returns:
+            list: For each query, a list of dicts with 'agency', 'title',
+                'source', 'text' and 'score' (cosine similarity), best first.
+                Empty if the agency has no priority documents.
+        """
+        import numpy as np
+
+        state = self._current()
+        rows = self._rows(state, agency)
+        if rows is None or rows.stop <= rows.start or not queries:
+            return [[] for _ in queries]
+
+        scores = state['vectorizer'].transform(list(queries)) @ np.asarray(state['vectors'][rows]).T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-query_scores[candidates], kind='stable')]
+            results.append([
+                dict(state['chunks'][rows.start + index], score=float(query_scores[index]))
+                for index in ranked if query_scores[index] > 0 and query_scores[index] >= min_score
+            ])
+        return results
+
+    def _rows(self, state, agency):
+        """The slice of rows holding an agency's chunks, all rows if no agency is given"""
+        if not agency:
+            return slice(0, len(state['chunks']))
+        key = (state['version'], agency)
+        with self._lock:
+            if key in self._agency_rows:
+                self._agency_rows.move_to_end(key)
+                return self._agency_rows[key]
+
+        names = state['agencies']
+        # Whole words only, preferring the longest name that matches
+        wanted = " " + " ".join(tokenize(agency)) + " "
+        found = sorted(
+            (name for name in names if tokenize(name) and f" {' '.join(tokenize(name))} " in wanted),
+            key=len, reverse=True
+        )
+        rows = slice(*names[found[0]]) if found else None
+        with self._lock:
+            self._agency_rows[key] = rows
+            while len(self._agency_rows) > MAX_AGENCY_LOOKUPS:
+                self._agency_rows.popitem(last=False)
+        return rows
+
+    def _current(self):
+        """The loaded index, loading or rebuilding it if the documents changed"""
+        state = self._state
+        if state is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return state
+        with self._lock:
+            if self._state is None or time.monotonic() - self._checked_at >= self.check_interval:
+                signature = self._sources()
+                if self._state is None or signature != self._signature:
+                    self._state = self._load(signature)
+                    self._signature = signature
+                    self._agency_rows = OrderedDict()
+                self._checked_at = time.monotonic()
+            return self._state
+
+    def _sources(self):
+        """Agency, size and modification time of every priority document, by relative path"""
+        sources = {}
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+            for name in files:
+                if not name.lower().endswith(DOCUMENT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                source = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                agency = source.split('/')[0] if '/' in source else os.path.splitext(name)[0]
+                stat = os.stat(path)
+                sources[source] = [agency, stat.st_size, stat.st_mtime_ns]
+        return {"format": INDEX_FORMAT, "dims": self.dims, "sources": sources}
+
+    def _load(self, signature):
+        """Open the stored index, building it first if it is missing or out of date"""
+        import numpy as np
+
+        if not os.path.isdir(self.directory):
+            # Nothing to index; the directory is not created on the caller's behalf
+            print(f"Priority directory {self.directory} does not exist")
+            return {
+                'version': "empty",
+                'agencies': {},
+                'chunks': [],
+                'vectors': np.zeros((0, self.dims)),
+                'vectorizer': HashingVectorizer(self.dims, np.ones(self.dims)),
+            }
+        os.makedirs(self.index_dir, exist_ok=True)
+        with self._build_lock:
+            meta_path = os.path.join(self.index_dir, "meta.json")
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+            if meta is None or meta.get("signature") != signature:
+                meta = self._build(signature)
+
+            with open(os.path.join(self.index_dir, "chunks.json"), 'r', encoding='utf-8') as f:
+                chunks = json.load(f)
+            return {
+                'version': meta['version'],
+                'agencies': {agency: tuple(rows) for agency, rows in meta['agencies'].items()},
+                'chunks': chunks,
+                'vectors': np.load(os.path.join(self.index_dir, "vectors.npy"), mmap_mode='r'),
+                'vectorizer': HashingVectorizer(self.dims, np.load(os.path.join(self.index_dir, "idf.npy"))),
+            }
+
+    def _build(self, signature):
+        """Chunk and embed the priority documents and store the index; the caller holds the build lock"""
+        import numpy as np
+
+        chunks = []
+        for source, (agency, _, _) in sorted(signature['sources'].items(), key=lambda item: (item[1][0], item[0])):
+            try:
+                with open(os.path.join(self.directory, source), 'r', encoding='utf-8') as f:
+                    chunks.extend(chunk_document(f.read(), agency, source))
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error reading priority document {source}: {e}")
+
+        agencies = {}
+        for row, chunk in enumerate(chunks):
+            start, _ = agencies.get(chunk['agency'], (row, row))
+            agencies[chunk['agency']] = (start, row + 1)
+
+        vectorizer = HashingVectorizer(self.dims)
+        vectors = vectorizer.fit_transform([f"{chunk['title']}\n{chunk['text']}" for chunk in chunks])
+
+        # The metadata is written last, so an interrupted build is redone on next load
+        self._replace("vectors.npy", lambda f: np.save(f, vectors))
+        self._replace("idf.npy", lambda f: np.save(f, vectorizer.idf))
+        self._replace("chunks.json", lambda f: f.write(json.dumps(chunks).encode('utf-8')))
+        meta = {
+            "signature": signature,
+            "version": hashlib.blake2b(json.dumps(signature, sort_keys=True).encode('utf-8'),
+                                       digest_size=6).hexdigest(),
+            "agencies": agencies,
+        }
+        self._replace("meta.json", lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        return meta
+
+    def _replace(self, name, write):
+        """Write a file of the index through a temporary file, so readers never see it half-written"""
+        path = os.path.join(self.index_dir, name)
+        with open(path + ".tmp", 'wb') as f:
+            write(f)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+
+
+class AgentRegistry:
+    """
+    Process-wide registry that builds each agent once and shares it.
+
+    Streamlit re-executes app.py on every interaction, but imported modules
+    stay loaded, so instances held here survive reruns and are shared by all
+    sessions served by the process.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._stats = {}
+        # Reentrant: a factory may fetch the agents it depends on
+        self._lock = threading.RLock()
+
+    def register(self, name, factory):
+        """
+        Register a factory for an agent.
+
+        Args:
+            name (str): Agent name
+            factory (callable): Zero-argument callable that builds the agent
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name):
+        """
+        Get the shared instance of an agent, building it on first use.
+
+        Args:
+            name (str): Agent name
+
+        Returns:
+            object: The agent instance
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            # Another thread may have built it while we waited for the lock
+            instance = self._instances.get(name)
+            if instance is None:
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                elapsed = time.perf_counter() - start
+
+                stats = self._stats.setdefault(name, {'constructions': 0, 'seconds': 0.0})
+                stats['constructions'] += 1
+                stats['seconds'] += elapsed
+                self._instances[name] = instance
+            return instance
+
+    def stats(self):
+        """
+        Get construction statistics.
+
+        Returns:
+            dict: Agent name -> {'constructions', 'seconds'}
+        """
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def clear(self):
+        """Drop all shared instances so they are rebuilt on next use"""
+        with self._lock:
+            self._instances.clear()
+
+
+def _template_store():
+    from utils.template_store import TemplateStore
+    return TemplateStore(os.environ["GRANT_TEMPLATE_DIR"])
+
+
+def _template_options():
+    """Template pack arguments for the agents, if a template directory is configured"""
+    if not os.environ.get("GRANT_TEMPLATE_DIR"):
+        return {}
+    return {
+        'template_store': registry.get("template_store"),
+        'template_pack': os.environ.get("GRANT_TEMPLATE_PACK", "default")
+    }
+
+
+def _backend():
+    """The shared model backend, if GRANT_LLM_BASE_URL is configured"""
+    if not os.environ.get("GRANT_LLM_BASE_URL"):
+        return None
+    from utils.llm import get_backend
+    return get_backend()
+
+
+def _response_cache():
+    from utils.response_cache import ResponseCache
+    # An empty GRANT_RESPONSE_CACHE keeps the cache in memory only
+    return ResponseCache(
+        db_path=os.environ.get("GRANT_RESPONSE_CACHE", "response_cache.db") or None,
+        ttl=float(os.environ.get("GRANT_RESPONSE_CACHE_TTL", "86400"))
+    )
+
+
+def _agent_options():
+    """Constructor arguments shared by the generating agents"""
+    return {
+        'backend': _backend(),
+        'response_cache': registry.get("response_cache"),
+        **_template_options()
+    }
+
+
+def _priorities():
+    """The shared agency priority index, if GRANT_PRIORITY_DIR is configured"""
+    if not os.environ.get("GRANT_PRIORITY_DIR"):
+        return None
+    return registry.get("priority_index")
+
+
+def _outline_designer():
+    from agents.outline_designer import OutlineDesigner
+    return OutlineDesigner(priority_index=_priorities(), **_agent_options())
+
+
+def _budget_estimator():
+    from agents.budget_estimator import BudgetEstimator
+    return BudgetEstimator(rate_table=registry.get("rate_table"), **_agent_options())
+
+
+def _reviewer():
+    from agents.reviewer import ReviewerSimulation
+    return ReviewerSimulation(rubric_scorer=registry.get("rubric_scorer"), priority_index=_priorities(),
+                              **_agent_options())
+
+
+def _rubric_scorer():
+    from agents.rubric import RubricScorer, load_rubric
+    path = os.environ.get("GRANT_RUBRIC_FILE")
+    return RubricScorer(load_rubric(path) if path else None)
+
+
+def _version_tracker():
+    from utils.memory import VersionTracker
+    # Streamlit workers in separate processes share one version history
+    return VersionTracker(
+        os.environ.get("GRANT_ASSISTANT_VERSIONS", "versions.jsonl"),
+        shared=os.environ.get("GRANT_SHARED_VERSIONS", "1") != "0"
+    )
+
+
+def _rate_table():
+    from utils.currency import RateTable
+    return RateTable(os.environ.get("GRANT_EXCHANGE_RATES"))
+
+
+def _priority_index():
+    from utils.priorities import PriorityIndex
+    # The index itself is only read on the first search
+    return PriorityIndex(os.environ["GRANT_PRIORITY_DIR"], index_dir=os.environ.get("GRANT_PRIORITY_INDEX") or None)
+
+
+def _job_scheduler():
+    from utils.jobs import JobScheduler
+    return JobScheduler(
+        max_workers=int(os.environ.get("GRANT_JOB_WORKERS", "4")),
+        max_queued_per_user=int(os.environ.get("GRANT_JOB_QUEUE_LIMIT", "8"))
+    )
+
+
+registry = AgentRegistry()
+registry.register("outline_designer", _outline_designer)
+registry.register("budget_estimator", _budget_estimator)
+registry.register("reviewer", _reviewer)
+registry.register("version_tracker", _version_tracker)
+registry.register("template_store", _template_store)
+registry.register("response_cache", _response_cache)
+registry.register("rubric_scorer", _rubric_scorer)
+registry.register("job_scheduler", _job_scheduler)
+registry.register("rate_table", _rate_table)
+registry.register("priority_index", _priority_index)
+
+
+def get_agent(name):
+    """
+    Get a shared agent from the process-wide registry.
+
+    Args:
+        name (str): Name the agent is registered under: "outline_designer",
+            "budget_estimator", "reviewer", "rubric_scorer",
+            "version_tracker", "template_store", "response_cache",
+            "job_scheduler", "rate_table" or "priority_index"
+
+    Returns:
+        object: The agent instance
+    """
+    return registry.get(name)
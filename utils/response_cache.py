@@ -0,0 +1,348 @@
+import copy
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from utils.instrumentation import instrumented
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+"""
+
+# Returned by ResponseCache.get on a miss (None is a valid cached value)
+MISSING = object()
+
+# Code flags of "async def" functions and async generators (see inspect)
+CO_COROUTINE = 0x80
+CO_ASYNC_GENERATOR = 0x200
+
+
+def normalize_inputs(value):
+    """
+    Normalize generation inputs so equivalent requests share a cache key.
+
+    Strings lose surrounding whitespace and use '\\n' line endings; dicts and
+    lists are normalized recursively.
+    """
+    if isinstance(value, str):
+        return value.replace('\r\n', '\n').strip()
+    if isinstance(value, dict):
+        return {str(key): normalize_inputs(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_inputs(item) for item in value]
+    return value
+
+
+class ResponseCache:
+    """
+    Two-tier cache for agent generations, keyed by a hash of the inputs.
+
+    Lookups check an in-memory LRU first and then an optional SQLite tier that
+    is shared by every worker process using the same file. Disk entries expire
+    after a TTL and the least recently used entries are evicted once the disk
+    tier grows past max_disk_entries.
+    """
+
+    def __init__(self, db_path=None, memory_size=256, ttl=86400, max_disk_entries=10000):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path (str, optional): SQLite file for the disk tier. If not
+                provided, only the in-memory tier is used.
+            memory_size (int): Number of entries kept in memory
+            ttl (float): Seconds before an entry expires
+            max_disk_entries (int): Maximum number of entries on disk
+        """
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+        self.connection = None
+        if db_path:
+            # sqlite3 is only needed for the disk tier
+            from utils.storage import get_connection
+            self.connection, self.db_lock = get_connection(db_path, CACHE_SCHEMA)
+
+    @staticmethod
+    def make_key(namespace, inputs, version):
+        """
+        Build a stable cache key.
+
+        Args:
+            namespace (str): What is being generated, e.g. "OutlineDesigner.generate_outline"
+            inputs (dict): The generation inputs
+            version (str): Template/model version the result depends on
+
+        Returns:
+            str: SHA-256 hex digest
+        """
+        payload = json.dumps(
+            {'namespace': namespace, 'inputs': normalize_inputs(inputs), 'version': version},
+            sort_keys=True, separators=(',', ':'), default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @instrumented()
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Returns:
+            The cached value, or MISSING
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        if self.connection is not None:
+            with self.db_lock, self.connection:
+                row = self.connection.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row['created_at'] < self.ttl:
+                    self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    value = json.loads(row['value'])
+                    self._remember(key, value, row['created_at'])
+                    with self._lock:
+                        self._stats['disk_hits'] += 1
+                    return value
+                if row is not None:
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return MISSING
+
+    @instrumented()
+    def set(self, key, value):
+        """
+        Store a JSON-serializable value.
+        """
+        now = time.time()
+        self._remember(key, value, now)
+        with self._lock:
+            self._stats['writes'] += 1
+
+        if self.connection is not None:
+            with self.db_lock, self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                self._writes_since_trim += 1
+                # Trimming scans the index, so only do it every so often
+                if self._writes_since_trim >= max(1, self.max_disk_entries // 100):
+                    self._trim(now)
+
+    def _remember(self, key, value, created_at):
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _trim(self, now):
+        """Delete expired entries and the least recently used ones past the size limit"""
+        self._writes_since_trim = 0
+        expired = self.connection.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        excess = self.connection.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+            "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,)
+        ).rowcount
+        with self._lock:
+            self._stats['evictions'] += expired + excess
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self.connection is not None:
+            with self.db_lock, self.connection:
+                self.connection.execute("DELETE FROM responses")
+
+    def stats(self):
+        """
+        Get hit/miss metrics.
+
+        Returns:
+            dict: Hit counts per tier, misses, writes, evictions, hit rate and
+                the number of entries held in memory
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+class uncached:
+    """
+    Wraps a result that a cached_generation method returns but that must not
+    be cached, such as a template fallback after a model backend error.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+
+def agent_cache_version(agent):
+    """
+    Describe what an agent's output depends on besides its inputs.
+
+    An agent whose generation_seed attribute is set (see pipeline.py) gets
+    the seed in its keys, so a seeded run never reuses a result generated
+    under another seed or none.
+
+    Returns:
+        str: Template version and model name, and the generation seed if set
+    """
+    template_version = agent.template_version() if hasattr(agent, 'template_version') else "builtin"
+    backend = getattr(agent, 'backend', None)
+    version = f"{template_version}|{backend.model if backend is not None else 'template'}"
+    seed = getattr(agent, 'generation_seed', None)
+    return version if seed is None else f"{version}|seed={seed}"
+
+
+def _lookup_function(method):
+    """Build a function that computes a method call's cache key and looks it up"""
+    namespace = method.__qualname__
+    # inspect is slow to import, so the signature is only read on first use
+    signature = []
+
+    def lookup(self, args, kwargs):
+        if not signature:
+            import inspect
+            signature.append(inspect.signature(method))
+        bound = signature[0].bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        inputs = {name: value for name, value in bound.arguments.items() if name != 'self'}
+        key = self.response_cache.make_key(namespace, inputs, agent_cache_version(self))
+        return key, self.response_cache.get(key)
+    return lookup
+
+
+def cached_generation(method):
+    """
+    Cache an agent method's results in the agent's response_cache.
+
+    The key covers the method, its bound arguments and agent_cache_version().
+    Works for both regular and async methods, and has no effect when the
+    agent has no response_cache. Results wrapped in uncached() are returned
+    without being stored.
+    """
+    lookup = _lookup_function(method)
+
+    def store(self, key, value):
+        if isinstance(value, uncached):
+            return value.value
+        self.response_cache.set(key, value)
+        return result(value)
+
+    def result(value):
+        # Callers may modify returned dicts, so never hand out the cached object
+        return value if isinstance(value, str) else copy.deepcopy(value)
+
+    if method.__code__.co_flags & CO_COROUTINE:
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            if getattr(self, 'response_cache', None) is None:
+                value = await method(self, *args, **kwargs)
+                return value.value if isinstance(value, uncached) else value
+            key, value = lookup(self, args, kwargs)
+            if value is MISSING:
+                return store(self, key, await method(self, *args, **kwargs))
+            return result(value)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self, 'response_cache', None) is None:
+            value = method(self, *args, **kwargs)
+            return value.value if isinstance(value, uncached) else value
+        key, value = lookup(self, args, kwargs)
+        if value is MISSING:
+            return store(self, key, method(self, *args, **kwargs))
+        return result(value)
+    return wrapper
+
+
+def cached_stream(method):
+    """
+    Cache the text produced by a streaming agent method.
+
+    Like cached_generation, but for generator and async generator methods
+    that yield chunks of a string. A cache hit yields the whole text as one
+    chunk; on a miss the chunks are passed through as they are produced and
+    their concatenation is stored once the stream has finished. If any chunk
+    is wrapped in uncached(), the result is not stored.
+    """
+    lookup = _lookup_function(method)
+
+    def unwrap(chunk, state):
+        if isinstance(chunk, uncached):
+            state['cacheable'] = False
+            return chunk.value
+        return chunk
+
+    if method.__code__.co_flags & CO_ASYNC_GENERATOR:
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            key, value = MISSING, MISSING
+            if getattr(self, 'response_cache', None) is not None:
+                key, value = lookup(self, args, kwargs)
+            if value is not MISSING:
+                yield value
+                return
+            state = {'cacheable': key is not MISSING}
+            chunks = []
+            async for chunk in method(self, *args, **kwargs):
+                chunk = unwrap(chunk, state)
+                chunks.append(chunk)
+                if chunk:
+                    yield chunk
+            if state['cacheable']:
+                self.response_cache.set(key, "".join(chunks))
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key, value = MISSING, MISSING
+        if getattr(self, 'response_cache', None) is not None:
+            key, value = lookup(self, args, kwargs)
+        if value is not MISSING:
+            yield value
+            return
+        state = {'cacheable': key is not MISSING}
+        chunks = []
+        for chunk in method(self, *args, **kwargs):
+            chunk = unwrap(chunk, state)
+            chunks.append(chunk)
+            if chunk:
+                yield chunk
+        if state['cacheable']:
+            self.response_cache.set(key, "".join(chunks))
+    return wrapper
@@ -0,0 +1,204 @@
+import json
+import re
+from datetime import datetime
+
+# Full-text index over the outline, feedback and rationale of every saved
+# version. Its rowids are the rowids of the versions table, so results are
+# joined to the version and proposal metadata without reading any payload.
+# version_agency records the funding agency each version was written for,
+# which may differ from the proposal's current agency.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS version_search USING fts5(
+    outline, feedback, rationale,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS version_agency (
+    rowid INTEGER PRIMARY KEY,
+    funding_agency TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_version_agency ON version_agency (funding_agency);
+CREATE TRIGGER IF NOT EXISTS version_search_delete AFTER DELETE ON versions BEGIN
+    DELETE FROM version_search WHERE rowid = old.rowid;
+    DELETE FROM version_agency WHERE rowid = old.rowid;
+END;
+"""
+
+# Column weights for bm25 ranking: outline, feedback, rationale
+COLUMN_WEIGHTS = (1.0, 1.0, 0.5)
+SEARCH_COLUMNS = ("outline", "feedback", "rationale")
+
+QUERY_PART = re.compile(r'"([^"]*)"?|(\S+)')
+QUERY_TERM = re.compile(r'\w+')
+
+
+def build_match_query(query, match_any=False, columns=None):
+    """
+    Turn free text into an FTS5 query.
+
+    Text in double quotes is searched as a phrase, other words as single
+    terms, and a word ending in "*" as a prefix. FTS5 operators in the text
+    are treated as plain words, so any user input is a valid query.
+
+    Args:
+        query (str): Search text, e.g. 'soil "carbon capture" sensor*'
+        match_any (bool): Match versions containing any of the terms instead
+            of all of them
+        columns (list, optional): Only search these of SEARCH_COLUMNS
+
+    Returns:
+        str: The FTS5 query, or "" if the text has no searchable terms
+    """
+    parts = []
+    for phrase, word in QUERY_PART.findall(query or ""):
+        terms = QUERY_TERM.findall(phrase or word)
+        if not terms:
+            continue
+        part = '"' + " ".join(terms) + '"'
+        if word.endswith("*") and len(terms) == 1:
+            part += "*"
+        parts.append(part)
+    if not parts:
+        return ""
+
+    match = (" OR " if match_any else " AND ").join(parts)
+    if columns:
+        unknown = set(columns) - set(SEARCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown search columns: {', '.join(sorted(unknown))}")
+        match = "{" + " ".join(columns) + "}: (" + match + ")"
+    return match
+
+
+def _timestamp(value):
+    """Convert a date, datetime or ISO date string to a Unix timestamp"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return value.timestamp()
+
+
+class VersionSearchIndex:
+    """
+    SQLite FTS5 index over the version history of a ProposalStore.
+
+    Versions are indexed as they are saved, in the same transaction. Queries
+    are ranked with bm25 and return version metadata and a highlighted
+    snippet; payloads are only loaded for versions that have not been
+    indexed yet.
+    """
+
+    def __init__(self, connection, lock):
+        """
+        Initialize the index and index any versions saved before it existed.
+
+        Args:
+            connection (sqlite3.Connection): The ProposalStore connection,
+                with SEARCH_SCHEMA applied
+            lock (threading.RLock): Lock guarding the connection
+        """
+        self.connection = connection
+        self.lock = lock
+        self.index_missing()
+
+    def add(self, rowid, proposal, rationale):
+        """
+        Index one version. Call inside the transaction that saves it.
+
+        Args:
+            rowid (int): rowid of the version in the versions table
+            proposal (dict): The proposal data of the version
+            rationale (str): The reason for this version
+        """
+        self.connection.execute(
+            "INSERT INTO version_search (rowid, outline, feedback, rationale) VALUES (?, ?, ?, ?)",
+            (rowid, proposal.get('outline') or '', proposal.get('feedback') or '', rationale or '')
+        )
+        self._add_agency(rowid, proposal)
+
+    def _add_agency(self, rowid, proposal):
+        """Record the funding agency a version was written for"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO version_agency (rowid, funding_agency) VALUES (?, ?)",
+            (rowid, proposal.get('funding_agency') or '')
+        )
+
+    def index_missing(self):
+        """
+        Index the versions that are not in the index yet.
+
+        Versions are only ever appended, so these are the ones with a rowid
+        above the highest indexed one. Databases indexed before the
+        version_agency table existed get their agencies filled in as well.
+
+        Returns:
+            int: Number of versions indexed
+        """
+        with self.lock, self.connection:
+            last_text, last_agency = self.connection.execute(
+                "SELECT (SELECT COALESCE(MAX(rowid), 0) FROM version_search), "
+                "(SELECT COALESCE(MAX(rowid), 0) FROM version_agency)"
+            ).fetchone()
+            rows = self.connection.execute(
+                "SELECT rowid, rationale, payload FROM versions WHERE rowid > ? ORDER BY rowid",
+                (min(last_text, last_agency),)
+            ).fetchall()
+            indexed = 0
+            for row in rows:
+                proposal = json.loads(row['payload'])
+                if row['rowid'] > last_text:
+                    self.add(row['rowid'], proposal, row['rationale'])
+                    indexed += 1
+                elif row['rowid'] > last_agency:
+                    self._add_agency(row['rowid'], proposal)
+        return indexed
+
+    def search(self, query, funding_agency=None, since=None, until=None, match_any=False, columns=None,
+               limit=20, offset=0):
+        """
+        Find versions matching a query, best matches first.
+
+        Args:
+            query (str): Search text (see build_match_query)
+            funding_agency (str, optional): Only versions written for this agency
+            since (date, datetime or str, optional): Only versions saved at or after this time
+            until (date, datetime or str, optional): Only versions saved before this time
+            match_any (bool): Match any instead of all of the terms
+            columns (list, optional): Only search these of SEARCH_COLUMNS
+            limit (int): Maximum number of results
+            offset (int): Number of results to skip
+
+        Returns:
+            list: Dicts with 'proposal_id', 'topic', 'funding_agency' (of
+                the version), 'version', 'rationale', 'created_at', 'rank' (bm25, lower is
+                better) and 'snippet' (matching text with terms in bold)
+        """
+        match = build_match_query(query, match_any, columns)
+        if not match:
+            return []
+
+        sql = (
+            "SELECT v.proposal_id, p.topic, a.funding_agency, v.version, v.rationale, v.created_at, "
+            f"bm25(version_search, {', '.join(map(str, COLUMN_WEIGHTS))}) AS rank, "
+            "snippet(version_search, -1, '**', '**', ' ... ', 16) AS snippet "
+            "FROM version_search "
+            "JOIN versions v ON v.rowid = version_search.rowid "
+            "JOIN proposals p ON p.id = v.proposal_id "
+            "JOIN version_agency a ON a.rowid = v.rowid "
+            "WHERE version_search MATCH ?"
+        )
+        params = [match]
+        if funding_agency:
+            sql += " AND a.funding_agency = ?"
+            params.append(funding_agency)
+        if since is not None:
+            sql += " AND v.timestamp >= ?"
+            params.append(_timestamp(since))
+        if until is not None:
+            sql += " AND v.timestamp < ?"
+            params.append(_timestamp(until))
+        sql += " ORDER BY rank LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, params)]
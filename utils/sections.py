@@ -0,0 +1,322 @@
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+
+# Matches fence lines (group 1) and heading lines (groups 2 and 3) including
+# the newline before them. Anchoring on a literal newline instead of ^ with
+# re.MULTILINE lets the regex engine skip ordinary text much faster.
+MARKUP_LINE = re.compile(r'\n(?:[ \t]*(```)[^\n]*|(#{1,6})[ \t]+([^\n]*?)[ \t#]*)(?=\n|$)')
+TERM = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric terms"""
+    return TERM.findall(text.lower())
+
+
+def section_hash(title, body):
+    """Content hash of one section (its heading and own text, not its subsections)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(title.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(body.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Section:
+    """
+    A Markdown section: its heading, its own text and its subsections.
+    """
+
+    __slots__ = ('title', 'level', 'body', 'children', 'hash', '_tree_hash')
+
+    def __init__(self, title, level, body=""):
+        self.title = title
+        self.level = level
+        self.body = body
+        self.children = []
+        self.hash = None
+        self._tree_hash = None
+
+    @property
+    def tree_hash(self):
+        """Content hash of the section including all of its subsections"""
+        if self._tree_hash is None:
+            if not self.children:
+                self._tree_hash = self.hash
+            else:
+                digest = hashlib.blake2b(self.hash.encode('ascii'), digest_size=16)
+                for child in self.children:
+                    digest.update(child.tree_hash.encode('ascii'))
+                self._tree_hash = digest.hexdigest()
+        return self._tree_hash
+
+    def to_markdown(self):
+        """The section's heading and text, subsections included"""
+        parts = []
+        for section in self.walk():
+            if section.title:
+                parts.append(f"{'#' * section.level} {section.title}")
+            if section.body:
+                parts.append(section.body)
+        return "\n\n".join(parts)
+
+    def walk(self):
+        """Yield this section and all of its subsections, depth first"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def __repr__(self):
+        return f"Section({self.title!r}, level={self.level}, children={len(self.children)})"
+
+
+def parse_sections(text):
+    """
+    Parse Markdown text into a tree of sections in a single pass.
+
+    Text before the first heading belongs to the root section (level 0,
+    empty title). Lines inside ``` fences are never treated as headings.
+
+    Args:
+        text (str): Markdown text
+
+    Returns:
+        Section: The root section
+    """
+    # The leading newline lets a heading on the first line match too
+    text = "\n" + (text or "").replace('\r\n', '\n')
+    root = Section("", 0)
+    stack = [root]
+    body_start = 0
+    in_fence = False
+
+    def close(section, body_end):
+        section.body = text[body_start:body_end].strip()
+        section.hash = section_hash(section.title, section.body)
+
+    for match in MARKUP_LINE.finditer(text):
+        if match.group(1):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+
+        close(stack[-1], match.start())
+        body_start = match.end()
+        section = Section(match.group(3), len(match.group(2)))
+        while stack[-1].level >= section.level:
+            stack.pop()
+        stack[-1].children.append(section)
+        stack.append(section)
+
+    close(stack[-1], len(text))
+    return root
+
+
+def sections_by_title(text, level=2):
+    """
+    Get every section of a given heading level by title.
+
+    Args:
+        text (str): Markdown text
+        level (int): Heading level, 2 for "##" sections
+
+    Returns:
+        dict: Section title -> Section, in document order. Repeated titles
+            get a " (2)", " (3)", ... suffix.
+    """
+    sections = {}
+    for section in parse_sections(text).walk():
+        if section.level != level:
+            continue
+        title = section.title
+        count = 2
+        while title in sections:
+            title = f"{section.title} ({count})"
+            count += 1
+        sections[title] = section
+    return sections
+
+
+def section_hashes(text, level=2):
+    """
+    Hash every section of a given heading level, subsections included.
+
+    Args:
+        text (str): Markdown text
+        level (int): Heading level, 2 for "##" sections
+
+    Returns:
+        dict: Section title -> tree hash, in document order (titles as in
+            sections_by_title)
+    """
+    return {title: section.tree_hash for title, section in sections_by_title(text, level).items()}
+
+
+class SectionIndex:
+    """
+    Inverted term index over the sections of one document.
+
+    Postings map each term to its count per section hash. The positions of
+    every term in a section are kept in a cache shared between indexes, for
+    phrase matching, so rebuilding the index after an edit only tokenizes
+    the sections whose text changed.
+    """
+
+    def __init__(self, text="", term_cache=None):
+        """
+        Initialize the index.
+
+        Args:
+            text (str): Markdown document to index
+            term_cache (SectionTermCache, optional): Shared per-section term
+                positions; a private cache is used if not provided
+        """
+        self.term_cache = term_cache if term_cache is not None else SectionTermCache()
+        self.root = Section("", 0)
+        self.sections = []
+        self._titles = []
+        self.postings = {}
+        # Section hash -> number of sections with that hash, and the positions
+        # of their terms
+        self._refs = Counter()
+        self._terms = {}
+        self.stats = {'reused': 0, 'tokenized': 0}
+        if text:
+            self.update(text)
+
+    def update(self, text):
+        """
+        Re-index the document after an edit.
+
+        Postings of sections whose hash is unchanged are kept as they are;
+        only added and removed sections touch the inverted index.
+
+        Args:
+            text (str): The new Markdown document
+
+        Returns:
+            dict: Number of sections 'reused' and 'tokenized' for this update
+        """
+        root = parse_sections(text)
+        sections = list(root.walk())
+        refs = Counter(section.hash for section in sections)
+
+        stats = {'reused': 0, 'tokenized': 0}
+        for digest in self._refs.keys() - refs.keys():
+            for term in self._terms.pop(digest):
+                postings = self.postings[term]
+                del postings[digest]
+                if not postings:
+                    del self.postings[term]
+
+        for section in sections:
+            if section.hash in self._terms:
+                stats['reused'] += 1
+                continue
+            positions, cached = self.term_cache.get(section)
+            stats['reused' if cached else 'tokenized'] += 1
+            for term, offsets in positions.items():
+                self.postings.setdefault(term, {})[section.hash] = len(offsets)
+            # Identical sections share one set of postings
+            self._terms[section.hash] = positions
+
+        self.root = root
+        self.sections = sections
+        self._titles = [(section.title.lower(), section) for section in sections if section.title]
+        self._refs = refs
+        self.stats = stats
+        return stats
+
+    def find_sections(self, *names):
+        """
+        Find sections whose title contains any of the given names.
+
+        Args:
+            *names (str): Names to look for, compared case-insensitively
+
+        Returns:
+            list: Matching sections, in document order
+        """
+        wanted = [name.lower() for name in names]
+        return [section for title, section in self._titles if any(name in title for name in wanted)]
+
+    def has_term(self, term):
+        """Whether a term occurs anywhere in the document"""
+        return term.lower() in self.postings
+
+    def term_count(self, term):
+        """Total occurrences of a term in the document"""
+        postings = self.postings.get(term.lower(), {})
+        return sum(postings[digest] * self._refs[digest] for digest in postings)
+
+    def has_phrase(self, phrase):
+        """
+        Whether the terms of a phrase occur next to each other, in order, in
+        a section's heading or text.
+
+        Only sections containing all the terms have their term positions
+        compared, so this costs time proportional to the rarest term's
+        postings.
+        """
+        terms = tokenize(phrase)
+        if not terms:
+            return False
+        postings = [self.postings.get(term) for term in terms]
+        if not all(postings):
+            return False
+        rarest = min(postings, key=len)
+        return any(
+            all(digest in other for other in postings) and _consecutive(self._terms[digest], terms)
+            for digest in rarest
+        )
+
+
+def _consecutive(positions, terms):
+    """Whether terms occur one after another somewhere, given term -> positions"""
+    starts = set(positions[terms[0]])
+    for offset, term in enumerate(terms[1:], 1):
+        starts.intersection_update(position - offset for position in positions[term])
+        if not starts:
+            return False
+    return bool(starts)
+
+
+class SectionTermCache:
+    """
+    Thread-safe LRU of term positions per section hash.
+    """
+
+    def __init__(self, max_sections=8192):
+        self.max_sections = max_sections
+        self._positions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, section):
+        """
+        Get the positions of a section's terms, tokenizing it on a miss.
+
+        The heading's terms come first, then the text's, one position apart
+        so a phrase never spans the two.
+
+        Returns:
+            tuple: (dict of term -> list of positions, whether it was cached)
+        """
+        with self._lock:
+            positions = self._positions.get(section.hash)
+            if positions is not None:
+                self._positions.move_to_end(section.hash)
+                return positions, True
+
+        title = tokenize(section.title)
+        positions = {}
+        for position, term in enumerate(title + [None] + tokenize(section.body)):
+            if term is not None:
+                positions.setdefault(term, []).append(position)
+        with self._lock:
+            self._positions[section.hash] = positions
+            while len(self._positions) > self.max_sections:
+                self._positions.popitem(last=False)
+        return positions, False
@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from utils.instrumentation import instrumented
+from utils.search import SEARCH_SCHEMA, VersionSearchIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proposals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL DEFAULT '',
+    goals TEXT NOT NULL DEFAULT '',
+    funding_agency TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    latest_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_proposals_agency ON proposals (funding_agency, updated_at);
+CREATE INDEX IF NOT EXISTS idx_proposals_updated ON proposals (updated_at);
+
+CREATE TABLE IF NOT EXISTS versions (
+    proposal_id INTEGER NOT NULL REFERENCES proposals (id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    rationale TEXT NOT NULL DEFAULT '',
+    timestamp REAL NOT NULL,
+    created_at TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (proposal_id, version)
+);
+CREATE INDEX IF NOT EXISTS idx_versions_timestamp ON versions (timestamp);
+"""
+
+# One shared connection per database file per process
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(db_path, schema=SCHEMA):
+    """
+    Get the process-wide shared connection for a database file.
+
+    The connection is opened once per process (a forked child opens its own)
+    in WAL mode so readers in other processes are not blocked by writers.
+
+    Args:
+        db_path (str): Path to the SQLite database file
+        schema (str): Schema script to apply the first time it is requested
+            for this file
+
+    Returns:
+        tuple: (sqlite3.Connection, threading.RLock) - hold the lock while
+            using the connection
+    """
+    key = os.path.abspath(db_path)
+    with _connections_lock:
+        entry = _connections.get(key)
+        if entry is None or entry[0] != os.getpid():
+            connection = sqlite3.connect(db_path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            entry = (os.getpid(), connection, threading.RLock(), set())
+            _connections[key] = entry
+        # Several stores may share one file, each with its own tables
+        if schema not in entry[3]:
+            with entry[2]:
+                entry[1].executescript(schema)
+            entry[3].add(schema)
+        return entry[1], entry[2]
+
+
+class ProposalStore:
+    """
+    SQLite-backed persistence for proposals and their version history.
+
+    Listing and pagination only read the small metadata columns; a version's
+    full payload is loaded only when that single version is requested.
+    Versions are also indexed for full-text search as they are saved.
+    """
+
+    def __init__(self, db_path="proposals.db"):
+        """
+        Initialize the store.
+
+        Args:
+            db_path (str): Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self.connection, self.lock = get_connection(db_path)
+        get_connection(db_path, SEARCH_SCHEMA)
+        self.search_index = VersionSearchIndex(self.connection, self.lock)
+
+    def create_proposal(self, proposal):
+        """
+        Create a new proposal record.
+
+        Args:
+            proposal (dict): The proposal data
+
+        Returns:
+            int: The new proposal id
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO proposals (topic, goals, funding_agency, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (proposal.get('topic', ''), proposal.get('goals', ''), proposal.get('funding_agency', ''),
+                 proposal.get('created_at', now), now)
+            )
+            return cursor.lastrowid
+
+    @instrumented()
+    def save_version(self, proposal_id, proposal, rationale):
+        """
+        Save a new version of a proposal.
+
+        Args:
+            proposal_id (int): The proposal id
+            proposal (dict): The proposal data to save
+            rationale (str): The reason for this version/change
+
+        Returns:
+            int: The version number (1-indexed)
+        """
+        now = datetime.now()
+        created_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        with self.lock, self.connection:
+            # Take the write lock up front so concurrent writers in other
+            # processes cannot claim the same version number
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute(
+                "SELECT latest_version FROM proposals WHERE id = ?", (proposal_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown proposal id: {proposal_id}")
+
+            version = row['latest_version'] + 1
+            cursor = self.connection.execute(
+                "INSERT INTO versions (proposal_id, version, rationale, timestamp, created_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (proposal_id, version, rationale, now.timestamp(), created_at, json.dumps(proposal))
+            )
+            self.search_index.add(cursor.lastrowid, proposal, rationale)
+            self.connection.execute(
+                "UPDATE proposals SET topic = ?, goals = ?, funding_agency = ?, updated_at = ?, "
+                "latest_version = ? WHERE id = ?",
+                (proposal.get('topic', ''), proposal.get('goals', ''), proposal.get('funding_agency', ''),
+                 created_at, version, proposal_id)
+            )
+            return version
+
+    @instrumented()
+    def search_versions(self, query, **filters):
+        """
+        Full-text search over the outline, feedback and rationale of all versions.
+
+        Args:
+            query (str): Search text; "quoted text" is matched as a phrase
+            **filters: funding_agency, since, until, match_any, columns,
+                limit and offset (see VersionSearchIndex.search)
+
+        Returns:
+            list: Matching version metadata with snippets, best match first
+        """
+        return self.search_index.search(query, **filters)
+
+    def list_proposals(self, funding_agency=None, limit=20, offset=0):
+        """
+        List proposals, most recently updated first.
+
+        Args:
+            funding_agency (str, optional): Only list proposals for this agency
+            limit (int): Maximum number of proposals to return
+            offset (int): Number of proposals to skip
+
+        Returns:
+            list: Proposal metadata dicts (no version payloads)
+        """
+        query = ("SELECT id, topic, funding_agency, created_at, updated_at, latest_version "
+                 "FROM proposals")
+        params = []
+        if funding_agency:
+            query += " WHERE funding_agency = ?"
+            params.append(funding_agency)
+        query += " ORDER BY updated_at DESC, id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(query, params)]
+
+    def count_proposals(self, funding_agency=None):
+        """
+        Count proposals, optionally for one funding agency.
+
+        Returns:
+            int: Number of proposals
+        """
+        query = "SELECT COUNT(*) FROM proposals"
+        params = []
+        if funding_agency:
+            query += " WHERE funding_agency = ?"
+            params.append(funding_agency)
+
+        with self.lock:
+            return self.connection.execute(query, params).fetchone()[0]
+
+    def list_versions(self, proposal_id, limit=20, offset=0):
+        """
+        List versions of a proposal, newest first, without their payloads.
+
+        Args:
+            proposal_id (int): The proposal id
+            limit (int): Maximum number of versions to return
+            offset (int): Number of versions to skip
+
+        Returns:
+            list: Version metadata dicts
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT version, rationale, timestamp, created_at FROM versions "
+                "WHERE proposal_id = ? ORDER BY version DESC LIMIT ? OFFSET ?",
+                (proposal_id, limit, offset)
+            )
+            return [dict(row) for row in rows]
+
+    def get_version(self, proposal_id, version_number):
+        """
+        Load a single version of a proposal.
+
+        Args:
+            proposal_id (int): The proposal id
+            version_number (int): The version number (1-indexed)
+
+        Returns:
+            dict: The version data, or None if not found
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT version, rationale, timestamp, created_at, payload FROM versions "
+                "WHERE proposal_id = ? AND version = ?",
+                (proposal_id, version_number)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        version = dict(row)
+        version['proposal'] = json.loads(version.pop('payload'))
+        return version
+
+    def get_latest_version(self, proposal_id):
+        """
+        Load the latest version of a proposal.
+
+        Returns:
+            dict: The version data, or None if the proposal has no versions
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT latest_version FROM proposals WHERE id = ?", (proposal_id,)
+            ).fetchone()
+
+        if row is None or not row['latest_version']:
+            return None
+        return self.get_version(proposal_id, row['latest_version'])
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.instrumentation import instrumented
+
+PACK_EXTENSIONS = (".json", ".yaml", ".yml")
+INDEX_FILE = ".template_index.json"
+
+
+class TemplateStore:
+    """
+    Loads agent template packs from a directory of JSON/YAML files.
+
+    A pack is one file named after the pack (e.g. "nsf.yaml") with optional
+    "outline", "budget" and "feedback" sections in the same shape as the
+    agents' built-in templates. The directory listing is kept in an on-disk
+    index so packs are only parsed when first requested, parsed packs are
+    kept in a bounded LRU, and file modification times are re-checked so
+    edited packs are picked up without restarting.
+    """
+
+    def __init__(self, directory, max_packs=32, check_interval=2.0):
+        """
+        Initialize the template store.
+
+        Args:
+            directory (str): Directory containing the template pack files
+            max_packs (int): Maximum number of parsed packs kept in memory
+            check_interval (float): Seconds between modification time checks
+                for a pack
+        """
+        self.directory = directory
+        self.max_packs = max_packs
+        self.check_interval = check_interval
+        self._packs = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_scan = 0.0
+        self._index = self._load_index()
+
+    def _load_index(self):
+        """Load the on-disk index, rebuilding it if it is missing or stale"""
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(self.directory):
+                with open(path, 'r') as f:
+                    return json.load(f)
+        except (OSError, ValueError):
+            pass
+        return self.rebuild_index()
+
+    def rebuild_index(self):
+        """
+        Scan the directory and write a fresh index of pack files.
+
+        Only file names and stat information are recorded; no pack is parsed.
+
+        Returns:
+            dict: Pack name -> {'file', 'mtime_ns', 'size'}
+        """
+        index = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError as e:
+            print(f"Error reading template directory {self.directory}: {e}")
+            entries = []
+
+        for entry in entries:
+            name, extension = os.path.splitext(entry.name)
+            if extension in PACK_EXTENSIONS and entry.is_file():
+                stat = entry.stat()
+                index[name] = {'file': entry.name, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), 'w') as f:
+                json.dump(index, f, indent=2)
+        except OSError as e:
+            print(f"Error writing template index: {e}")
+
+        with self._lock:
+            self._index = index
+            self._last_scan = time.monotonic()
+        return index
+
+    def list_packs(self):
+        """
+        List the available pack names.
+
+        Returns:
+            list: Pack names, sorted
+        """
+        return sorted(self._index)
+
+    @instrumented()
+    def get_pack(self, name):
+        """
+        Get a parsed template pack, loading or reloading it if needed.
+
+        Args:
+            name (str): Pack name (file name without extension)
+
+        Returns:
+            dict: The pack contents, or None if there is no such pack
+        """
+        with self._lock:
+            cached = self._packs.get(name)
+            now = time.monotonic()
+            if cached is not None and now - cached['checked_at'] < self.check_interval:
+                self._packs.move_to_end(name)
+                return cached['data']
+
+            entry = self._index.get(name)
+            if entry is None:
+                # The pack may have been added since the index was built
+                if now - self._last_scan < self.check_interval:
+                    return None
+                entry = self.rebuild_index().get(name)
+                if entry is None:
+                    return None
+
+            path = os.path.join(self.directory, entry['file'])
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._packs.pop(name, None)
+                self.rebuild_index()
+                return None
+
+            if cached is not None and cached['mtime_ns'] == stat.st_mtime_ns:
+                cached['checked_at'] = now
+                self._packs.move_to_end(name)
+                return cached['data']
+
+            data = self._parse(path)
+            if data is None:
+                return cached['data'] if cached is not None else None
+
+            self._packs[name] = {'data': data, 'mtime_ns': stat.st_mtime_ns, 'checked_at': now}
+            self._packs.move_to_end(name)
+            while len(self._packs) > self.max_packs:
+                self._packs.popitem(last=False)
+            return data
+
+    def get_section(self, name, section):
+        """
+        Get one section ("outline", "budget" or "feedback") of a pack.
+
+        Returns:
+            dict: The section, or None if the pack or section does not exist
+        """
+        pack = self.get_pack(name)
+        if not pack:
+            return None
+        return pack.get(section)
+
+    def pack_version(self, name):
+        """
+        Get a version tag for a pack that changes whenever the pack is reloaded.
+
+        Returns:
+            str: "<name>@<mtime_ns>", or None if the pack is not loaded
+        """
+        with self._lock:
+            if self.get_pack(name) is None:
+                return None
+            return f"{name}@{self._packs[name]['mtime_ns']}"
+
+    @instrumented()
+    def _parse(self, path):
+        try:
+            with open(path, 'rb') as f:
+                if path.endswith('.json'):
+                    return json.load(f)
+                # PyYAML is only needed when a YAML pack is actually used
+                import yaml
+                return yaml.safe_load(f)
+        except Exception as e:
+            print(f"Error loading template pack {path}: {e}")
+            return None
+
+
+class TemplatePackMixin:
+    """
+    Lets an agent take its templates from a TemplateStore pack.
+
+    Sections found in the pack override the agent's built-in templates key by
+    key (e.g. a pack may only replace the "research" outlines), and are
+    re-read on every access so edited packs take effect immediately.
+    """
+
+    # Pack section holding this agent's templates
+    template_section = None
+
+    def _init_template_pack(self, template_store=None, template_pack="default"):
+        self.template_store = template_store
+        self.template_pack = template_pack
+
+    def _pack_templates(self, builtin):
+        """Merge the pack's section over the built-in templates"""
+        if self.template_store is None:
+            return builtin
+        section = self.template_store.get_section(self.template_pack, self.template_section)
+        if not section:
+            return builtin
+        return {**builtin, **section}
+
+    def template_version(self):
+        """
+        Get a tag identifying the templates currently in use.
+
+        Returns:
+            str: The pack version, or "builtin" when no pack is used
+        """
+        if self.template_store is None:
+            return "builtin"
+        return self.template_store.pack_version(self.template_pack) or "builtin"